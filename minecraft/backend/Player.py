@@ -1,8 +1,11 @@
+import hashlib
 import math
-import time
+import uuid
 
 from minecraft.networking.connection import Connection
 from minecraft.operation import move, chat, block_query, block_place
+from .movement import MovementController
+from .pathfinding import Navigator
 
 
 class Player:
@@ -61,7 +64,17 @@ class PlayerSelf(Player):
         self.health = 0
         self.food = 0
         self.food_saturation = 0
-        self.set_uuid(self.connection.auth_token.profile.id_)
+        if self.connection.auth_token is not None:
+            self.set_uuid(self.connection.auth_token.profile.id_)
+        else:
+            # 离线模式下，服务器根据用户名生成UUID
+            name = 'OfflinePlayer:' + self.connection.username
+            self.uuid = str(uuid.UUID(bytes=hashlib.md5(name.encode('utf-8')).digest(), version=3))
+        # 由共享的tick线程驱动移动
+        self.movement = MovementController(self)
+        # 世界模型（见world模块），所在区块已加载时move_to沿寻路得到的路径移动
+        self.world = None
+        self.navigator = Navigator(self)
 
     def get_health(self):
         return [self.health, self.food, self.food_saturation]
@@ -76,21 +89,33 @@ class PlayerSelf(Player):
         self.food_saturation = food_saturation
 
     def move_to(self, destination: list[3]):
+        """
+        开始移动到目标位置，不阻塞调用者。返回一个Future，到达目标位置时以最终坐标完成。
+        所在区块已加载到world中时沿寻路得到的路径移动，否则直线移动。
+        """
         for i in range(0, len(destination)):
             if destination[i] == '~':
                 destination[i] = self.position[i]
-        # 先计算一下距离和三轴分别的距离差
-        distance, each_diff = move.calculate_distance(self.position, destination)
-        # 如果距离大于100就要分步移动了
-        while distance > 100:
-            step_pos = [self.position[i] + (each_diff[i] * 10 / (math.sqrt(distance))) for i in range(3)]
-            move.player_move(self.connection, step_pos, self.rotation)
-            print("移动中…坐标为: x=%f, y=%f, z=%f" % (self.position[0], self.position[1], self.position[2]))
-            # 防止移动过快，因为我不知道移动判定中"速度"具体的算法，只能用延时来避免
-            time.sleep(0.05)
-            distance, each_diff = move.calculate_distance(self.position, destination)
-        move.player_move(self.connection, destination, self.rotation)
-        print("移动完成。坐标为: x=%f, y=%f, z=%f" % (self.position[0], self.position[1], self.position[2]))
+        if self._world_known():
+            future = self.navigator.move_to(destination)
+        else:
+            future = self.movement.move_to(destination)
+        future.add_done_callback(self._print_move_result)
+        return future
+
+    def _world_known(self):
+        # 世界模型中是否有玩家所在的方块
+        position = self.movement.position or self.position
+        if self.world is None or not position:
+            return False
+        x, y, z = (math.floor(c) for c in position)
+        return self.world.get_block_state(x, y, z) is not None
+
+    @staticmethod
+    def _print_move_result(future):
+        if not future.cancelled() and future.exception() is None:
+            position = future.result()
+            print("移动完成。坐标为: x=%f, y=%f, z=%f" % (position[0], position[1], position[2]))
 
     def rotate_to(self, rotation: list[2]):
         move.player_move(self.connection, self.position, rotation)
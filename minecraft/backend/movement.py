@@ -0,0 +1,295 @@
+"""
+移动控制：由一个共享的tick线程驱动所有玩家的移动，每tick发送一次位置，
+根据服务器的位置纠正（拉回）调整步长，移动完成时通过Future通知调用者。
+"""
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+
+from minecraft.exceptions import MovementError
+from minecraft.networking.packets.clientbound.play import PlayerPositionAndLookPacket
+from minecraft.networking.types import PositionAndLook
+from minecraft.operation import move
+
+# 服务器每秒20个tick
+TICK_INTERVAL = 0.05
+
+
+class Ticker:
+    """
+    每隔interval秒，在同一个后台线程中依次调用所有已添加任务的tick方法。
+    没有任务时线程自动退出，添加任务时再重新启动。
+    """
+
+    def __init__(self, interval=TICK_INTERVAL):
+        self.interval = interval
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, task):
+        with self._lock:
+            # 用dict保持添加顺序
+            self._tasks[task] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='Ticker Thread')
+                self._thread.start()
+
+    def remove(self, task):
+        with self._lock:
+            self._tasks.pop(task, None)
+
+    def _run(self):
+        next_time = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._tasks:
+                    self._thread = None
+                    return
+                tasks = list(self._tasks)
+            for task in tasks:
+                try:
+                    task.tick()
+                except Exception:
+                    # 出错的任务不再调用，但不影响其他任务
+                    self.remove(task)
+                    sys.excepthook(*sys.exc_info())
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 落后时不补发，从现在开始重新计时
+                next_time = time.monotonic()
+
+
+# 默认所有移动控制器共用一个tick线程
+default_ticker = Ticker()
+
+
+class MovementController:
+    """
+    控制一个玩家的移动。每tick向目标（或路径上的下一个路点）移动至多step格并发送一次位置，
+    在每个路点处停留一个tick，所以相邻路点间的直线路径不会穿过拐角；
+    收到服务器的位置纠正时，从纠正后的位置继续移动，并将步长减半，
+    之后每recovery_ticks个没有纠正的tick将步长增大25%，直至max_step。
+    """
+
+    def __init__(self, player, ticker=None, max_step=8.0, min_step=0.5,
+                 recovery_ticks=20, settle_ticks=2, max_corrections=10):
+        """
+        :param player: 被控制的PlayerSelf。
+        :param ticker: 驱动移动的Ticker，默认为default_ticker。
+        :param max_step: 每tick最大的移动距离（格）。
+        :param min_step: 步长减小的下限。
+        :param recovery_ticks: 增大一次步长所需的连续无纠正tick数。
+        :param settle_ticks: 到达目标后，确认没有被纠正所需等待的tick数。
+        :param max_corrections: 连续多次被纠正到不比之前更接近目标的位置，
+                                超过此次数则放弃移动。
+        """
+        self.player = player
+        self.connection = player.connection
+        self.ticker = default_ticker if ticker is None else ticker
+        self.max_step = max_step
+        self.min_step = min_step
+        self.recovery_ticks = recovery_ticks
+        self.settle_ticks = settle_ticks
+        self.max_corrections = max_corrections
+        self.step = max_step
+        # 累计被纠正的次数
+        self.corrections = 0
+
+        self._lock = threading.Lock()
+        # 最后一次发送（或被服务器纠正）的位置，未知时为None
+        self._position = None
+        # 当前的路点，及其后剩余的路点
+        self._target = None
+        self._waypoints = deque()
+        self._future = None
+        self._clean_ticks = 0
+        self._settling = 0
+        # 被纠正后离目标最近的距离（的平方），及此后没有进展的纠正次数
+        self._best_distance = None
+        self._failed_corrections = 0
+
+        self.connection.register_packet_listener(self._on_correction, PlayerPositionAndLookPacket)
+
+    @property
+    def moving(self):
+        return self._target is not None
+
+    @property
+    def position(self):
+        """
+        最后一次发送（或被服务器纠正）的位置，未知时为None。
+        """
+        position = self._position
+        return None if position is None else list(position)
+
+    def move_to(self, destination):
+        """
+        开始向destination（3个坐标）移动，取消尚未完成的移动。
+        返回一个concurrent.futures.Future，到达时以最终坐标完成；
+        可以调用其cancel方法停止移动，也可以用asyncio.wrap_future在协程中等待。
+        """
+        return self.move_along([destination])
+
+    def move_along(self, waypoints):
+        """
+        同move_to，但依次经过waypoints中的每个位置，最后一个即为目的地。
+        waypoints为空时引发ValueError，当前的移动不受影响。
+        """
+        waypoints = _to_waypoints(waypoints)
+        future = Future()
+        with self._lock:
+            previous = self._future
+            self._future = future
+            self._set_waypoints(waypoints)
+        if previous is not None:
+            previous.cancel()
+        self.ticker.add(self)
+        return future
+
+    def reroute(self, waypoints):
+        """
+        将当前移动的剩余路点替换为waypoints，而不结束当前的Future。
+        没有正在进行的移动时返回False，waypoints为空时引发ValueError。
+        """
+        waypoints = _to_waypoints(waypoints)
+        with self._lock:
+            if self._future is None:
+                return False
+            self._set_waypoints(waypoints)
+            return True
+
+    def fail(self, error):
+        """
+        以异常error结束当前的移动。
+        """
+        with self._lock:
+            future = self._future
+            self._finish()
+        if future is not None:
+            try:
+                future.set_exception(error)
+            except InvalidStateError:
+                pass
+
+    def _set_waypoints(self, waypoints):
+        # 调用者需持有self._lock，waypoints为_to_waypoints的结果
+        self._waypoints = waypoints
+        self._target = self._waypoints.popleft()
+        self._settling = 0
+        self._best_distance = None
+        self._failed_corrections = 0
+
+    def stop(self):
+        """
+        停止当前的移动。
+        """
+        with self._lock:
+            future = self._future
+            self._finish()
+        if future is not None:
+            future.cancel()
+
+    def tick(self):
+        with self._lock:
+            future = self._future
+            if future is None or future.cancelled():
+                self._finish()
+                return
+            if not self.connection.connected:
+                self._finish()
+                error = ConnectionError('The connection was closed while moving.')
+            elif self._position is None:
+                # 还不知道自己的位置，等待服务器发送
+                return
+            else:
+                error = None
+                position = self._advance()
+        try:
+            if error is not None:
+                future.set_exception(error)
+            elif position is not None:
+                future.set_result(position)
+        except InvalidStateError:
+            # 调用者刚刚取消了这次移动
+            pass
+
+    def _advance(self):
+        # 向目标移动一步，到达且确认未被纠正后返回最终坐标，否则返回None
+        if self._settling:
+            self._settling -= 1
+            if self._settling:
+                return None
+            position = list(self._position)
+            self._finish()
+            return position
+
+        self._clean_ticks += 1
+        if self._clean_ticks >= self.recovery_ticks:
+            self._clean_ticks = 0
+            self.step = min(self.max_step, self.step * 1.25)
+
+        distance, each_diff = move.calculate_distance(self._position, self._target)
+        if distance <= self.step * self.step:
+            self._position = list(self._target)
+            if self._waypoints:
+                self._target = self._waypoints.popleft()
+            else:
+                self._settling = self.settle_ticks + 1
+        else:
+            scale = self.step / distance ** 0.5
+            self._position = [self._position[i] + each_diff[i] * scale for i in range(3)]
+        rotation = self.player.rotation or [0.0, 0.0]
+        move.player_move(self.connection, self._position, rotation, force=False)
+        return None
+
+    def _on_correction(self, packet):
+        # 服务器设置或纠正了玩家的位置
+        failed = None
+        with self._lock:
+            x, y, z = (0.0, 0.0, 0.0) if self._position is None else self._position
+            current = PositionAndLook(x=x, y=y, z=z, yaw=0.0, pitch=0.0)
+            moving = self._position is not None and self._target is not None
+            packet.apply(current)
+            self._position = list(current.position)
+            if moving:
+                self.corrections += 1
+                self._clean_ticks = 0
+                self._settling = 0
+                self.step = max(self.min_step, self.step / 2)
+                distance, _ = move.calculate_distance(self._position, self._target)
+                if self._best_distance is None or distance < self._best_distance:
+                    self._best_distance = distance
+                    self._failed_corrections = 0
+                else:
+                    self._failed_corrections += 1
+                if self._failed_corrections > self.max_corrections:
+                    failed = self._future
+                    self._finish()
+        if failed is not None:
+            try:
+                failed.set_exception(MovementError(
+                    'The server corrected the position %d times without progress.' % (self.max_corrections + 1)))
+            except InvalidStateError:
+                pass
+
+    def _finish(self):
+        # 结束当前的移动，调用者需持有self._lock
+        self._target = None
+        self._waypoints = deque()
+        self._future = None
+        self._settling = 0
+        self.ticker.remove(self)
+
+
+def _to_waypoints(points):
+    # 将路点转换为浮点坐标的deque，没有路点时引发ValueError
+    waypoints = deque([float(c) for c in point] for point in points)
+    if not waypoints:
+        raise ValueError('No waypoints were given.')
+    return waypoints
@@ -0,0 +1,407 @@
+"""
+寻路：在由方块更新维护的世界模型上用A*算法规划路径，并在路径上的方块改变时重新规划。
+
+世界模型可以是任何提供get_block_state(x, y, z)方法的对象（例如world.World），
+该方法返回方块的全局状态ID，未知（例如区块尚未加载）时返回None。
+"""
+import heapq
+import math
+import threading
+from concurrent.futures import Future
+
+from minecraft.exceptions import MovementError
+from minecraft.networking.packets.clientbound.play import (
+    BlockChangePacket, MultiBlockChangePacket, PlayerPositionAndLookPacket,
+    ChunkDataPacket, UnloadChunkPacket)
+from .world import block_changes
+
+# 方块的种类：可以穿过、实心（可以站在上面）、未知
+PASSABLE, SOLID, UNKNOWN = 1, 2, 3
+
+# 默认只有空气（全局状态ID为0）可以穿过
+DEFAULT_PASSABLE_STATES = frozenset((0,))
+
+# 水平方向的8个邻居，前4个为正交方向
+_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1),
+               (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+_SQRT2 = math.sqrt(2)
+
+
+class Pathfinder:
+    """
+    在world上寻找玩家（高2格）可以行走的路径。
+
+    玩家可以站在脚和头所在方块都可以穿过、脚下方块为实心的位置上，
+    每步可以水平移动到8个相邻位置之一（斜向移动要求两侧的正交位置都可以穿过），
+    向正交方向跳上1格，或向正交方向落下至多max_drop格。未知的方块视为可以穿过，但不能站在上面。
+
+    每个区块段（16x16x16）中每个位置的方块种类和是否可以站立都缓存在bytearray中，
+    每个位置可以一步到达的位置也被缓存，方块改变时只需使受影响的位置失效。
+    """
+
+    def __init__(self, world, passable_states=DEFAULT_PASSABLE_STATES, max_drop=3,
+                 max_nodes=20000, max_cached_sections=1024, max_cached_nodes=200000):
+        """
+        :param world: 世界模型。
+        :param passable_states: 可以穿过的方块的全局状态ID。
+        :param max_drop: 一步可以落下的最大高度。
+        :param max_nodes: 一次寻路最多展开的位置数，超过则认为没有路径。
+        :param max_cached_sections: 缓存的区块段数超过此数时清空缓存。
+        :param max_cached_nodes: 缓存了相邻位置的位置数超过此数时清空该缓存。
+        """
+        self.world = world
+        self.passable_states = frozenset(passable_states)
+        self.max_drop = max_drop
+        self.max_nodes = max_nodes
+        self.max_cached_sections = max_cached_sections
+        self.max_cached_nodes = max_cached_nodes
+        self._lock = threading.RLock()
+        # 区块段坐标 -> bytearray(4096)，0表示尚未计算
+        self._kinds = {}
+        self._walkable = {}
+        # 位置 -> ((相邻位置, 代价), ...)
+        self._edges = {}
+
+    def block_changed(self, x, y, z):
+        """
+        使受(x, y, z)处方块影响的缓存失效：该方块的种类，站在其上、其中和其下的位置，
+        以及水平距离为1以内、可能经过该方块到达相邻位置的位置。
+        """
+        with self._lock:
+            self._forget(self._kinds, x, y, z)
+            for dy in (-1, 0, 1):
+                self._forget(self._walkable, x, y + dy, z)
+            edges = self._edges
+            for ny in range(y - 2, y + self.max_drop + 2):
+                for nx in (x - 1, x, x + 1):
+                    for nz in (z - 1, z, z + 1):
+                        edges.pop((nx, ny, nz), None)
+
+    def section_changed(self, sx, sy, sz):
+        """
+        使一个区块段（例如刚刚加载的区块中的）的缓存失效。
+        """
+        with self._lock:
+            self._kinds.pop((sx, sy, sz), None)
+            for dy in (-1, 0, 1):
+                self._walkable.pop((sx, sy + dy, sz), None)
+            self._edges.clear()
+
+    def chunk_changed(self, cx, cz):
+        """
+        使一个区块（例如刚刚加载或卸载的）中所有区块段的缓存失效。
+        """
+        with self._lock:
+            for caches in (self._kinds, self._walkable):
+                for key in [key for key in caches if key[0] == cx and key[2] == cz]:
+                    del caches[key]
+            self._edges.clear()
+
+    def clear(self):
+        with self._lock:
+            self._kinds.clear()
+            self._walkable.clear()
+            self._edges.clear()
+
+    def block_kind(self, x, y, z):
+        index = (y & 15) << 8 | (z & 15) << 4 | (x & 15)
+        cache = self._section_cache(self._kinds, x, y, z)
+        kind = cache[index]
+        if not kind:
+            state = self.world.get_block_state(x, y, z)
+            kind = UNKNOWN if state is None else \
+                PASSABLE if state in self.passable_states else SOLID
+            cache[index] = kind
+        return kind
+
+    def is_passable(self, x, y, z):
+        return self.block_kind(x, y, z) != SOLID
+
+    def is_walkable(self, x, y, z):
+        """
+        玩家的脚是否可以位于(x, y, z)处。
+        """
+        index = (y & 15) << 8 | (z & 15) << 4 | (x & 15)
+        cache = self._section_cache(self._walkable, x, y, z)
+        walkable = cache[index]
+        if not walkable:
+            walkable = 1 if self.block_kind(x, y - 1, z) == SOLID and \
+                self.is_passable(x, y, z) and self.is_passable(x, y + 1, z) else 2
+            cache[index] = walkable
+        return walkable == 1
+
+    def find_path(self, start, goal):
+        """
+        返回从start到goal（均为脚所在方块的坐标）经过的每个位置的列表，
+        包括start和goal；没有找到路径时返回None。start本身不必可以站立。
+        """
+        start, goal = tuple(start), tuple(goal)
+        with self._lock:
+            if start == goal:
+                return [start]
+            if not self.is_walkable(*goal):
+                return None
+
+            heuristic = self._heuristic
+            edges_cache = self._edges
+            # 堆中的元素为(f, -g, 位置)：f相同时优先展开离起点更远的位置
+            open_set = [(heuristic(start, goal), 0.0, start)]
+            costs = {start: 0.0}
+            parents = {start: None}
+            closed = set()
+            while open_set:
+                _, cost, node = heapq.heappop(open_set)
+                if node == goal:
+                    return self._reconstruct(parents, node)
+                if node in closed:
+                    continue
+                closed.add(node)
+                if len(closed) > self.max_nodes:
+                    return None
+                cost = -cost
+                edges = edges_cache.get(node)
+                if edges is None:
+                    edges = self.neighbours(node)
+                for neighbour, step_cost in edges:
+                    new_cost = cost + step_cost
+                    if new_cost < costs.get(neighbour, math.inf):
+                        costs[neighbour] = new_cost
+                        parents[neighbour] = node
+                        heapq.heappush(open_set, (
+                            new_cost + heuristic(neighbour, goal), -new_cost, neighbour))
+            return None
+
+    def neighbours(self, node):
+        """
+        返回从node一步可以到达的每个位置及其代价。
+        """
+        with self._lock:
+            edges = self._edges.get(node)
+            if edges is None:
+                if len(self._edges) >= self.max_cached_nodes:
+                    self._edges.clear()
+                edges = self._edges[node] = tuple(self._neighbours(node))
+            return edges
+
+    def _neighbours(self, node):
+        x, y, z = node
+        is_walkable, is_passable = self.is_walkable, self.is_passable
+        for i, (dx, dz) in enumerate(_DIRECTIONS):
+            nx, nz = x + dx, z + dz
+            if i >= 4:
+                # 斜向移动不能穿过拐角
+                if is_walkable(nx, y, nz) and \
+                   is_passable(nx, y, z) and is_passable(nx, y + 1, z) and \
+                   is_passable(x, y, nz) and is_passable(x, y + 1, nz):
+                    yield (nx, y, nz), _SQRT2
+                continue
+            if is_walkable(nx, y, nz):
+                yield (nx, y, nz), 1.0
+            elif is_walkable(nx, y + 1, nz):
+                # 跳上一格，需要头顶有空间
+                if is_passable(x, y + 2, z):
+                    yield (nx, y + 1, nz), 2.0
+            elif is_passable(nx, y, nz) and is_passable(nx, y + 1, nz):
+                # 落下，需要经过的位置都可以穿过
+                for drop in range(1, self.max_drop + 1):
+                    if is_walkable(nx, y - drop, nz):
+                        yield (nx, y - drop, nz), 1.0 + drop
+                        break
+                    if not is_passable(nx, y - drop, nz):
+                        break
+
+    @staticmethod
+    def _heuristic(node, goal):
+        dx, dz = abs(node[0] - goal[0]), abs(node[2] - goal[2])
+        return (_SQRT2 - 1) * min(dx, dz) + max(dx, dz) + abs(node[1] - goal[1])
+
+    @staticmethod
+    def _reconstruct(parents, node):
+        path = []
+        while node is not None:
+            path.append(node)
+            node = parents[node]
+        path.reverse()
+        return path
+
+    def _section_cache(self, caches, x, y, z):
+        key = (x >> 4, y >> 4, z >> 4)
+        cache = caches.get(key)
+        if cache is None:
+            if len(caches) >= self.max_cached_sections:
+                caches.clear()
+            cache = caches[key] = bytearray(4096)
+        return cache
+
+    @staticmethod
+    def _forget(caches, x, y, z):
+        cache = caches.get((x >> 4, y >> 4, z >> 4))
+        if cache is not None:
+            cache[(y & 15) << 8 | (z & 15) << 4 | (x & 15)] = 0
+
+
+def path_waypoints(path, destination=None):
+    """
+    将find_path返回的路径转换为MovementController.move_along使用的路点：
+    位于方块中心，跳上时先竖直上升、落下时先水平移动，使每段路径都不穿过方块，
+    并合并同一直线上的连续路段。destination不为None时，用其替换最后一个路点。
+    """
+    points = [path[0]]
+    for (x0, y0, z0), (x1, y1, z1) in zip(path, path[1:]):
+        if y1 > y0:
+            points.append((x0, y1, z0))
+        elif y1 < y0:
+            points.append((x1, y0, z1))
+        points.append((x1, y1, z1))
+
+    waypoints = []
+    direction = None
+    for previous, point in zip(points, points[1:]):
+        delta = (point[0] - previous[0], point[1] - previous[1], point[2] - previous[2])
+        if delta == direction:
+            waypoints[-1] = point
+        else:
+            waypoints.append(point)
+            direction = delta
+    # 路径只有一个位置时，移动到该方块中心
+    waypoints = [[x + 0.5, y, z + 0.5] for x, y, z in waypoints or path]
+    if destination is not None:
+        waypoints[-1] = list(destination)
+    return waypoints
+
+
+def _path_cells(path):
+    # 路径经过的、改变后可能使路径失效的方块：每个位置的脚下、脚和头所在的方块，
+    # 以及跳上时头顶、落下时经过的方块
+    cells = set()
+    for x, y, z in path:
+        cells.update(((x, y - 1, z), (x, y, z), (x, y + 1, z), (x, y + 2, z)))
+    for (x0, y0, z0), (x1, y1, z1) in zip(path, path[1:]):
+        for y in range(min(y0, y1), max(y0, y1) + 2):
+            cells.update(((x0, y, z1), (x1, y, z0)))
+    return cells
+
+
+class Navigator:
+    """
+    沿寻路得到的路径移动玩家。路径上的方块改变或服务器纠正玩家位置时，
+    在tick线程中从当前位置重新规划剩余的路径。
+    """
+
+    def __init__(self, player, ticker=None, **kwds):
+        """
+        :param player: 被控制的PlayerSelf，其world属性为世界模型。
+        :param ticker: 执行重新规划的Ticker，默认与player.movement相同。
+        :param kwds: 传给Pathfinder的参数。
+        """
+        self.player = player
+        self.controller = player.movement
+        self.ticker = self.controller.ticker if ticker is None else ticker
+        self.pathfinder_options = kwds
+        # 重新规划的次数
+        self.replans = 0
+
+        self._pathfinder = None
+        self._lock = threading.Lock()
+        self._future = None
+        self._goal = None
+        self._destination = None
+        self._cells = frozenset()
+        self._dirty = False
+
+        connection = player.connection
+        connection.register_packet_listener(
+            self._on_block_change, BlockChangePacket, MultiBlockChangePacket)
+        connection.register_packet_listener(
+            self._on_chunk_change, ChunkDataPacket, UnloadChunkPacket)
+        connection.register_packet_listener(self._on_correction, PlayerPositionAndLookPacket)
+
+    @property
+    def pathfinder(self):
+        world = self.player.world
+        pathfinder = self._pathfinder
+        if pathfinder is None or pathfinder.world is not world:
+            pathfinder = self._pathfinder = Pathfinder(world, **self.pathfinder_options)
+        return pathfinder
+
+    def move_to(self, destination):
+        """
+        沿寻路得到的路径移动到destination，返回的Future同MovementController.move_to；
+        找不到路径时，Future以MovementError结束。
+        """
+        destination = [float(c) for c in destination]
+        goal = tuple(math.floor(c) for c in destination)
+        position = self.controller.position or self.player.position
+        path = self.pathfinder.find_path(_cell(position), goal) if position else None
+        if path is None:
+            self.controller.stop()
+            future = Future()
+            future.set_exception(MovementError('No path to %r was found.' % (destination,)))
+            return future
+
+        future = self.controller.move_along(path_waypoints(path, destination))
+        with self._lock:
+            self._future = future
+            self._goal = goal
+            self._destination = destination
+            self._cells = _path_cells(path)
+            self._dirty = False
+        self.ticker.add(self)
+        return future
+
+    def tick(self):
+        with self._lock:
+            future = self._future
+            if future is None or future.done():
+                self._future = None
+                self._cells = frozenset()
+                self.ticker.remove(self)
+                return
+            if not self._dirty:
+                return
+            self._dirty = False
+            goal, destination = self._goal, self._destination
+
+        position = self.controller.position or self.player.position
+        if not position:
+            # 服务器尚未发送位置，等到下一刻再重新寻路
+            with self._lock:
+                if self._future is future:
+                    self._dirty = True
+            return
+        path = self.pathfinder.find_path(_cell(position), goal)
+        if path is None:
+            self.controller.fail(MovementError('No path to %r remains.' % (destination,)))
+            return
+        with self._lock:
+            if self._future is not future:
+                return
+            self._cells = _path_cells(path)
+        self.controller.reroute(path_waypoints(path, destination))
+        self.replans += 1
+
+    def _on_block_change(self, packet):
+        pathfinder = self._pathfinder
+        for position, _state in block_changes(packet):
+            if pathfinder is not None:
+                pathfinder.block_changed(*position)
+            if position in self._cells:
+                self._dirty = True
+
+    def _on_chunk_change(self, packet):
+        pathfinder = self._pathfinder
+        if pathfinder is not None:
+            pathfinder.chunk_changed(*packet.chunk_pos)
+        cx, cz = packet.chunk_pos
+        if any(x >> 4 == cx and z >> 4 == cz for x, _y, z in self._cells):
+            self._dirty = True
+
+    def _on_correction(self, _packet):
+        if self._future is not None:
+            self._dirty = True
+
+
+def _cell(position):
+    # 脚所在方块的坐标
+    return tuple(math.floor(c + 1e-6) for c in position)
@@ -0,0 +1,338 @@
+"""
+原理图与世界模型的差异：找出放置在世界中的原理图还有哪些方块需要放置或者是错误的。
+
+差异按区块段（16x16x16）计算，可以分给一个进程池并行计算；
+之后由方块更新和区块数据包增量地维护，而不必重新计算。
+"""
+import contextlib
+import functools
+import itertools
+import os
+import sys
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from minecraft.networking.packets.clientbound.play import (
+    BlockChangePacket, MultiBlockChangePacket, ChunkDataPacket, UnloadChunkPacket)
+from minecraft.schematic.palette import getBlockRegistry
+from .world import block_changes
+
+# 被忽略的目标方块（未知的状态，或不包含空气时的空气）
+IGNORED = 0xFFFE
+# 世界中未加载的方块
+UNKNOWN = 0xFFFF
+
+# 视为空气的方块id
+AIR_BLOCKS = frozenset(('minecraft:air', 'minecraft:cave_air', 'minecraft:void_air'))
+
+# 每个进程池任务包含的区块段数
+_BATCH_SECTIONS = 64
+
+
+class SchematicDiff:
+    """
+    schematic（已用setSchematicPosition放置，以第一个区域为准）与world之间的差异。
+
+    对每个区块段，记录每个目标全局状态ID在该区块段中所有与之不符的方块的下标
+    ((y & 15) << 8 | (z & 15) << 4 | (x & 15))，为类型为'H'的array；
+    未加载的区块中的方块不计入差异，区块加载后重新计算其中的区块段，卸载后其中的方块重新计为未加载。
+    """
+
+    def __init__(self, schematic, world, protocol, include_air=False, executor=None):
+        """
+        :param schematic: 原理图（minecraft.schematic.Schematic）。
+        :param world: 世界模型（world.World）。
+        :param protocol: 将原理图的调色板映射为全局状态ID所用的协议版本。
+        :param include_air: 原理图中的空气是否也要求世界中为空气。
+        :param executor: 计算差异所用的concurrent.futures.Executor，
+                         默认在区块段较多时创建一个ProcessPoolExecutor。
+        """
+        self.schematic = schematic
+        self.world = world
+        self.protocol = protocol
+        self.include_air = include_air
+        self.executor = executor
+
+        # 调色板下标 -> 目标全局状态ID，被忽略的为IGNORED
+        self.targets = array('H', (
+            IGNORED if stateId < 0 or (not include_air and state[0] in AIR_BLOCKS) else stateId
+            for stateId, state in zip(schematic.globalStateIds(protocol), schematic.palette)))
+        # 空气的所有全局状态ID（1.13起cave_air和void_air的ID不为0）
+        registry = getBlockRegistry(protocol)
+        self.air_states = frozenset(stateId for name in AIR_BLOCKS for stateId in registry.blockStateIds(name))
+        # 区块段坐标 -> {目标全局状态ID: 方块下标的array}
+        self._sections = {}
+        # 区块段坐标 -> 其中未加载的方块数
+        self._unknown = {}
+        self._lock = threading.Lock()
+        # 每次compute开始时加1；compute进行时，增量更新同时记录在_changes中，
+        # 完成后在新的结果上重放，使其不会丢失
+        self._generation = 0
+        self._changes = None
+
+    def register_connection(self, connection):
+        """
+        随连接收到的方块更新和区块数据增量地更新差异。世界模型须先于此更新（见trace_block）。
+        """
+        connection.register_packet_listener(self.apply_block_changes, BlockChangePacket, MultiBlockChangePacket)
+        connection.register_packet_listener(self._on_chunk, ChunkDataPacket, UnloadChunkPacket)
+
+    def compute(self):
+        """
+        重新计算全部差异，返回self。
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._changes = []
+        # 任务在提交时才生成，所以同时只有少量区块段的数据在内存中
+        tasks = (self._task(key, box) for key, box in self._section_boxes())
+        batches = iter(lambda: list(itertools.islice(tasks, _BATCH_SECTIONS)), [])
+        diff = functools.partial(_diff_sections, self.targets.tobytes())
+        xs, ys, zs = self._section_ranges()
+        sections, unknowns = {}, {}
+        with contextlib.ExitStack() as stack:
+            executor = self.executor
+            if executor is None and len(xs) * len(ys) * len(zs) > 2 * _BATCH_SECTIONS:
+                executor = stack.enter_context(ProcessPoolExecutor())
+            results = map(diff, batches) if executor is None else _map_bounded(executor, diff, batches)
+            for batch in results:
+                for key, section, unknown in batch:
+                    if section:
+                        sections[key] = section
+                    if unknown:
+                        unknowns[key] = unknown
+
+        with self._lock:
+            if generation != self._generation:
+                # 之后开始的compute的结果更新
+                return self
+            self._sections = sections
+            self._unknown = unknowns
+            changes, self._changes = self._changes, None
+            for change in changes:
+                if len(change) == 2:
+                    self._compute_chunk(*change)
+                else:
+                    self._update_block(*change)
+        return self
+
+    def compute_chunk(self, cx, cz):
+        """
+        在当前线程中按世界模型的当前状态重新计算区块(cx, cz)中的区块段，区块已卸载时其中的方块计为未加载。
+        """
+        xs, _, zs = self._section_ranges()
+        if cx not in xs or cz not in zs:
+            return
+        with self._lock:
+            self._compute_chunk(cx, cz)
+            if self._changes is not None:
+                self._changes.append((cx, cz))
+
+    def apply_block_changes(self, packet):
+        """
+        根据一个BlockChangePacket或MultiBlockChangePacket更新差异。
+        """
+        for (x, y, z), state in block_changes(packet):
+            self.update_block(x, y, z, state)
+
+    def update_block(self, x, y, z, state):
+        """
+        世界中(x, y, z)处方块的全局状态ID变为state后，更新差异。
+        """
+        target = self._target(x, y, z)
+        if target is None or target == IGNORED:
+            return
+        with self._lock:
+            self._update_block(x, y, z, state, target)
+            if self._changes is not None:
+                self._changes.append((x, y, z, state, target))
+
+    def count(self):
+        """
+        需要放置或错误的方块数。
+        """
+        with self._lock:
+            return sum(len(indices) for section in self._sections.values() for indices in section.values())
+
+    def unknown(self):
+        """
+        位于未加载的区块中的方块数，区块加载或卸载后由compute_chunk更新。
+        """
+        with self._lock:
+            return sum(self._unknown.values())
+
+    def remaining(self):
+        """
+        返回{目标全局状态ID: 类型为'i'的array}，后者依次为每个与目标不符的方块的x, y, z坐标。
+        """
+        with self._lock:
+            sections = [(key, dict(section)) for key, section in self._sections.items()]
+        result = {}
+        for (sx, sy, sz), section in sections:
+            for target, indices in section.items():
+                coordinates = result.setdefault(target, array('i'))
+                for index in indices:
+                    coordinates.extend((sx << 4 | index & 15, sy << 4 | index >> 8, sz << 4 | index >> 4 & 15))
+        return result
+
+    def wrong(self):
+        """
+        返回与目标不符且不是空气（需要先破坏）的方块的坐标，为类型为'i'的array，依次为x, y, z。
+        """
+        result = array('i')
+        get_block_state = self.world.get_block_state
+        air_states = self.air_states
+        for coordinates in self.remaining().values():
+            for i in range(0, len(coordinates), 3):
+                x, y, z = coordinates[i:i + 3]
+                state = get_block_state(x, y, z)
+                if state is not None and state not in air_states:
+                    result.extend((x, y, z))
+        return result
+
+    def _update_block(self, x, y, z, state, target):
+        # 调用者需持有self._lock；对同一方块重复调用的结果不变，所以可以重放
+        key = x >> 4, y >> 4, z >> 4
+        index = (y & 15) << 8 | (z & 15) << 4 | (x & 15)
+        section = self._sections.get(key, {})
+        indices = section.get(target)
+        present = indices is not None and index in indices
+        if present and state == target:
+            indices.remove(index)
+            if not indices:
+                del section[target]
+            if not section:
+                del self._sections[key]
+        elif not present and state != target:
+            section.setdefault(target, array('H')).append(index)
+            self._sections[key] = section
+
+    def _compute_chunk(self, cx, cz):
+        # 调用者需持有self._lock，使读取世界模型与保存结果之间不会插入其他更新
+        _, ys, _ = self._section_ranges()
+        tasks = [self._task((cx, sy, cz), self._section_box(cx, sy, cz)) for sy in ys]
+        for key, section, unknown in _diff_sections(self.targets.tobytes(), tasks):
+            self._store(key, section, unknown)
+
+    def _store(self, key, section, unknown):
+        # 调用者需持有self._lock
+        if section:
+            self._sections[key] = section
+        else:
+            self._sections.pop(key, None)
+        if unknown:
+            self._unknown[key] = unknown
+        else:
+            self._unknown.pop(key, None)
+
+    def _target(self, x, y, z):
+        # 原理图在(x, y, z)处的目标全局状态ID，在原理图之外时返回None
+        schematic = self.schematic
+        px, py, pz = schematic.position
+        x, y, z = x - px, y - py, z - pz
+        if not (0 <= x < schematic.sizeX and 0 <= y < schematic.sizeY and 0 <= z < schematic.sizeZ):
+            return None
+        return self.targets[schematic.regions[0].getAt(x, y, z)]
+
+    def _section_ranges(self):
+        # 原理图所覆盖的区块段的x, y, z坐标的range
+        schematic = self.schematic
+        return tuple(range(p >> 4, ((p + size - 1) >> 4) + 1) for p, size in
+                     zip(schematic.position, (schematic.sizeX, schematic.sizeY, schematic.sizeZ)))
+
+    def _section_box(self, sx, sy, sz):
+        # 区块段中属于原理图的部分（绝对坐标的半开区间）
+        schematic = self.schematic
+        px, py, pz = schematic.position
+        x1, y1, z1 = px + schematic.sizeX, py + schematic.sizeY, pz + schematic.sizeZ
+        return (max(px, sx << 4), max(py, sy << 4), max(pz, sz << 4),
+                min(x1, (sx + 1) << 4), min(y1, (sy + 1) << 4), min(z1, (sz + 1) << 4))
+
+    def _section_boxes(self):
+        # 生成原理图所覆盖的每个区块段的坐标及其中属于原理图的部分
+        xs, ys, zs = self._section_ranges()
+        for sy in ys:
+            for sz in zs:
+                for sx in xs:
+                    yield (sx, sy, sz), self._section_box(sx, sy, sz)
+
+    def _task(self, key, box):
+        # 一个区块段的计算任务：坐标、范围、原理图中的调色板下标和世界中的全局状态ID
+        px, py, pz = self.schematic.position
+        x0, y0, z0, x1, y1, z1 = box
+        indices = self.schematic.getRegion((x0 - px, y0 - py, z0 - pz, x1 - px, y1 - py, z1 - pz))
+        states = self.world.get_box(x0, y0, z0, x1, y1, z1, default=UNKNOWN)
+        return key, box, indices.tobytes(), states.tobytes()
+
+    def _on_chunk(self, packet):
+        # 世界模型已先加载或卸载了该区块
+        self.compute_chunk(*packet.chunk_pos)
+
+
+def _diff_sections(table, tasks):
+    """
+    比较若干区块段（见SchematicDiff._task），可以在其他进程中执行。
+    返回每个区块段的(坐标, {目标全局状态ID: 方块下标的array}, 未加载的方块数)。
+    """
+    targets = array('H')
+    targets.frombytes(table)
+    results = []
+    for key, box, indices, states in tasks:
+        x0, y0, z0, x1, y1, z1 = box
+        wanted = _map_indices(indices, targets)
+        if wanted == states:
+            # 已经完成的区块段
+            results.append((key, {}, 0))
+            continue
+        wanted = array('H', wanted)
+        actual = array('H')
+        actual.frombytes(states)
+        section, unknown = {}, 0
+        width, depth = x1 - x0, z1 - z0
+        for i, (target, state) in enumerate(zip(wanted, actual)):
+            if target == state or target == IGNORED:
+                continue
+            if state == UNKNOWN:
+                unknown += 1
+                continue
+            row, x = divmod(i, width)
+            y, z = divmod(row, depth)
+            index = (y0 + y & 15) << 8 | (z0 + z & 15) << 4 | (x0 + x & 15)
+            indices_of_target = section.get(target)
+            if indices_of_target is None:
+                indices_of_target = section[target] = array('H')
+            indices_of_target.append(index)
+        results.append((key, section, unknown))
+    return results
+
+
+def _map_bounded(executor, function, iterable):
+    # 同executor.map，但提交的任务最多比已取得的结果多出若干个，所以iterable按需生成
+    pending = deque()
+    limit = 2 * (os.cpu_count() or 1)
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _map_indices(indices, targets):
+    # 将调色板下标（类型为'H'的array的字节）映射为目标全局状态ID，返回同样格式的字节
+    if len(targets) <= 256:
+        # 下标只有低字节非0，用bytes.translate分别得到目标的低字节和高字节
+        little = sys.byteorder == 'little'
+        values = indices[0::2] if little else indices[1::2]
+        low = bytes(target & 0xFF for target in targets).ljust(256, b'\0')
+        high = bytes(target >> 8 for target in targets).ljust(256, b'\0')
+        result = bytearray(len(indices))
+        result[0::2] = values.translate(low if little else high)
+        result[1::2] = values.translate(high if little else low)
+        return bytes(result)
+    source = array('H')
+    source.frombytes(indices)
+    return array('H', map(targets.__getitem__, source)).tobytes()
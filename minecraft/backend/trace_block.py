@@ -1,27 +1,45 @@
 from minecraft.networking.connection import Connection
-from minecraft.networking.packets.clientbound.play import NBTQueryPacket, BlockChangePacket, MultiBlockChangePacket
+from minecraft.networking.packets.clientbound.play import (
+    NBTQueryPacket, BlockChangePacket, MultiBlockChangePacket, JoinGamePacket, RespawnPacket,
+    ChunkDataPacket, UnloadChunkPacket)
 from minecraft.networking.packets.serverbound.play import QueryBlockNBTPacket
 from .Player import PlayerSelf
-
-"""
-TODO:
-    监听方块状态信息，完成对世界的实时建模。
-"""
+from .world import World
 
 
 def register_connection(c: Connection, player: PlayerSelf):
+    """
+    监听区块数据和方块更新，在player.world中完成对世界的实时建模。
+    """
     connection = c
+    world = player.world = World()
 
-    @connection.listener(QueryBlockNBTPacket,NBTQueryPacket)
-    def trace_query(_p):
-        print(_p)
-        pass
+    # 世界模型先于其他监听器更新，使它们（例如寻路）看到的是更新后的世界
+    @connection.listener(JoinGamePacket, RespawnPacket, early=True)
+    def trace_dimension(_p):
+        dimension = _p.dimension
+        if _p.context.protocol_later_eq(755):
+            world.set_dimension(dimension['min_y'].value, dimension['height'].value)
+        else:
+            world.set_dimension()
+
+    @connection.listener(ChunkDataPacket, early=True)
+    def trace_chunk(_p):
+        world.load_chunk(_p)
 
-    @connection.listener(BlockChangePacket, MultiBlockChangePacket)
+    @connection.listener(UnloadChunkPacket, early=True)
+    def trace_unload_chunk(_p):
+        world.unload_chunk(_p.chunk_x, _p.chunk_z)
+
+    @connection.listener(BlockChangePacket, MultiBlockChangePacket, early=True)
     def trace_block_change(_p):
+        world.apply_block_changes(_p)
+
+    @connection.listener(QueryBlockNBTPacket,NBTQueryPacket)
+    def trace_query(_p):
         print(_p)
         pass
 
     @connection.listener(QueryBlockNBTPacket,outgoing=True)
     def a(_p):
-        print(_p)
\ No newline at end of file
+        print(_p)
@@ -0,0 +1,210 @@
+"""
+世界模型：由区块数据包和方块更新维护的已加载区块中每个方块的全局状态ID。
+
+每个区块段（16x16x16）以调色板压缩的array保存（见ChunkSection），
+单点查询为O(1)，区域查询按行从区块段中切片复制。
+"""
+import threading
+from array import array
+
+from minecraft.networking.packets.clientbound.play import BlockChangePacket, MultiBlockChangePacket
+from minecraft.networking.packets.clientbound.play.chunk_data_packet import ChunkSection
+
+
+def block_changes(packet):
+    """
+    返回BlockChangePacket或MultiBlockChangePacket中改变的每个方块的((x, y, z), 全局状态ID)。
+    """
+    if isinstance(packet, BlockChangePacket):
+        location = packet.location
+        return [((location.x, location.y, location.z), packet.block_state_id)]
+    base_x, base_y, base_z = _records_base(packet)
+    xs, ys, zs, states = _record_arrays(packet.records)
+    return [((base_x + x, base_y + y, base_z + z), state)
+            for x, y, z, state in zip(xs, ys, zs, states)]
+
+
+def _records_base(packet):
+    # MultiBlockChangePacket中相对坐标的原点
+    if packet.context.protocol_later_eq(741):
+        # 坐标相对于区块段
+        sx, sy, sz = packet.chunk_section_pos
+        return sx << 4, sy << 4, sz << 4
+    # 水平坐标相对于区块，y为绝对坐标
+    return packet.chunk_x << 4, 0, packet.chunk_z << 4
+
+
+def _record_arrays(records):
+    # 返回记录的x, y, z和状态ID的并列序列
+    if isinstance(records, MultiBlockChangePacket.RecordArray):
+        return records.x, records.y, records.z, records.block_state_id
+    return ([r.x for r in records], [r.y for r in records],
+            [r.z for r in records], [r.block_state_id for r in records])
+
+
+class World:
+    """
+    已加载区块的方块状态。chunks将区块坐标(cx, cz)映射到该区块从下往上的各区块段，
+    None表示全部为空气的区块段。
+
+    区块数据包和方块更新在网络线程中应用，查询可以在任何线程中进行。
+    """
+
+    def __init__(self, min_y=0, height=256):
+        """
+        :param min_y: 世界的最低y坐标。
+        :param height: 世界的高度，为16的倍数。
+        """
+        self.min_y = min_y
+        self.height = height
+        self.chunks = {}
+        self._lock = threading.Lock()
+
+    def set_dimension(self, min_y=0, height=256):
+        """
+        进入（或重生到）一个维度时调用，卸载所有区块。
+        """
+        with self._lock:
+            self.min_y = min_y
+            self.height = height
+            self.chunks = {}
+
+    def load_chunk(self, packet):
+        """
+        应用一个ChunkDataPacket。不完整的区块（full_chunk为False）只更新其中发送了的区块段。
+        """
+        count = self.height >> 4
+        sections = list(packet.sections[:count])
+        with self._lock:
+            if packet.full_chunk:
+                sections += [None] * (count - len(sections))
+                self.chunks[packet.chunk_pos] = sections
+                return
+            current = self.chunks.get(packet.chunk_pos)
+            if current is None:
+                return
+            for i, section in enumerate(sections):
+                if section is not None:
+                    current[i] = section
+
+    def unload_chunk(self, cx, cz):
+        with self._lock:
+            self.chunks.pop((cx, cz), None)
+
+    def is_loaded(self, cx, cz):
+        return (cx, cz) in self.chunks
+
+    def get_block_state(self, x, y, z):
+        """
+        返回(x, y, z)处方块的全局状态ID，所在区块未加载时返回None，世界高度之外视为空气。
+        """
+        sections = self.chunks.get((x >> 4, z >> 4))
+        if sections is None:
+            return None
+        i = (y - self.min_y) >> 4
+        if not 0 <= i < len(sections):
+            return 0
+        with self._lock:
+            section = sections[i]
+            if section is None:
+                return 0
+            return section.get((y & 15) << 8 | (z & 15) << 4 | (x & 15))
+
+    def set_block_state(self, x, y, z, state):
+        """
+        设置(x, y, z)处方块的全局状态ID，所在区块未加载或在世界高度之外时忽略，返回是否设置了。
+        """
+        return self.set_block_states((x,), (y,), (z,), (state,)) == 1
+
+    def set_block_states(self, xs, ys, zs, states, base=(0, 0, 0)):
+        """
+        一次设置多个方块：坐标为base加上xs, ys, zs中的对应元素，状态ID为states中的对应元素。
+        忽略未加载的区块和世界高度之外的方块，返回设置了的方块数。
+        """
+        base_x, base_y, base_z = base
+        min_y, chunks = self.min_y, self.chunks
+        count = 0
+        key = sections = None
+        with self._lock:
+            for x, y, z, state in zip(xs, ys, zs, states):
+                x += base_x
+                y += base_y
+                z += base_z
+                if (x >> 4, z >> 4) != key:
+                    key = x >> 4, z >> 4
+                    sections = chunks.get(key)
+                if sections is None:
+                    continue
+                i = (y - min_y) >> 4
+                if not 0 <= i < len(sections):
+                    continue
+                count += 1
+                section = sections[i]
+                if section is None:
+                    if state == 0:
+                        continue
+                    section = sections[i] = ChunkSection.filled(0)
+                section.set((y & 15) << 8 | (z & 15) << 4 | (x & 15), state)
+        return count
+
+    def apply_block_changes(self, packet):
+        """
+        应用一个BlockChangePacket或MultiBlockChangePacket，后者的记录一次全部应用。
+        """
+        if isinstance(packet, BlockChangePacket):
+            location = packet.location
+            self.set_block_state(location.x, location.y, location.z, packet.block_state_id)
+        else:
+            self.set_block_states(*_record_arrays(packet.records), base=_records_base(packet))
+
+    def get_box(self, x0, y0, z0, x1, y1, z1, default=0):
+        """
+        返回x0 <= x < x1、y0 <= y < y1、z0 <= z < z1范围内每个方块的全局状态ID，
+        为一个类型为'H'的array，下标为((y - y0) * (z1 - z0) + (z - z0)) * (x1 - x0) + (x - x0)。
+        未加载的区块中的方块为default。
+        """
+        width, depth = x1 - x0, z1 - z0
+        if width <= 0 or depth <= 0 or y1 <= y0:
+            return array('H')
+        result = array('H', [default]) * (width * depth * (y1 - y0))
+        min_y = self.min_y
+        for cx in range(x0 >> 4, ((x1 - 1) >> 4) + 1):
+            bx0, bx1 = max(x0, cx << 4), min(x1, (cx + 1) << 4)
+            for cz in range(z0 >> 4, ((z1 - 1) >> 4) + 1):
+                sections = self.chunks.get((cx, cz))
+                if sections is None:
+                    continue
+                bz0, bz1 = max(z0, cz << 4), min(z1, (cz + 1) << 4)
+                for sy in range(y0 >> 4, ((y1 - 1) >> 4) + 1):
+                    by0, by1 = max(y0, sy << 4), min(y1, (sy + 1) << 4)
+                    i = ((sy << 4) - min_y) >> 4
+                    with self._lock:
+                        section = sections[i] if 0 <= i < len(sections) else None
+                        states = None if section is None else section.states()
+                    if states is None:
+                        # 空气
+                        row = array('H', [0]) * (bx1 - bx0)
+                    for y in range(by0, by1):
+                        for z in range(bz0, bz1):
+                            start = ((y - y0) * depth + (z - z0)) * width + (bx0 - x0)
+                            if states is not None:
+                                offset = (y & 15) << 8 | (z & 15) << 4
+                                row = states[offset + (bx0 & 15):offset + ((bx1 - 1) & 15) + 1]
+                            result[start:start + bx1 - bx0] = row
+        return result
+
+    def memory_usage(self):
+        """
+        估计保存方块状态所用的字节数。
+        """
+        total = 0
+        with self._lock:
+            for sections in self.chunks.values():
+                for section in sections:
+                    if section is None:
+                        continue
+                    if section.data is not None:
+                        total += section.data.itemsize * len(section.data)
+                    if section.palette is not None:
+                        total += 8 * len(section.palette)
+        return total
@@ -76,6 +76,21 @@ class InvalidState(ConnectionFailure):
     """
 
 
+class ShardCommandError(Exception):
+    """Raised by 'minecraft.launcher.ShardedSwarm' when a command sent to a
+       bot in a worker process fails, or cannot be delivered. The message
+       describes the exception raised in the worker.
+    """
+
+
+class MovementError(Exception):
+    """Raised through the future returned by
+       'minecraft.backend.movement.MovementController.move_to' when the
+       server repeatedly corrects the position of the player without it
+       getting any closer to its destination.
+    """
+
+
 class IgnorePacket(Exception):
     """This exception may be raised from within a packet handler, such as
        `PacketReactor.react' or a packet listener added with
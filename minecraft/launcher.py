@@ -0,0 +1,296 @@
+"""Running large numbers of bots across a pool of worker processes, each of
+   which drives its share of the bots with a single 'SwarmManager', under the
+   control of the parent process.
+"""
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .backend import register_backend
+from .exceptions import ShardCommandError
+from .networking.connection import Connection
+from .networking.swarm import SwarmManager, SwarmStats
+
+
+class ShardedSwarm(object):
+    """Runs one bot for each of the given accounts, each being a 'Connection'
+    with a backend installed by 'minecraft.backend.register_backend', spread
+    across 'processes' worker processes (by default, one for each CPU).
+
+    Each account is either a username, to connect in offline mode, or an
+    'AuthenticationToken'. Accounts are assigned to shards, i.e. worker
+    processes, in turn; a bot is identified by the name of its account.
+
+    Commands are sent to the worker running a bot over a local pipe, and
+    return a 'concurrent.futures.Future' whose result is that of the command,
+    or which raises 'ShardCommandError' if the command failed.
+    """
+    def __init__(self, address, port=25565, accounts=(), processes=None,
+                 initial_version=None, allowed_versions=None, quiet=True):
+        """
+        :param address: address of the server to connect to.
+        :param port: port of the server to connect to.
+        :param accounts: usernames and/or 'AuthenticationToken' instances.
+        :param processes: the number of worker processes.
+        :param initial_version: as for 'Connection'.
+        :param allowed_versions: as for 'Connection'.
+        :param quiet: if True, the standard output of the worker processes
+                      (to which the backend prints the state of each bot) is
+                      discarded.
+        """
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.address = address
+        self.port = port
+        self.options = {'initial_version': initial_version,
+                        'allowed_versions': allowed_versions, 'quiet': quiet}
+
+        self.shards = [_Shard(index) for index in range(processes)]
+        self._shard_of = {}
+        for account, shard in zip(accounts, itertools.cycle(self.shards)):
+            shard.accounts.append(account)
+            self._shard_of[_account_name(account)] = shard
+
+    @property
+    def bots(self):
+        """A list of the names of all bots."""
+        return list(self._shard_of)
+
+    def shard_of(self, bot):
+        """The index of the shard running the bot with the given name."""
+        return self._get_shard(bot).index
+
+    def start(self):
+        """Starts the worker processes, each of which connects its bots to the
+           server. This returns once all processes have been started, before
+           the bots have necessarily connected.
+        """
+        context = multiprocessing.get_context()
+        for shard in self.shards:
+            shard.pipe, child_pipe = context.Pipe()
+            shard.process = context.Process(
+                target=_run_shard, name='Swarm Shard %d' % shard.index,
+                args=(child_pipe, self.address, self.port, shard.accounts,
+                      self.options),
+                daemon=True)
+            shard.process.start()
+            child_pipe.close()
+        for shard in self.shards:
+            shard.start_receiving()
+
+    def command(self, bot, name, *args):
+        """Sends the command with the given name and arguments to the given
+           bot. The available commands are 'chat', 'move' and 'place'; see
+           the methods of the same names.
+        """
+        return self._get_shard(bot).request(name, bot, *args)
+
+    def chat(self, bot, message):
+        """Sends a chat message, or a command beginning with '/', as the given
+           bot.
+        """
+        return self.command(bot, 'chat', message)
+
+    def move(self, bot, destination):
+        """Moves the given bot to 'destination', a list of 3 coordinates, each
+           of which may be '~' to remain at the current coordinate. The
+           future completes when the movement has finished.
+        """
+        return self.command(bot, 'move', list(destination))
+
+    def place(self, bot, x, y, z):
+        """Places the block in the given bot's main hand at (x, y, z)."""
+        return self.command(bot, 'place', x, y, z)
+
+    def metrics(self, timeout=None):
+        """Returns a list containing a dict of metrics for each shard, in
+           order of shard index: 'pid', 'bots', 'connected', 'spawned',
+           'errors', 'cpu_time' and 'uptime', as well as the totals of the
+           'SwarmStats' counters of the shard's bots.
+        """
+        futures = [shard.request('metrics') for shard in self.shards]
+        return [future.result(timeout) for future in futures]
+
+    def stop(self, timeout=10):
+        """Disconnects all bots and waits for the worker processes to exit,
+           terminating any which do not exit within 'timeout' seconds.
+        """
+        futures = [shard.request('stop') for shard in self.shards
+                   if shard.process is not None]
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+        for shard in self.shards:
+            if shard.process is not None:
+                shard.process.join(timeout)
+                if shard.process.is_alive():
+                    shard.process.terminate()
+                shard.pipe.close()
+                shard.process = None
+
+    def _get_shard(self, bot):
+        try:
+            return self._shard_of[bot]
+        except KeyError:
+            raise KeyError('No such bot: %r.' % (bot,))
+
+
+class _Shard(object):
+    # The parent's record of one worker process, and of the requests to it
+    # which are awaiting a response.
+    def __init__(self, index):
+        self.index = index
+        self.accounts = []
+        self.process = None
+        self.pipe = None
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._request_ids = itertools.count()
+
+    def start_receiving(self):
+        threading.Thread(target=self._receive, daemon=True,
+                         name='Swarm Shard %d Receiver' % self.index).start()
+
+    def request(self, name, *args):
+        future = Future()
+        with self._lock:
+            if self.process is None:
+                future.set_exception(ShardCommandError(
+                    'Shard %d is not running.' % self.index))
+                return future
+            request_id = next(self._request_ids)
+            self._futures[request_id] = future
+            self.pipe.send((request_id, name, args))
+        return future
+
+    def _receive(self):
+        while True:
+            try:
+                request_id, error, result = self.pipe.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._futures.pop(request_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(ShardCommandError(error))
+            else:
+                future.set_result(result)
+
+        # The worker has exited, so fail any requests left unanswered.
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(ShardCommandError(
+                'Shard %d exited.' % self.index))
+
+
+def _account_name(account):
+    return account if isinstance(account, str) else account.profile.name
+
+
+def _run_shard(pipe, address, port, accounts, options):
+    # The main function of a worker process.
+    if options['quiet']:
+        sys.stdout = open(os.devnull, 'w')
+    start_time = time.time()
+
+    swarm = SwarmManager()
+    swarm.start()
+    bots = {}
+    for account in accounts:
+        kwds = {'username': account} if isinstance(account, str) \
+            else {'auth_token': account}
+        connection = swarm.add(Connection(
+            address, port, initial_version=options['initial_version'],
+            allowed_versions=options['allowed_versions'],
+            handle_exception=False, **kwds))
+        player = register_backend(connection)
+        bots[_account_name(account)] = player
+        try:
+            connection.connect()
+        except Exception as e:
+            connection.exception = e
+
+    def metrics():
+        connections = swarm.connections
+        result = {
+            'pid': os.getpid(),
+            'bots': len(connections),
+            'connected': sum(c.connected for c in connections),
+            'spawned': sum(getattr(c, 'spawned', False) for c in connections),
+            'errors': sum(c.exception is not None for c in connections),
+            'cpu_time': time.process_time(),
+            'uptime': time.time() - start_time,
+        }
+        for field in SwarmStats.__slots__:
+            result[field] = sum(getattr(stats, field)
+                                for stats in swarm.stats.values())
+        return result
+
+    commands = {
+        'chat': lambda player, message: player.send_message(message),
+        'move': lambda player, destination: player.move_to(destination),
+        'place': lambda player, x, y, z: player.place_block(x, y, z),
+    }
+
+    # Commands are executed by a pool of threads, as writing a packet
+    # directly may block. A command returning a future, such as 'move', is
+    # responded to when the future completes.
+    send_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=8)
+
+    def respond(request_id, error=None, result=None):
+        with send_lock:
+            pipe.send((request_id, error, result))
+
+    def execute(request_id, name, args):
+        try:
+            if name not in commands:
+                raise ValueError('Unknown command: %r.' % (name,))
+            bot, args = args[0], args[1:]
+            result = commands[name](bots[bot], *args)
+        except Exception as e:
+            respond(request_id, error='%s: %s' % (type(e).__name__, e))
+        else:
+            if isinstance(result, Future):
+                result.add_done_callback(
+                    lambda future: respond_future(request_id, future))
+            else:
+                respond(request_id)
+
+    def respond_future(request_id, future):
+        if future.cancelled():
+            respond(request_id, error='The command was cancelled.')
+        elif future.exception() is not None:
+            e = future.exception()
+            respond(request_id, error='%s: %s' % (type(e).__name__, e))
+        else:
+            respond(request_id)
+
+    while True:
+        try:
+            request_id, name, args = pipe.recv()
+        except (EOFError, OSError):
+            name = 'stop'
+            request_id = None
+        if name == 'metrics':
+            respond(request_id, result=metrics())
+        elif name == 'stop':
+            break
+        else:
+            executor.submit(execute, request_id, name, args)
+
+    for player in bots.values():
+        player.connection.disconnect()
+    executor.shutdown(wait=False)
+    swarm.stop()
+    if request_id is not None:
+        respond(request_id)
@@ -0,0 +1,332 @@
+"""An asyncio-based alternative to the 'Connection' class defined in
+   'minecraft.networking.connection', allowing many connections to be driven
+   by a single event loop instead of each occupying a networking thread.
+"""
+import asyncio
+import inspect
+import socket
+import sys
+
+from . import encryption, framing
+from .connection import (
+    Connection, STATE_STATUS, _preferred_address,
+)
+from .. import PROTOCOL_VERSION_INDICES
+from ..exceptions import IgnorePacket, InvalidState
+
+
+class AsyncConnection(Connection):
+    """A 'Connection' whose network I/O is performed by a task running on an
+    asyncio event loop, rather than by a 'NetworkingThread'.
+
+    The existing 'PacketReactor' subclasses, packet classes and listener
+    semantics are reused unchanged, with the following differences:
+
+    - 'connect' and 'status' must be called from a coroutine running on the
+      event loop, and return an awaitable which completes once the initial
+      packets have been written to the server.
+
+    - 'write_packet' writes the packet into the transport's buffer at once,
+      regardless of 'force', and returns an awaitable which completes when
+      the buffer has drained below its high-water mark.
+
+    - Incoming packet listeners may be coroutine functions, in which case
+      they are awaited, in order, before the next listener is called.
+      Coroutines returned by outgoing packet listeners are scheduled as tasks.
+
+    The task driving each connection is stored, for compatibility with code
+    inspecting the state of a 'Connection', in the 'networking_thread' and
+    'new_networking_thread' attributes.
+    """
+    # The maximum number of bytes requested from the stream in each read.
+    read_chunk_size = 1 << 16
+
+    def __init__(self, *args, **kwds):
+        super(AsyncConnection, self).__init__(*args, **kwds)
+        self.socket = None
+        self.file_object = None
+        self._reader = None
+        self._frames = None
+
+    def connect(self):
+        """
+        Attempt to begin connecting to the server.
+        May safely be called multiple times after the first, i.e. to reconnect.
+
+        :return: an awaitable, completing when the connection is established.
+        """
+        self._check_connection()
+
+        async def setup():
+            # It is important that this is set correctly even when connecting
+            # in status mode, as some servers, e.g. SpigotMC with the
+            # ProtocolSupport plugin, use it to determine the correct response.
+            self.context.protocol_version \
+                = max(self.allowed_proto_versions,
+                      key=PROTOCOL_VERSION_INDICES.get)
+
+            self.spawned = False
+            await self._connect()
+            self._start_login()
+
+        return self._start_network_task(setup)
+
+    def status(self, handle_status=None, handle_ping=False):
+        """Issue a status request to the server and then disconnect.
+        See 'Connection.status' for the meaning of the arguments.
+
+        :return: an awaitable, completing when the request has been sent.
+        """
+        self._check_connection()
+
+        async def setup():
+            await self._connect()
+            self._handshake(next_state=STATE_STATUS)
+            self._start_status_query(handle_status, handle_ping)
+
+        return self._start_network_task(setup)
+
+    async def wait_closed(self):
+        """Wait until the current connection, if any, terminates. If it
+           terminated due to an exception that was not caught by any handler,
+           the exception is raised here.
+        """
+        while True:
+            task = self.new_networking_thread or self.networking_thread
+            if task is None:
+                return
+            await task.task
+
+    def write_packet(self, packet, force=False):
+        """Writes a packet to the server.
+
+        The packet is written immediately into the buffer of the underlying
+        transport, so 'force' has no effect and is accepted only for
+        compatibility with 'Connection.write_packet'.
+
+        Like 'Connection.write_packet', this raises InvalidState if no
+        connection has been made, and discards the packet if the connection
+        has since been closed.
+
+        :param packet: The :class:`network.packets.Packet` to write
+        :return: an awaitable, which may be used to wait for the transport's
+                 buffer to drain, providing flow control.
+        """
+        packet.context = self.context
+        socket = self.socket
+        if socket is None:
+            if self._frames is None:
+                raise InvalidState('There is no connection to write to.')
+            return _Drain(None)
+        self._write_packet(packet)
+        return _Drain(socket)
+
+    def _write_packet(self, packet):
+        try:
+            for listener in self.early_outgoing_packet_listeners \
+                    .listeners_for(type(packet)):
+                self._schedule(listener.callback(packet))
+
+            if self.options.compression_enabled:
+                threshold = self.options.compression_threshold
+            else:
+                threshold = None
+            self.socket.send(
+                packet.serialize(threshold, compressor=self.compressor))
+
+            for listener in self.outgoing_packet_listeners \
+                    .listeners_for(type(packet)):
+                self._schedule(listener.callback(packet))
+        except IgnorePacket:
+            pass
+
+    @staticmethod
+    def _schedule(result):
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+    def _start_network_task(self, setup):
+        if self.networking_thread is None:
+            task = NetworkingTask(self)
+            self.networking_thread = task
+        else:
+            # This task will wait until the existing task exits, and then set
+            # 'networking_thread' to itself and 'new_networking_thread' to
+            # None.
+            task = NetworkingTask(self, previous=self.networking_thread)
+            self.new_networking_thread = task
+        return task.start(setup)
+
+    async def _connect(self):
+        loop = asyncio.get_event_loop()
+        info = await loop.getaddrinfo(
+            self.options.address, self.options.port,
+            type=socket.SOCK_STREAM)
+        ai_faml, ai_type, ai_prot, _ai_cnam, ai_addr = _preferred_address(info)
+
+        sock = socket.socket(ai_faml, ai_type, ai_prot)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, ai_addr)
+            self._reader, writer = await asyncio.open_connection(sock=sock)
+        except BaseException:
+            sock.close()
+            raise
+
+        self.socket = _StreamWriterSocket(writer)
+        self._frames = framing.FrameBuffer()
+        self.options.compression_enabled = False
+        self.options.compression_threshold = -1
+        self.connected = True
+
+    def _enable_encryption(self, encryptor, decryptor):
+        self.socket = encryption.EncryptedSocketWrapper(
+            self.socket, encryptor, decryptor)
+        self._frames.enable_decryption(decryptor)
+
+    def disconnect(self, immediate=False):
+        """Terminate the existing server connection, if there is one.
+           As packets are never queued, 'immediate' has no effect.
+        """
+        self.connected = False
+
+        if self.new_networking_thread is not None:
+            self.new_networking_thread.interrupt = True
+        elif self.networking_thread is not None:
+            self.networking_thread.interrupt = True
+
+        if self.socket is not None:
+            # Closing the transport flushes any data remaining in its buffer.
+            self.socket.close()
+            self.socket = None
+            self._reader = None
+
+    async def _read_packet(self, reader):
+        # Reads a single packet from the given StreamReader, decrypting it if
+        # encryption is enabled, and parses it using the current reactor.
+        frames = self._frames
+        frame = frames.next_frame()
+        while frame is None:
+            data = await reader.read(self.read_chunk_size)
+            if not data:
+                raise EOFError("Unexpected end of message.")
+            frames.feed(data)
+            frame = frames.next_frame()
+        return self.reactor.decode_packet(frame)
+
+    async def _react(self, packet):
+        try:
+            await self._call_listeners(self.early_packet_listeners, packet)
+            self.reactor.react(packet)
+            await self._call_listeners(self.packet_listeners, packet)
+        except IgnorePacket:
+            pass
+
+    @staticmethod
+    async def _call_listeners(listeners, packet):
+        for listener in listeners.listeners_for(type(packet)):
+            result = listener.callback(packet)
+            if inspect.isawaitable(result):
+                await result
+
+
+class NetworkingTask(object):
+    """The counterpart of 'NetworkingThread' for 'AsyncConnection': reads and
+       reacts to packets from within a task running on the event loop.
+    """
+    def __init__(self, connection, previous=None):
+        self.interrupt = False
+        self.connection = connection
+        self.previous_task = previous
+        self.task = None
+        self.started = None
+
+    def start(self, setup):
+        loop = asyncio.get_event_loop()
+        self.started = loop.create_future()
+        self.task = loop.create_task(self.run(setup))
+        return self.started
+
+    def is_alive(self):
+        return self.task is not None and not self.task.done()
+
+    async def run(self, setup):
+        try:
+            if self.previous_task is not None:
+                if self.previous_task.is_alive():
+                    await asyncio.wait([self.previous_task.task])
+                self.connection.networking_thread = self
+                self.connection.new_networking_thread = None
+            await setup()
+            if not self.started.done():
+                self.started.set_result(None)
+            await self._run()
+            self.connection._handle_exit()
+        except Exception as e:
+            self.interrupt = True
+            try:
+                self.connection._handle_exception(e, sys.exc_info())
+            except Exception as exc:
+                # If the connection was never established, the exception is
+                # raised to whoever is awaiting 'connect' or 'status'.
+                if self.started.done():
+                    raise
+                self.started.set_exception(exc)
+        finally:
+            if not self.started.done():
+                self.started.set_result(None)
+            if self.connection.networking_thread is self:
+                self.connection.networking_thread = None
+
+    async def _run(self):
+        reader = self.connection._reader
+        while not self.interrupt:
+            try:
+                packet = await self.connection._read_packet(reader)
+            except (EOFError, ConnectionError):
+                if self.interrupt:
+                    break
+                raise
+            await self.connection._react(packet)
+
+
+class _StreamWriterSocket(object):
+    # Presents the subset of the socket interface used by 'Connection' and
+    # 'Packet.write' over an asyncio StreamWriter.
+    def __init__(self, writer):
+        self.writer = writer
+
+    def send(self, data):
+        self.writer.write(data)
+
+    sendall = send
+
+    def fileno(self):
+        return self.writer.get_extra_info('socket').fileno()
+
+    def shutdown(self, *args, **kwds):
+        pass
+
+    def close(self):
+        self.writer.close()
+
+    def drain(self):
+        return self.writer.drain()
+
+
+class _Drain(object):
+    # The awaitable returned by 'AsyncConnection.write_packet'. It is not a
+    # coroutine, so it may be discarded without a warning, e.g. when packets
+    # are written by a 'PacketReactor'. If 'socket' is None, it completes at
+    # once.
+    __slots__ = '_socket',
+
+    def __init__(self, socket):
+        while isinstance(socket, encryption.EncryptedSocketWrapper):
+            socket = socket.actual_socket
+        self._socket = socket
+
+    def __await__(self):
+        if self._socket is None:
+            return iter(())
+        return self._socket.drain().__await__()
@@ -5,13 +5,14 @@ import sys
 import threading
 import timeit
 import zlib
-from collections import deque
 from threading import RLock
 
 import select
 
-from . import encryption, packets
+from . import compression, encryption, framing, packets
 from .packets import clientbound, serverbound
+from .packet_queue import OutgoingPacketQueue, QueueStats, OVERFLOW_BLOCK
+from .packets.registry import packet_id_map
 from .types import VarInt
 from .. import (KNOWN_MINECRAFT_VERSIONS, PROTOCOL_VERSION_INDICES,
                 SUPPORTED_MINECRAFT_VERSIONS, SUPPORTED_PROTOCOL_VERSIONS,
@@ -23,6 +24,17 @@ STATE_STATUS = 1
 STATE_PLAYING = 2
 
 
+def _preferred_address(info):
+    # Given a list of 5-tuples as returned by 'socket.getaddrinfo', returns
+    # the one to connect to. Prefer to use IPv4 (for backward compatibility
+    # with previous versions that always resolved hostnames to IPv4
+    # addresses), then IPv6, then other address families.
+    def key(ai):
+        return 0 if ai[0] == socket.AF_INET else \
+               1 if ai[0] == socket.AF_INET6 else 2
+    return min(info, key=key)
+
+
 class ConnectionContext(object):
     """A ConnectionContext encapsulates the static configuration parameters
     shared by the Connection class with other classes, such as Packet.
@@ -61,11 +73,35 @@ class ConnectionContext(object):
 
 class _ConnectionOptions(object):
     def __init__(self, address=None, port=None, compression_threshold=-1,
-                 compression_enabled=False):
+                 compression_enabled=False, lazy_decode=False,
+                 compression_level=zlib.Z_DEFAULT_COMPRESSION,
+                 compression_strategy=zlib.Z_DEFAULT_STRATEGY,
+                 queue_maxsize=None, queue_overflow=OVERFLOW_BLOCK,
+                 queue_priorities=None, queue_block_timeout=None,
+                 queue_coalesce=()):
         self.address = address
         self.port = port
         self.compression_threshold = compression_threshold
         self.compression_enabled = compression_enabled
+        # The zlib compression level and strategy used for outgoing packets
+        # when compression is enabled (see 'PacketCompressor').
+        self.compression_level = compression_level
+        self.compression_strategy = compression_strategy
+        # If True, incoming packets which no listener accepts and which the
+        # current reactor does not handle are only decoded when one of their
+        # fields is first accessed (see 'Packet.undecoded').
+        self.lazy_decode = lazy_decode
+        # The bound, overflow policy, priorities of packets and blocking time
+        # limit of the outgoing packet queue (see 'OutgoingPacketQueue'),
+        # which take effect when the connection is next established.
+        self.queue_maxsize = queue_maxsize
+        self.queue_overflow = queue_overflow
+        self.queue_priorities = queue_priorities
+        self.queue_block_timeout = queue_block_timeout
+        # The names of packets for which only the newest of several queued
+        # in succession is sent, such as LATEST_WINS_PACKET_NAMES (see
+        # 'OutgoingPacketQueue'). Disabled by default.
+        self.queue_coalesce = queue_coalesce
 
 
 class Connection(object):
@@ -133,10 +169,23 @@ class Connection(object):
 
         self.networking_thread = None
         self.new_networking_thread = None
-        self.packet_listeners = []
-        self.early_packet_listeners = []
-        self.outgoing_packet_listeners = []
-        self.early_outgoing_packet_listeners = []
+        self._wakeup = None
+        # The 'OutgoingPacketQueue' of the current connection to the server,
+        # created by '_connect'.
+        self._outgoing_packet_queue = None
+        # The 'SwarmManager' performing this connection's network I/O in
+        # place of a 'NetworkingThread', if any (see 'SwarmManager.add').
+        self.swarm = None
+        # Data (already encrypted, if applicable) which has been written by
+        # the 'SwarmManager' but which the socket has not yet accepted.
+        self._unsent = bytearray()
+        # If set to a 'DecodePipeline', heavy packets are decoded by its pool
+        # of workers (see 'minecraft.networking.pipeline').
+        self.decode_pipeline = None
+        self.packet_listeners = packets.PacketListenerList()
+        self.early_packet_listeners = packets.PacketListenerList()
+        self.outgoing_packet_listeners = packets.PacketListenerList()
+        self.early_outgoing_packet_listeners = packets.PacketListenerList()
         self._exception_handlers = []
         self.player_list = {}
         self.block_query_list = {}
@@ -171,9 +220,16 @@ class Connection(object):
         self.options = _ConnectionOptions()
         self.options.address = address
         self.options.port = port
+        # Compresses and decompresses packets, and records statistics of
+        # this in 'compressor.stats'.
+        self.compressor = compression.PacketCompressor(self.options)
+        # Statistics of the outgoing packet queue, accumulated over all
+        # connections to the server.
+        self.queue_stats = QueueStats()
         self.auth_token = auth_token
         self.username = username
         self.connected = False
+        self.socket = self.file_object = None
 
         self.handle_exception = handle_exception
         self.exception, self.exc_info = None, None
@@ -190,16 +246,21 @@ class Connection(object):
                self.new_networking_thread is not None:
                 raise InvalidState('A networking thread is already running.')
             elif self.networking_thread is None:
-                self.networking_thread = NetworkingThread(self)
+                self.networking_thread = self._new_networking_thread()
                 self.networking_thread.start()
             else:
                 # This thread will wait until the existing thread exits, and
                 # then set 'networking_thread' to itself and
                 # 'new_networking_thread' to None.
-                self.new_networking_thread \
-                    = NetworkingThread(self, previous=self.networking_thread)
+                self.new_networking_thread = self._new_networking_thread(
+                    previous=self.networking_thread)
                 self.new_networking_thread.start()
 
+    def _new_networking_thread(self, previous=None):
+        if self.swarm is not None:
+            return self.swarm._new_member(self, previous=previous)
+        return NetworkingThread(self, previous=previous)
+
     def write_packet(self, packet, force=False):
         """Writes a packet to the server.
 
@@ -207,7 +268,8 @@ class Connection(object):
         and write the packet out immediately, and as such may block.
 
         If force is false then the packet will be added to the end of the
-        packet writing queue to be sent 'as soon as possible'
+        packet writing queue to be sent 'as soon as possible', and the
+        networking thread is woken up to send it.
 
         :param packet: The :class:`network.packets.Packet` to write
         :param force(bool): Specifies if the packet write should be immediate
@@ -215,9 +277,33 @@ class Connection(object):
         packet.context = self.context
         if force:
             with self._write_lock:
+                self._outgoing_packet_queue.supersede(packet)
                 self._write_packet(packet)
         else:
-            self._outgoing_packet_queue.append(packet)
+            queue = self._outgoing_packet_queue
+            if queue.full():
+                # Make sure that the queue is being emptied while we wait.
+                self._wakeup.signal()
+            queue.append(packet, block=self._may_block())
+            self._wakeup.signal()
+
+    def _may_block(self):
+        # Returns True if the current thread may wait for space in the
+        # outgoing packet queue: not if it performs this connection's network
+        # I/O, nor if it holds the write lock, without which the queue cannot
+        # be emptied.
+        # pylint: disable=protected-access
+        return not self._in_networking_thread() and \
+            not self._write_lock._is_owned()
+
+    def _in_networking_thread(self):
+        # Returns True if the current thread performs this connection's
+        # network I/O, and so must never wait for the outgoing packet queue.
+        current = threading.current_thread()
+        if self.swarm is not None:
+            return current is self.swarm.thread
+        return current is self.networking_thread or \
+            current is self.new_networking_thread
 
     def listener(self, *packet_types, **kwds):
         """
@@ -322,28 +408,135 @@ class Connection(object):
         # asynchronous access to the socket.
         # This should be the only method that removes elements from the
         # outbound queue
-        if len(self._outgoing_packet_queue) == 0:
-            return False
-        else:
-            self._write_packet(self._outgoing_packet_queue.popleft())
-            return True
+        return self._pop_packets(1) > 0
+
+    def _pop_packets(self, max_packets):
+        # As '_pop_packet', but pops up to 'max_packets' packets and writes
+        # them out together, returning the number of packets popped.
+        packets = self._outgoing_packet_queue.popleft_many(max_packets)
+        if packets:
+            self._write_packets(packets)
+        return len(packets)
 
     def _write_packet(self, packet):
         # Immediately writes the given packet to the network. The caller must
         # have the write lock acquired before calling this method.
-        try:
-            for listener in self.early_outgoing_packet_listeners:
-                listener.call_packet(packet)
+        self._write_packets((packet,))
+
+    def _write_packets(self, packets):
+        # Immediately writes the given packets to the network, serialising
+        # them into a single buffer which is encrypted and sent in one call.
+        # The caller must have the write lock acquired before calling this
+        # method.
+        if self.options.compression_enabled:
+            compression_threshold = self.options.compression_threshold
+        else:
+            compression_threshold = None
 
-            if self.options.compression_enabled:
-                packet.write(self.socket, self.options.compression_threshold)
-            else:
-                packet.write(self.socket)
+        batch = bytearray()
+        written = []
+        for packet in packets:
+            try:
+                for listener in self.early_outgoing_packet_listeners \
+                        .listeners_for(type(packet)):
+                    listener.callback(packet)
+            except IgnorePacket:
+                continue
+            packet.serialize(compression_threshold, out=batch,
+                             compressor=self.compressor)
+            written.append(packet)
+
+        if batch:
+            self._send(batch)
+
+        for packet in written:
+            try:
+                for listener in self.outgoing_packet_listeners \
+                        .listeners_for(type(packet)):
+                    listener.callback(packet)
+            except IgnorePacket:
+                pass
+
+    def _send(self, data):
+        # Sends serialised packets through the socket. The 'SwarmManager'
+        # sends only as much as the socket accepts without blocking, and
+        # keeps the rest in '_unsent' until the socket becomes writable;
+        # any other thread first waits for such data to be sent.
+        if self.swarm is not None and self._in_networking_thread():
+            self._unsent += self._encrypt(data)
+            self._flush(block=False)
+        elif self._unsent:
+            self._unsent += self._encrypt(data)
+            self._flush()
+        else:
+            self.socket.sendall(data)
+
+    def _encrypt(self, data):
+        if isinstance(self.socket, encryption.EncryptedSocketWrapper):
+            return self.socket.encryptor.update(data)
+        return data
+
+    def _flush(self, block=True):
+        # Sends the data in '_unsent', or if not 'block', as much of it as
+        # the socket accepts without blocking. Returns True if none remains.
+        # The caller must have the write lock acquired.
+        unsent = self._unsent
+        if not unsent:
+            return True
+        sock = getattr(self.socket, 'actual_socket', self.socket)
+        if block:
+            sock.sendall(unsent)
+            del unsent[:]
+            return True
+        while unsent:
+            try:
+                count = _send_nonblocking(sock, unsent)
+            except (BlockingIOError, InterruptedError):
+                break
+            del unsent[:count]
+        return not unsent
+
+    def _exchange_packets(self, worker, can_write, can_read, read_packet,
+                          max_write=300, max_total=50):
+        # Performs one iteration of the work of 'worker', which is the
+        # networking thread or an object standing in for it: if 'can_write',
+        # writes as many as 'max_write' queued packets in a single batch; then
+        # if 'can_read', reads packets by calling 'read_packet' and reacts to
+        # them, until it returns None or 'max_total' packets in all have been
+        # written or read. Returns the number of packets written and read, and
+        # whether the limit was reached, i.e. whether more may remain unread.
+        num_written = num_read = 0
+        more_to_read = False
+        exc_info = None
+        if can_write:
+            with self._write_lock:
+                try:
+                    if not worker.interrupt:
+                        num_written = self._pop_packets(max_write)
+                except IOError:
+                    exc_info = sys.exc_info()
 
-            for listener in self.outgoing_packet_listeners:
-                listener.call_packet(packet)
-        except IgnorePacket:
-            pass
+        if can_read:
+            while not worker.interrupt:
+                if num_written + num_read >= max_total:
+                    more_to_read = True
+                    break
+                packet = read_packet()
+                if not packet:
+                    break
+                num_read += 1
+                self._react(packet)
+
+                # Ignore the earlier exception if a disconnect packet is
+                # received, as it may have been caused by trying to write to
+                # the closed socket, which does not represent a program error.
+                if exc_info is not None and packet.packet_name == "disconnect":
+                    exc_info = None
+
+        if exc_info is not None:
+            exc_value, exc_tb = exc_info[1:]
+            raise exc_value.with_traceback(exc_tb)
+        return num_written, num_read, more_to_read
 
     def status(self, handle_status=None, handle_ping=False):
         """Issue a status request to the server and then disconnect.
@@ -357,38 +550,56 @@ class Connection(object):
                             which prints the latency to standard outout, or
                             False, to prevent measurement of the latency.
         """
+        sock = self._open_socket()
         with self._write_lock:  # pylint: disable=not-context-manager
-            self._check_connection()
+            self._check_connection(sock)
 
-            self._connect()
+            self._connect(sock)
             self._handshake(next_state=STATE_STATUS)
             self._start_network_thread()
+            self._start_status_query(handle_status, handle_ping)
 
-            do_ping = handle_ping is not False
-            self.reactor = StatusReactor(self, do_ping=do_ping)
+    def _start_status_query(self, handle_status, handle_ping):
+        # Installs a 'StatusReactor' and writes the status request, after the
+        # handshake has been written. See 'status' for the arguments.
+        do_ping = handle_ping is not False
+        self.reactor = StatusReactor(self, do_ping=do_ping)
 
-            if handle_status is False:
-                self.reactor.handle_status = lambda *args, **kwds: None
-            elif handle_status is not None:
-                self.reactor.handle_status = handle_status
+        if handle_status is False:
+            self.reactor.handle_status = lambda *args, **kwds: None
+        elif handle_status is not None:
+            self.reactor.handle_status = handle_status
 
-            if handle_ping is False:
-                self.reactor.handle_ping = lambda *args, **kwds: None
-            elif handle_ping is not None:
-                self.reactor.handle_ping = handle_ping
+        if handle_ping is False:
+            self.reactor.handle_ping = lambda *args, **kwds: None
+        elif handle_ping is not None:
+            self.reactor.handle_ping = handle_ping
 
-            request_packet = serverbound.status.RequestPacket()
-            self.write_packet(request_packet)
+        request_packet = serverbound.status.RequestPacket()
+        self.write_packet(request_packet)
 
     def connect(self):
         """
         Attempt to begin connecting to the server.
         May safely be called multiple times after the first, i.e. to reconnect.
+
+        If called from the thread of a 'SwarmManager' driving this connection,
+        e.g. by a reactor, the connection is made by another thread, so as not
+        to hold up the swarm's other connections, and exceptions are passed
+        to the connection's exception handler rather than raised.
         """
+        if self.swarm is not None and self._in_networking_thread():
+            self.swarm._connect_later(self)
+            return
+
+        # The address is resolved and the socket connected before taking the
+        # lock, so that the networking thread is not held up meanwhile.
+        sock = self._open_socket()
+
         # Hold the lock throughout, in case connect() is called from the
         # networking thread while another connection is in progress.
         with self._write_lock:  # pylint: disable=not-context-manager
-            self._check_connection()
+            self._check_connection(sock)
 
             # It is important that this is set correctly even when connecting
             # in status mode, as some servers, e.g. SpigotMC with the
@@ -398,56 +609,78 @@ class Connection(object):
                       key=PROTOCOL_VERSION_INDICES.get)
 
             self.spawned = False
-            self._connect()
-            if len(self.allowed_proto_versions) == 1:
-                # There is exactly one allowed protocol version, so skip the
-                # process of determining the server's version, and immediately
-                # connect.
-                self._handshake(next_state=STATE_PLAYING)
-                login_start_packet = serverbound.login.LoginStartPacket()
-                if self.auth_token:
-                    login_start_packet.name = self.auth_token.profile.name
-                else:
-                    login_start_packet.name = self.username
-                self.write_packet(login_start_packet)
-                self.reactor = LoginReactor(self)
-            else:
-                # Determine the server's protocol version by first performing a
-                # status query.
-                self._handshake(next_state=STATE_STATUS)
-                self.write_packet(serverbound.status.RequestPacket())
-                self.reactor = PlayingStatusReactor(self)
+            self._connect(sock)
+            self._start_login()
             self._start_network_thread()
 
-    def _check_connection(self):
+    def _start_login(self):
+        # Writes the packets that begin logging in to the server, or querying
+        # its protocol version, and installs the corresponding reactor.
+        if len(self.allowed_proto_versions) == 1:
+            # There is exactly one allowed protocol version, so skip the
+            # process of determining the server's version, and immediately
+            # connect.
+            self._handshake(next_state=STATE_PLAYING)
+            login_start_packet = serverbound.login.LoginStartPacket()
+            if self.auth_token:
+                login_start_packet.name = self.auth_token.profile.name
+            else:
+                login_start_packet.name = self.username
+            self.write_packet(login_start_packet)
+            self.reactor = LoginReactor(self)
+        else:
+            # Determine the server's protocol version by first performing a
+            # status query.
+            self._handshake(next_state=STATE_STATUS)
+            self.write_packet(serverbound.status.RequestPacket())
+            self.reactor = PlayingStatusReactor(self)
+
+    def _check_connection(self, sock=None):
+        # Raises InvalidState if there is an existing connection, first
+        # closing 'sock' if it is given.
         if self.networking_thread is not None and \
            not self.networking_thread.interrupt or \
            self.new_networking_thread is not None:
+            if sock is not None:
+                sock.close()
             raise InvalidState('There is an existing connection.')
 
-    def _connect(self):
-        # Connect a socket to the server and create a file object from the
-        # socket.
-        # The file object is used to read any and all data from the socket
-        # since it's "guaranteed" to read the number of bytes specified,
-        # the socket itself will mostly be used to write data upstream to
-        # the server.
-        self._outgoing_packet_queue = deque()
-
+    def _open_socket(self):
+        # Returns a new socket connected to the server. This may block, and
+        # is done without holding the write lock.
         info = socket.getaddrinfo(self.options.address, self.options.port,
                                   0, socket.SOCK_STREAM)
+        ai_faml, ai_type, ai_prot, _ai_cnam, ai_addr = _preferred_address(info)
 
-        # Prefer to use IPv4 (for backward compatibility with previous
-        # versions that always resolved hostnames to IPv4 addresses),
-        # then IPv6, then other address families.
-        def key(ai):
-            return 0 if ai[0] == socket.AF_INET else \
-                   1 if ai[0] == socket.AF_INET6 else 2
-        ai_faml, ai_type, ai_prot, _ai_cnam, ai_addr = min(info, key=key)
-
-        self.socket = socket.socket(ai_faml, ai_type, ai_prot)
-        self.socket.connect(ai_addr)
-        self.file_object = self.socket.makefile("rb", 0)
+        sock = socket.socket(ai_faml, ai_type, ai_prot)
+        try:
+            sock.connect(ai_addr)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _connect(self, sock):
+        # Use a socket connected to the server, as returned by '_open_socket',
+        # and create a FrameReader from the socket.
+        # The FrameReader is used to read any and all data from the socket,
+        # receiving it in large chunks and splitting it into packets, while
+        # the socket itself will mostly be used to write data upstream to
+        # the server.
+        options = self.options
+        self._outgoing_packet_queue = OutgoingPacketQueue(
+            maxsize=options.queue_maxsize, overflow=options.queue_overflow,
+            priorities=options.queue_priorities,
+            block_timeout=options.queue_block_timeout,
+            stats=self.queue_stats, coalesce=options.queue_coalesce)
+        if self._wakeup is None:
+            self._wakeup = _WakeupChannel()
+
+        self.socket = sock
+        self._unsent = bytearray()
+        self.file_object = framing.FrameReader(self.socket)
+        if self.decode_pipeline is not None:
+            self.decode_pipeline.reset()
         self.options.compression_enabled = False
         self.options.compression_threshold = -1
         self.connected = True
@@ -461,8 +694,13 @@ class Connection(object):
 
             if not immediate and self.socket is not None:
                 # Flush any packets remaining in the queue.
-                while self._pop_packet():
+                while self._pop_packets(300):
                     pass
+                self._flush()
+            # No more packets will be written, so nobody should wait for
+            # space in the queue.
+            if self._outgoing_packet_queue is not None:
+                self._outgoing_packet_queue.close()
 
             if self.new_networking_thread is not None:
                 self.new_networking_thread.interrupt = True
@@ -479,6 +717,15 @@ class Connection(object):
                     self.socket.close()
                     self.socket = None
 
+    def _enable_encryption(self, encryptor, decryptor):
+        # Wraps the socket and sets up the FrameReader so that all subsequent
+        # traffic is encrypted and decrypted using the given cipher contexts.
+        # The FrameReader keeps reading from the unwrapped socket, decrypting
+        # each chunk of data that it receives.
+        self.socket = encryption.EncryptedSocketWrapper(
+            self.socket, encryptor, decryptor)
+        self.file_object.enable_decryption(decryptor)
+
     def add_player(self, player):
         self.player_list[player.uuid] = player
 
@@ -533,7 +780,8 @@ class Connection(object):
         # handler has initiated a new connection, meaning that we should not
         # interfere with the connection state. Otherwise, make sure that any
         # current connection is completely terminated.
-        if (self.new_networking_thread or self.networking_thread).interrupt:
+        thread = self.new_networking_thread or self.networking_thread
+        if thread is None or thread.interrupt:
             self.disconnect(immediate=True)
 
         # If allowed by the final exception handler, re-raise the exception.
@@ -564,12 +812,14 @@ class Connection(object):
             self.handle_exit()
 
     def _react(self, packet):
+        packet_class = type(packet)
         try:
-            for listener in self.early_packet_listeners:
-                listener.call_packet(packet)
+            for listener in self.early_packet_listeners \
+                    .listeners_for(packet_class):
+                listener.callback(packet)
             self.reactor.react(packet)
-            for listener in self.packet_listeners:
-                listener.call_packet(packet)
+            for listener in self.packet_listeners.listeners_for(packet_class):
+                listener.callback(packet)
         except IgnorePacket:
             pass
 
@@ -602,46 +852,97 @@ class NetworkingThread(threading.Thread):
                 self.connection.networking_thread = None
 
     def _run(self):
+        connection = self.connection
+        more_to_read = False
         while not self.interrupt:
-            # Attempt to write out as many as 300 packets.
-            num_packets = 0
-            with self.connection._write_lock:
-                try:
-                    while not self.interrupt and self.connection._pop_packet():
-                        num_packets += 1
-                        if num_packets >= 300:
-                            break
-                    exc_info = None
-                except IOError:
-                    exc_info = sys.exc_info()
-
-                # If any packets remain to be written, resume writing as soon
-                # as possible after reading any available packets; otherwise,
-                # wait for up to 50ms (1 tick) for new packets to arrive.
-                if self.connection._outgoing_packet_queue:
-                    read_timeout = 0
-                else:
-                    read_timeout = 0.05
-
-            # Read and react to as many as 50 packets.
-            while num_packets < 50 and not self.interrupt:
-                packet = self.connection.reactor.read_packet(
-                    self.connection.file_object, timeout=read_timeout)
-                if not packet:
-                    break
-                num_packets += 1
-                self.connection._react(packet)
-                read_timeout = 0
-
-                # Ignore the earlier exception if a disconnect packet is
-                # received, as it may have been caused by trying to write to
-                # the closed socket, which does not represent a program error.
-                if exc_info is not None and packet.packet_name == "disconnect":
-                    exc_info = None
+            # Wait until there is data to read, or packets are queued for
+            # writing (which is signalled through the wakeup channel), or the
+            # socket becomes writable while packets remain in the queue; but
+            # wait for no more than 50ms (1 tick) before checking whether the
+            # thread has been interrupted, and do not wait at all if packets
+            # were left unread by the previous iteration.
+            # While a 'DecodePipeline' accepts no further frames, the socket
+            # is not waited on, as it may remain readable until the pipeline
+            # wakes the thread through the wakeup channel.
+            wakeup = connection._wakeup
+            pipeline = connection.decode_pipeline
+            if pipeline is None or pipeline.accepts_frames():
+                rlist = [connection.file_object, wakeup]
+            else:
+                rlist = [wakeup]
+            if connection._outgoing_packet_queue:
+                wlist = [connection.socket]
+            else:
+                wlist = []
+            timeout = 0 if more_to_read else 0.05
+            readable, writable, _ = select.select(rlist, wlist, [], timeout)
+
+            if wakeup in readable:
+                wakeup.clear()
+            # The wakeup channel is also signalled when a packet decoded by
+            # a 'DecodePipeline' becomes ready.
+            _, _, more_to_read = connection._exchange_packets(
+                self, bool(writable) or wakeup in readable,
+                more_to_read or connection.file_object in readable
+                or wakeup in readable and connection.decode_pipeline,
+                self._read_packet)
+
+    def _read_packet(self):
+        connection = self.connection
+        if connection.decode_pipeline is not None:
+            return connection.decode_pipeline.read_packet(
+                connection.file_object.read_frame)
+        return connection.reactor.read_packet(connection.file_object)
+
+
+def _send_nonblocking(sock, data):
+    # Sends as much of 'data' as 'sock' accepts without blocking, returning
+    # the number of bytes sent, or raises BlockingIOError if it accepts none.
+    if hasattr(socket, 'MSG_DONTWAIT'):
+        return sock.send(data, socket.MSG_DONTWAIT)
+    sock.setblocking(False)
+    try:
+        return sock.send(data)
+    finally:
+        sock.setblocking(True)
+
+
+class _WakeupChannel(object):
+    """A pair of connected sockets, one end of which is included in the
+       'select' call of a 'NetworkingThread', so that the thread may be woken
+       immediately when packets are queued by another thread.
+    """
+    def __init__(self):
+        self._recv_socket, self._send_socket = socket.socketpair()
+        self._recv_socket.setblocking(False)
+        self._send_socket.setblocking(False)
+        self._signalled = False
+
+    def signal(self):
+        # At most one byte is written between calls to 'clear', so that
+        # queueing many packets does not result in as many system calls.
+        if not self._signalled:
+            self._signalled = True
+            try:
+                self._send_socket.send(b'\x00')
+            except (BlockingIOError, InterruptedError):
+                pass
+
+    def clear(self):
+        # This must be called before (not after) the queue is examined, as
+        # otherwise a signal for a packet queued in between could be lost.
+        # The socket is drained before the flag is reset, as otherwise the
+        # byte of a signal in between would be drained while the flag stayed
+        # set, so that no later signal would write another byte.
+        try:
+            while self._recv_socket.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        self._signalled = False
 
-            if exc_info is not None:
-                exc_value, exc_tb = exc_info[1:]
-                raise exc_value.with_traceback(exc_tb)
+    def fileno(self):
+        return self._recv_socket.fileno()
 
 
 class PacketReactor(object):
@@ -650,61 +951,94 @@ class PacketReactor(object):
     """
     state_name = None
 
+    # The 'packet_name' of each packet that 'react' may act upon, or None if
+    # it may act upon any packet. Subclasses which handle further packets
+    # must extend this, so that they are not left undecoded in lazy mode.
+    handled_packet_names = None
+
     # Handshaking is considered the "default" state
     get_clientbound_packets = staticmethod(clientbound.handshake.get_packets)
 
     def __init__(self, connection):
         self.connection = connection
         context = self.connection.context
-        self.clientbound_packets = {
-            packet.get_id(context): packet
-            for packet in self.__class__.get_clientbound_packets(context)}
+        # This is copied from the shared map, so it may safely be modified.
+        self.clientbound_packets = dict(packet_id_map(
+            self.__class__.get_clientbound_packets, context))
 
     def read_packet(self, stream, timeout=0):
         # Block for up to `timeout' seconds waiting for `stream' to become
-        # readable, returning `None' if the timeout elapses.
+        # readable, returning `None' if the timeout elapses. 'stream' may be
+        # a FrameReader or any file object containing length-prefixed packets.
+        if isinstance(stream, framing.FrameReader):
+            frame = stream.read_frame(timeout)
+            return None if frame is None else self.decode_packet(frame)
+
         ready_to_read = select.select([stream], [], [], timeout)[0]
 
         if ready_to_read:
             length = VarInt.read(stream)
 
-            packet_data = packets.PacketBuffer()
-            packet_data.send(stream.read(length))
+            packet_data = bytearray(stream.read(length))
             # Ensure we read all the packet
-            while len(packet_data.get_writable()) < length:
-                packet_data.send(
-                    stream.read(length - len(packet_data.get_writable())))
-            packet_data.reset_cursor()
-
-            if self.connection.options.compression_enabled:
-                decompressed_size = VarInt.read(packet_data)
-                if decompressed_size > 0:
-                    decompressor = zlib.decompressobj()
-                    decompressed_packet = decompressor.decompress(
-                                                       packet_data.read())
-                    assert len(decompressed_packet) == decompressed_size, \
-                        'decompressed length %d, but expected %d' % \
-                        (len(decompressed_packet), decompressed_size)
-                    packet_data.reset()
-                    packet_data.send(decompressed_packet)
-                    packet_data.reset_cursor()
-
-            packet_id = VarInt.read(packet_data)
-
-            # If we know the structure of the packet, attempt to parse it
-            # otherwise, just return an instance of the base Packet class.
-            if packet_id in self.clientbound_packets:
-                packet = self.clientbound_packets[packet_id]()
-                packet.context = self.connection.context
-                packet.read(packet_data)
-            else:
-                packet = packets.Packet()
-                packet.context = self.connection.context
-                packet.id = packet_id
-            return packet
+            while len(packet_data) < length:
+                packet_data += stream.read(length - len(packet_data))
+            return self.decode_packet(packet_data)
         else:
             return None
 
+    def decode_packet(self, data):
+        """Decompresses (if necessary) and parses a single packet, given its
+           data as a bytes-like object, excluding the length prefix, and with
+           any encryption already removed.
+        """
+        packet_data = packets.PacketView(data)
+
+        if self.connection.options.compression_enabled:
+            decompressed_size = VarInt.read(packet_data)
+            if decompressed_size > 0:
+                decompressed_packet = self.connection.compressor.decompress(
+                    packet_data.remaining(), decompressed_size)
+                packet_data = packets.PacketView(decompressed_packet)
+
+        packet_id = VarInt.read(packet_data)
+
+        # If we know the structure of the packet, attempt to parse it
+        # otherwise, just return an instance of the base Packet class.
+        if packet_id in self.clientbound_packets:
+            packet_class = self.clientbound_packets[packet_id]
+            if self.leaves_undecoded(packet_class):
+                return packet_class.undecoded(
+                    self.connection.context, packet_data)
+            packet = packet_class()
+            packet.context = self.connection.context
+            packet.read(packet_data)
+        else:
+            packet = packets.Packet()
+            packet.context = self.connection.context
+            packet.id = packet_id
+        return packet
+
+    def is_wanted(self, packet_class):
+        """True if incoming packets of the given class are handled by this
+           reactor or accepted by any incoming packet listener.
+        """
+        names = self.handled_packet_names
+        connection = self.connection
+        return bool(
+            names is None or packet_class.packet_name in names
+            or connection.early_packet_listeners.listeners_for(packet_class)
+            or connection.packet_listeners.listeners_for(packet_class))
+
+    def leaves_undecoded(self, packet_class):
+        """True if incoming packets of the given class are to be decoded only
+           when first accessed, because lazy decoding is enabled for the
+           connection or for the class, and they are not wanted.
+        """
+        return (self.connection.options.lazy_decode
+                or packet_class.decode_lazily) \
+            and not self.is_wanted(packet_class)
+
     def react(self, packet):
         """Called with each incoming packet after early packet listeners are
            run (if none of them raise 'IgnorePacket'), but before regular
@@ -723,6 +1057,9 @@ class PacketReactor(object):
 
 class LoginReactor(PacketReactor):
     get_clientbound_packets = staticmethod(clientbound.login.get_packets)
+    handled_packet_names = frozenset((
+        'encryption request', 'disconnect', 'login success',
+        'set compression', 'login plugin request'))
 
     def react(self, packet):
         if packet.packet_name == "encryption request":
@@ -748,13 +1085,8 @@ class LoginReactor(PacketReactor):
 
             # Enable the encryption
             cipher = encryption.create_AES_cipher(secret)
-            encryptor = cipher.encryptor()
-            decryptor = cipher.decryptor()
-            self.connection.socket = encryption.EncryptedSocketWrapper(
-                self.connection.socket, encryptor, decryptor)
-            self.connection.file_object = \
-                encryption.EncryptedFileObjectWrapper(
-                    self.connection.file_object, decryptor)
+            self.connection._enable_encryption(
+                cipher.encryptor(), cipher.decryptor())
 
         elif packet.packet_name == "disconnect":
             # Receiving a disconnect packet in the login state indicates an
@@ -786,6 +1118,9 @@ class LoginReactor(PacketReactor):
 
 class PlayingReactor(PacketReactor):
     get_clientbound_packets = staticmethod(clientbound.play.get_packets)
+    handled_packet_names = frozenset((
+        'set compression', 'keep alive', 'player position and look',
+        'disconnect'))
 
     def react(self, packet):
         if packet.packet_name == "set compression":
@@ -819,6 +1154,7 @@ class PlayingReactor(PacketReactor):
 
 class StatusReactor(PacketReactor):
     get_clientbound_packets = staticmethod(clientbound.status.get_packets)
+    handled_packet_names = frozenset(('response', 'ping'))
 
     def __init__(self, connection, do_ping=False):
         super(StatusReactor, self).__init__(connection)
@@ -90,6 +90,9 @@ class EncryptedSocketWrapper(object):
     def send(self, data):
         self.actual_socket.send(self.encryptor.update(data))
 
+    def sendall(self, data):
+        self.actual_socket.sendall(self.encryptor.update(data))
+
     def fileno(self):
         return self.actual_socket.fileno()
 
@@ -0,0 +1,113 @@
+"""Splitting of the stream of bytes received from a server into the frames
+   (length-prefixed packets) of which it consists.
+"""
+import select
+
+from .types import VarInt
+
+
+class FrameBuffer(object):
+    """Accumulates data received from the server, removes any encryption, and
+       splits the result into frames delimited by VarInt length prefixes.
+    """
+    # Consumed data at the start of the buffer is discarded once it exceeds
+    # this many bytes, or immediately if the buffer becomes empty.
+    compact_threshold = 1 << 16
+
+    def __init__(self):
+        self.decryptor = None
+        self._data = bytearray()
+        self._pos = 0
+
+    def feed(self, data):
+        """Appends the given bytes-like object, as received from the network,
+           to the buffer, decrypting it if encryption has been enabled.
+        """
+        if self.decryptor is not None:
+            data = self.decryptor.update(data)
+        self._data += data
+
+    def enable_decryption(self, decryptor):
+        """Decrypts all data after the current frame using 'decryptor'. Any
+           such data already in the buffer is decrypted immediately.
+        """
+        if self._pos < len(self._data):
+            self._data[self._pos:] = decryptor.update(
+                bytes(self._data[self._pos:]))
+        self.decryptor = decryptor
+
+    def next_frame(self):
+        """Removes the next complete frame from the buffer and returns its
+           contents, excluding the length prefix, or returns None if no
+           complete frame is available.
+        """
+        data, pos = self._data, self._pos
+        end = len(data)
+
+        length = 0
+        for i in range(VarInt.max_bytes):
+            if pos + i >= end:
+                return None
+            byte = data[pos + i]
+            length |= (byte & 0x7F) << 7 * i
+            if not byte & 0x80:
+                break
+        else:
+            raise ValueError("Tried to read too long of a VarInt")
+
+        start = pos + i + 1
+        if start + length > end:
+            return None
+
+        with memoryview(data) as view:
+            frame = bytes(view[start:start + length])
+
+        self._pos = start + length
+        if self._pos == end:
+            del data[:]
+            self._pos = 0
+        elif self._pos > self.compact_threshold:
+            del data[:self._pos]
+            self._pos = 0
+        return frame
+
+
+class FrameReader(FrameBuffer):
+    """A 'FrameBuffer' which reads from a socket in large chunks, using a
+       single reusable receive buffer.
+    """
+    def __init__(self, socket, chunk_size=1 << 16):
+        super(FrameReader, self).__init__()
+        self.socket = socket
+        self._chunk = bytearray(chunk_size)
+        self._chunk_view = memoryview(self._chunk)
+
+    def fill(self):
+        """Performs a single (possibly blocking) read from the socket,
+           returning the number of bytes read, or raising EOFError if the
+           connection has been closed.
+        """
+        count = self.socket.recv_into(self._chunk)
+        if count == 0:
+            raise EOFError("Unexpected end of message.")
+        self.feed(self._chunk_view[:count])
+        return count
+
+    def read_frame(self, timeout=0):
+        """Returns the next frame, waiting for up to 'timeout' seconds for
+           data to arrive from the socket, or returns None if no complete
+           frame is available within this time.
+        """
+        frame = self.next_frame()
+        while frame is None and select.select([self], [], [], timeout)[0]:
+            self.fill()
+            frame = self.next_frame()
+            timeout = 0
+        return frame
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def close(self):
+        # The socket itself is closed by its owner.
+        pass
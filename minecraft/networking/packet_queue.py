@@ -0,0 +1,260 @@
+"""The queue of packets waiting to be written by a 'Connection', in which
+   packets are ordered by priority, and whose size may be bounded.
+"""
+import queue
+import threading
+import timeit
+from collections import deque
+
+from .types.utility import MutableRecord
+
+# Priority classes, from highest to lowest. Packets are written in order of
+# priority, and in the order in which they were queued within each priority.
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# The priority of each serverbound packet, by 'packet_name', unless it is
+# otherwise specified; other packets have PRIORITY_NORMAL.
+DEFAULT_PRIORITIES = {
+    'keep alive': PRIORITY_CRITICAL,
+    'teleport confirm': PRIORITY_CRITICAL,
+}
+
+# Serverbound packets each of which supersedes any previous packet of the same
+# class, which are suitable for the 'coalesce' argument of the queue.
+LATEST_WINS_PACKET_NAMES = frozenset(('position and look', 'client settings'))
+
+# What to do when a packet other than a critical packet is queued while the
+# queue contains 'maxsize' packets:
+#  - OVERFLOW_BLOCK: wait until space becomes available, or until the time
+#    limit given by 'block_timeout' elapses, raising 'queue.Full'. Packets
+#    queued from the networking thread itself, or by a thread holding the
+#    connection's write lock, are queued immediately.
+#  - OVERFLOW_DROP_OLDEST: discard the oldest packet of the lowest priority,
+#    but never one of a higher priority than the packet being queued, which is
+#    itself discarded if there is no such packet.
+#  - OVERFLOW_COALESCE: replace the oldest queued packet of the same class,
+#    in its place, or if there is none, act as OVERFLOW_DROP_OLDEST.
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop oldest'
+OVERFLOW_COALESCE = 'coalesce'
+
+
+class QueueStats(MutableRecord):
+    """Counters describing the use of an 'OutgoingPacketQueue'. Times are in
+       seconds.
+    """
+    __slots__ = ('enqueued', 'dequeued', 'dropped', 'coalesced', 'blocked',
+                 'max_depth', 'total_wait', 'max_wait')
+
+    def __init__(self, **kwds):
+        self.enqueued = self.dequeued = self.dropped = 0
+        self.coalesced = self.blocked = self.max_depth = 0
+        self.total_wait = self.max_wait = 0.0
+        super(QueueStats, self).__init__(**kwds)
+
+    @property
+    def mean_wait(self):
+        """The mean time spent in the queue by each dequeued packet, or None
+           if no packets have been dequeued.
+        """
+        return self.total_wait / self.dequeued if self.dequeued else None
+
+
+class OutgoingPacketQueue(object):
+    """A thread-safe queue of packets with one lane for each priority class,
+       which supports the operations of 'collections.deque' used on the
+       outgoing packet queue of a 'Connection'.
+    """
+    def __init__(self, maxsize=None, overflow=OVERFLOW_BLOCK,
+                 priorities=None, block_timeout=None, stats=None,
+                 coalesce=()):
+        """
+        :param maxsize: the number of packets, excluding critical packets,
+                        beyond which the queue overflows, or None.
+        :param overflow: one of the OVERFLOW_* constants.
+        :param priorities: a dict mapping the 'packet_name' of packets to
+                           their priorities, by default DEFAULT_PRIORITIES.
+        :param block_timeout: the maximum time to wait with OVERFLOW_BLOCK.
+        :param stats: the 'QueueStats' to be updated, or None to create one.
+        :param coalesce: the 'packet_name' of each packet which, if it is
+                         queued directly after a packet of the same class
+                         with the same priority, replaces that packet, e.g.
+                         LATEST_WINS_PACKET_NAMES.
+        """
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST,
+                            OVERFLOW_COALESCE):
+            raise ValueError('Unknown overflow policy: %r.' % (overflow,))
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.priorities = DEFAULT_PRIORITIES if priorities is None \
+            else priorities
+        self.block_timeout = block_timeout
+        self.stats = QueueStats() if stats is None else stats
+        self.coalesce = frozenset(coalesce)
+
+        # Each lane contains (time queued, packet) pairs.
+        self._lanes = tuple(deque() for _ in range(PRIORITY_LOW + 1))
+        self._size = 0
+        self._closed = False
+        self._not_full = threading.Condition(threading.Lock())
+
+    def priority_of(self, packet):
+        return self.priorities.get(packet.packet_name, PRIORITY_NORMAL)
+
+    def full(self):
+        """Returns True if the queue contains 'maxsize' packets other than
+           critical packets, which do not count towards its size.
+        """
+        if self.maxsize is None:
+            return False
+        critical = len(self._lanes[PRIORITY_CRITICAL])
+        return self._size - critical >= self.maxsize
+
+    def append(self, packet, block=True):
+        """Queues a packet, applying the overflow policy if the queue is full.
+           If 'block' is False, OVERFLOW_BLOCK does not wait, but admits the
+           packet regardless.
+        """
+        priority = self.priority_of(packet)
+        stats = self.stats
+        with self._not_full:
+            if packet.packet_name in self.coalesce:
+                # Only the last packet in the lane is replaced, so that the
+                # order of the packets actually sent is unchanged.
+                lane = self._lanes[priority]
+                if lane and type(lane[-1][1]) is type(packet):
+                    lane[-1] = lane[-1][0], packet
+                    stats.coalesced += 1
+                    stats.enqueued += 1
+                    return
+
+            if priority != PRIORITY_CRITICAL and self.full():
+                if self.overflow == OVERFLOW_BLOCK:
+                    if block and not self._closed:
+                        self._wait_not_full()
+                elif self.overflow == OVERFLOW_COALESCE and \
+                        self._replace(priority, packet):
+                    stats.coalesced += 1
+                    stats.enqueued += 1
+                    return
+                elif not self._drop_oldest(priority):
+                    # Only packets of a higher priority are queued.
+                    stats.dropped += 1
+                    return
+
+            self._lanes[priority].append((timeit.default_timer(), packet))
+            self._size += 1
+            stats.enqueued += 1
+            if self._size > stats.max_depth:
+                stats.max_depth = self._size
+
+    def extend(self, packets):
+        for packet in packets:
+            self.append(packet)
+
+    def popleft(self):
+        """Removes and returns the oldest packet of the highest priority."""
+        with self._not_full:
+            return self._popleft(timeit.default_timer())
+
+    def popleft_many(self, count):
+        """Removes and returns a list of as many as 'count' packets, in the
+           order in which 'popleft' would return them.
+        """
+        with self._not_full:
+            now = timeit.default_timer()
+            return [self._popleft(now)
+                    for _ in range(min(count, self._size))]
+
+    def supersede(self, packet):
+        """Removes the queued packets which are superseded by 'packet', which
+           is about to be written without being queued, and so would otherwise
+           be followed by those older packets. Only packets whose names are in
+           'coalesce' supersede others.
+        """
+        if packet.packet_name not in self.coalesce:
+            return
+        packet_class = type(packet)
+        with self._not_full:
+            lane = self._lanes[self.priority_of(packet)]
+            kept = [entry for entry in lane
+                    if type(entry[1]) is not packet_class]
+            removed = len(lane) - len(kept)
+            if removed:
+                self.stats.coalesced += removed
+                self._size -= removed
+                lane.clear()
+                lane.extend(kept)
+                self._not_full.notify_all()
+
+    def clear(self):
+        with self._not_full:
+            for lane in self._lanes:
+                lane.clear()
+            self._size = 0
+            self._not_full.notify_all()
+
+    def close(self):
+        """Stops any current or future calls to 'append' from blocking, e.g.
+           because the queue will no longer be emptied.
+        """
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __iter__(self):
+        with self._not_full:
+            packets = [packet for lane in self._lanes for _, packet in lane]
+        return iter(packets)
+
+    def _popleft(self, now):
+        for lane in self._lanes:
+            if lane:
+                queued_time, packet = lane.popleft()
+                break
+        else:
+            raise IndexError('pop from an empty queue')
+        self._size -= 1
+        self._not_full.notify()
+
+        stats = self.stats
+        wait = now - queued_time
+        stats.dequeued += 1
+        stats.total_wait += wait
+        if wait > stats.max_wait:
+            stats.max_wait = wait
+        return packet
+
+    def _wait_not_full(self):
+        self.stats.blocked += 1
+        if not self._not_full.wait_for(
+                lambda: self._closed or not self.full(), self.block_timeout):
+            raise queue.Full('The outgoing packet queue is full.')
+
+    def _replace(self, priority, packet):
+        lane = self._lanes[priority]
+        packet_class = type(packet)
+        for index, (queued_time, queued_packet) in enumerate(lane):
+            if type(queued_packet) is packet_class:
+                lane[index] = queued_time, packet
+                return True
+        return False
+
+    def _drop_oldest(self, priority):
+        # Discards the oldest packet of the lowest priority no higher than
+        # 'priority', returning False if there is none.
+        for lane in reversed(self._lanes[priority:]):
+            if lane:
+                lane.popleft()
+                self._size -= 1
+                self.stats.dropped += 1
+                return True
+        return False
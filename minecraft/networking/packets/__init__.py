@@ -9,8 +9,8 @@ packets.serverbound.* instead.
 '''
 
 # Packet-Related Utilities
-from .packet_buffer import PacketBuffer
-from .packet_listener import PacketListener
+from .packet_buffer import PacketBuffer, PacketView
+from .packet_listener import PacketListener, PacketListenerList
 
 # Abstract Packet Classes
 from .packet import Packet
@@ -8,6 +8,7 @@ from minecraft.networking.types import (
     PositionAndLook, multi_attribute_alias, attribute_transform, NBT
 )
 from .block_change_packet import BlockChangePacket, MultiBlockChangePacket
+from .chunk_data_packet import ChunkDataPacket, UnloadChunkPacket
 from .combat_event_packet import (
     CombatEventPacket, EnterCombatEventPacket, EndCombatEventPacket,
     DeathCombatEventPacket,
@@ -76,6 +77,12 @@ def get_packets(context):
             FacePlayerPacket
         }
 
+    if context.protocol_later_eq(751):
+        packets |= {
+            ChunkDataPacket,
+            UnloadChunkPacket,
+        }
+
     return packets
 
 
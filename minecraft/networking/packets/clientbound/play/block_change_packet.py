@@ -1,8 +1,9 @@
+from array import array
+
 from minecraft.networking.packets import Packet
 from minecraft.networking.types import (
     Type, VarInt, VarLong, UnsignedLong, Integer, UnsignedByte, Position,
-    Vector, MutableRecord, PrefixedArray, Boolean, attribute_alias,
-    multi_attribute_alias,
+    Vector, MutableRecord, Boolean, attribute_alias, multi_attribute_alias,
 )
 
 
@@ -140,17 +141,150 @@ class MultiBlockChangePacket(Packet):
                 UnsignedByte.send(record.y, socket)
                 VarInt.send(record.block_state_id, socket)
 
+    class RecordArray(Type):
+        """ The records of a packet, decoded all at once into the parallel
+            arrays 'x', 'y', 'z' (of type 'B') and 'block_state_id' (of type
+            'I'), in which the coordinates are relative as in 'Record'.
+
+            As a compatibility view, this is also a sequence of 'Record'
+            instances, which are created on access, so that changes to them
+            are not reflected in the arrays; records may be added by 'append'
+            and 'extend'. When writing a packet, 'records' may also be a list
+            of 'Record' instances.
+        """
+        __slots__ = 'x', 'y', 'z', 'block_state_id'
+
+        def __init__(self, records=()):
+            self.x, self.y, self.z = array('B'), array('B'), array('B')
+            self.block_state_id = array('I')
+            self.extend(records)
+
+        def append(self, record):
+            self.x.append(record.x)
+            self.y.append(record.y)
+            self.z.append(record.z)
+            self.block_state_id.append(record.block_state_id)
+
+        def extend(self, records):
+            for record in records:
+                self.append(record)
+
+        def __len__(self):
+            return len(self.block_state_id)
+
+        def __getitem__(self, index):
+            if isinstance(index, slice):
+                return [self[i] for i in range(*index.indices(len(self)))]
+            return MultiBlockChangePacket.Record(
+                x=self.x[index], y=self.y[index], z=self.z[index],
+                block_state_id=self.block_state_id[index])
+
+        def __iter__(self):
+            record = MultiBlockChangePacket.Record
+            return (record(x=x, y=y, z=z, block_state_id=state)
+                    for x, y, z, state in zip(
+                        self.x, self.y, self.z, self.block_state_id))
+
+        def __eq__(self, other):
+            if isinstance(other, MultiBlockChangePacket.RecordArray):
+                return self.x == other.x and self.y == other.y and \
+                    self.z == other.z and \
+                    self.block_state_id == other.block_state_id
+            return list(self) == other
+
+        def __ne__(self, other):
+            return not (self == other)
+
+        __hash__ = None
+
+        def __repr__(self):
+            return repr(list(self))
+
+        @classmethod
+        def read_with_context(cls, file_object, context):
+            # The records are always the last field, so if 'file_object' is
+            # not a 'PacketView', all remaining data is read.
+            count = VarInt.read(file_object)
+            view = getattr(file_object, 'view', None)
+            if view is not None:
+                data, pos = view, file_object.pos
+            else:
+                data, pos = file_object.read(), 0
+            records = cls()
+            if context.protocol_later_eq(741):
+                values, pos = _read_varints(data, pos, count)
+                records.x = array('B', [v >> 8 & 0xF for v in values])
+                records.z = array('B', [v >> 4 & 0xF for v in values])
+                records.y = array('B', [v & 0xF for v in values])
+                records.block_state_id = array('I', [v >> 12 for v in values])
+            else:
+                xs, ys, zs, states = [], [], [], []
+                for _ in range(count):
+                    xz, y = data[pos], data[pos + 1]
+                    xs.append(xz >> 4)
+                    zs.append(xz & 0xF)
+                    ys.append(y)
+                    state, pos = _read_varints(data, pos + 2, 1)
+                    states.append(state[0])
+                records.x, records.y, records.z = \
+                    array('B', xs), array('B', ys), array('B', zs)
+                records.block_state_id = array('I', states)
+            if view is not None:
+                file_object.pos = pos
+            return records
+
+        @classmethod
+        def send_with_context(cls, records, socket, context):
+            if not isinstance(records, cls):
+                records = cls(records)
+            VarInt.send(len(records), socket)
+            values = zip(records.x, records.y, records.z,
+                         records.block_state_id)
+            if context.protocol_later_eq(741):
+                socket.send(b''.join(
+                    VarLong.encode(state << 12 | (x & 0xF) << 8 |
+                                   (z & 0xF) << 4 | y & 0xF)
+                    for x, y, z, state in values))
+            else:
+                socket.send(b''.join(
+                    bytes((x << 4 | z & 0xF, y)) + VarInt.encode(state)
+                    for x, y, z, state in values))
+
     get_definition = staticmethod(lambda context: [
         {'chunk_section_pos': MultiBlockChangePacket.ChunkSectionPos},
         {'invert_trust_edges': Boolean}
         if context.protocol_later_eq(748) else {},  # Provisional field name.
-        {'records': PrefixedArray(VarInt, MultiBlockChangePacket.Record)},
+        {'records': MultiBlockChangePacket.RecordArray},
     ] if context.protocol_later_eq(741) else [
         {'chunk_x': Integer},
         {'chunk_z': Integer},
-        {'records': PrefixedArray(VarInt, MultiBlockChangePacket.Record)},
+        {'records': MultiBlockChangePacket.RecordArray},
     ])
 
     # Access the 'chunk_x' and 'chunk_z' fields as a tuple.
     # Only used prior to protocol 741.
     chunk_pos = multi_attribute_alias(tuple, 'chunk_x', 'chunk_z')
+
+
+def _read_varints(data, pos, count):
+    # Decodes 'count' consecutive VarInts or VarLongs from the bytes-like
+    # object 'data' starting at index 'pos', returning a list of their values
+    # and the index after the last.
+    values = []
+    append = values.append
+    try:
+        for _ in range(count):
+            byte = data[pos]
+            pos += 1
+            value, shift = byte & 0x7F, 7
+            while byte & 0x80:
+                if shift > 63:
+                    raise ValueError('Tried to read too long of a VarLong')
+                byte = data[pos]
+                pos += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+            append(value)
+    except IndexError:
+        raise EOFError('Unexpected end of message.')
+    return values, pos
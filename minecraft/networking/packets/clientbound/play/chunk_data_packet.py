@@ -0,0 +1,387 @@
+import struct
+import sys
+from array import array
+
+from minecraft.networking.packets import Packet, PacketBuffer, PacketView
+from minecraft.networking.types import (
+    Type, Integer, Boolean, VarInt, UnsignedByte, Short, Long, NBT,
+    MutableRecord, multi_attribute_alias,
+)
+
+# The number of bits per entry of the direct (global) palette of block states.
+GLOBAL_PALETTE_BITS = 15
+
+# Tables for 'bytes.translate' extracting the low or high 4 bits of each byte.
+_LOW_NIBBLES = bytes(b & 0xF for b in range(256))
+_HIGH_NIBBLES = bytes(b >> 4 for b in range(256))
+
+
+def _little_endian_longs(data):
+    # Reverses the order of the bytes within each 8-byte long in 'data', so
+    # that the entries packed into each long, least significant first, appear
+    # in order from the first byte.
+    result = bytearray(len(data))
+    for i in range(8):
+        result[i::8] = data[7 - i::8]
+    return result
+
+
+def unpack_entries(data, bits, count, typecode='B'):
+    """ Returns an 'array' of the given type code containing the first 'count'
+        entries of 'bits' bits each packed into the big-endian longs in the
+        bytes-like object 'data', where, as from protocol 735 onwards, no entry
+        spans two longs.
+    """
+    if bits == 8 and typecode == 'B':
+        return array('B', _little_endian_longs(data)[:count])
+    if bits == 4 and typecode == 'B' and count % 2 == 0:
+        data = _little_endian_longs(data)[:count // 2]
+        result = bytearray(count)
+        result[0::2] = data.translate(_LOW_NIBBLES)
+        result[1::2] = data.translate(_HIGH_NIBBLES)
+        return array('B', result)
+
+    longs = array('Q', data)
+    if sys.byteorder == 'little':
+        longs.byteswap()
+    per_long, mask = 64 // bits, (1 << bits) - 1
+    result = array(typecode, bytes(count * array(typecode).itemsize))
+    for slot in range(min(per_long, count)):
+        shift = slot * bits
+        length = len(range(slot, count, per_long))
+        result[slot::per_long] = array(
+            typecode, [value >> shift & mask for value in longs[:length]])
+    return result
+
+
+def pack_entries(entries, bits):
+    """ The inverse of 'unpack_entries': returns the bytes of the big-endian
+        longs into which the given entries are packed.
+    """
+    per_long = 64 // bits
+    longs = [0] * -(-len(entries) // per_long)
+    for slot in range(per_long):
+        shift = slot * bits
+        for i, entry in enumerate(entries[slot::per_long]):
+            longs[i] |= entry << shift
+    return struct.pack('>%dQ' % len(longs), *longs)
+
+
+class ChunkSection(Type):
+    """ A 16x16x16 section of blocks, each identified by its global block state
+        ID, at the index (y << 8 | z << 4 | x) of its coordinates relative to
+        the section.
+
+        The states are stored in one of three forms: if all blocks have the
+        same state, 'palette' contains only that state and 'data' is None;
+        otherwise, if there are at most 256 distinct states, 'data' is an
+        'array' of type 'B' indexing 'palette'; otherwise 'palette' is None
+        and 'data' is an 'array' of type 'H' containing the states directly.
+    """
+    __slots__ = 'palette', 'data'
+
+    VOLUME = 4096
+
+    def __init__(self, palette=None, data=None):
+        self.palette = [0] if palette is None and data is None else palette
+        self.data = data
+
+    @classmethod
+    def filled(cls, state):
+        return cls([state])
+
+    @classmethod
+    def from_states(cls, states):
+        """ Creates a section from a sequence of 4096 block states. """
+        palette = list(dict.fromkeys(states))
+        if len(palette) == 1:
+            return cls(palette)
+        if len(palette) > 256:
+            return cls(None, array('H', states))
+        indices = {state: index for index, state in enumerate(palette)}
+        return cls(palette, array('B', map(indices.__getitem__, states)))
+
+    def get(self, index):
+        data = self.data
+        if data is None:
+            return self.palette[0]
+        palette = self.palette
+        return data[index] if palette is None else palette[data[index]]
+
+    def set(self, index, state):
+        palette, data = self.palette, self.data
+        if palette is None:
+            data[index] = state
+            return
+        try:
+            palette_index = palette.index(state)
+        except ValueError:
+            if len(palette) == 256:
+                # The palette is full, so store the states directly.
+                self.data = self.states()
+                self.palette = None
+                self.data[index] = state
+                return
+            palette.append(state)
+            palette_index = len(palette) - 1
+        if data is None:
+            if palette_index == 0:
+                return
+            self.data = data = array('B', bytes(self.VOLUME))
+        data[index] = palette_index
+
+    def states(self):
+        """ A new 'array' of type 'H' containing the state of each block. """
+        palette, data = self.palette, self.data
+        if data is None:
+            return array('H', palette) * self.VOLUME
+        if palette is None:
+            return array('H', data)
+        return array('H', map(palette.__getitem__, data))
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.states() == other.states()
+
+    def __repr__(self):
+        if self.data is None:
+            return '%s.filled(%r)' % (type(self).__name__, self.palette[0])
+        return '%s(<%d states>)' % (
+            type(self).__name__, len(set(self.states())))
+
+    @classmethod
+    def read_with_context(cls, file_object, context):
+        Short.read(file_object)  # The number of non-air blocks.
+        section = cls._read_container(
+            file_object, context, cls.VOLUME, 4, 8, True)
+        if context.protocol_later_eq(757):
+            # Biomes are read, but not retained.
+            cls._read_container(file_object, context, 64, 1, 3, False)
+        return section
+
+    @classmethod
+    def send_with_context(cls, section, socket, context):
+        states = section.states()
+        Short.send(cls.VOLUME - states.count(0), socket)
+        palette, data = section.palette, section.data
+        if data is None and context.protocol_later_eq(757):
+            UnsignedByte.send(0, socket)
+            VarInt.send(palette[0], socket)
+            VarInt.send(0, socket)
+        else:
+            if palette is None:
+                bits, entries = GLOBAL_PALETTE_BITS, states
+            else:
+                bits = max(4, (len(palette) - 1).bit_length())
+                entries = [0] * cls.VOLUME if data is None else data
+            UnsignedByte.send(bits, socket)
+            if palette is not None:
+                VarInt.send(len(palette), socket)
+                for state in palette:
+                    VarInt.send(state, socket)
+            data = pack_entries(entries, bits)
+            VarInt.send(len(data) // 8, socket)
+            socket.send(data)
+        if context.protocol_later_eq(757):
+            # A single biome, with ID 0.
+            UnsignedByte.send(0, socket)
+            VarInt.send(0, socket)
+            VarInt.send(0, socket)
+
+    @classmethod
+    def _read_container(cls, file_object, context, count, min_bits,
+                        max_indirect_bits, keep):
+        # Reads a paletted container of 'count' entries, returning a section
+        # if 'keep' is True, or else None.
+        bits = UnsignedByte.read(file_object)
+        if bits == 0 and context.protocol_later_eq(757):
+            palette = [VarInt.read(file_object)]
+        elif bits <= max_indirect_bits:
+            bits = max(bits, min_bits)
+            palette = [VarInt.read(file_object)
+                       for _ in range(VarInt.read(file_object))]
+        else:
+            palette = None
+        data = file_object.read(VarInt.read(file_object) * 8)
+        if not keep:
+            return None
+        if bits == 0:
+            return cls(palette)
+        if palette is None:
+            return cls(None, unpack_entries(data, bits, count, 'H'))
+        if len(palette) == 1:
+            return cls(palette)
+        return cls(palette, unpack_entries(data, bits, count))
+
+
+class ChunkDataPacket(Packet):
+    """ The blocks of a chunk column, for protocol 751 (1.16.2) onwards.
+
+        'sections' contains, for each section from the bottom of the world
+        upwards, a 'ChunkSection' or None if the section was not sent (in
+        which case it is empty, if 'full_chunk' is True, or else unchanged).
+        Light data, and prior to protocol 757 biome data, are not read.
+    """
+    @staticmethod
+    def get_id(context):
+        return 0x22 if context.protocol_later_eq(755) else \
+               0x20
+
+    packet_name = 'chunk data'
+    decode_lazily = True
+
+    class BlockEntity(MutableRecord):
+        __slots__ = 'x', 'y', 'z', 'type', 'data'
+
+        # Access the 'x', 'y', 'z' fields as a tuple.
+        position = multi_attribute_alias(tuple, 'x', 'y', 'z')
+
+    full_chunk = True
+    biomes = None
+
+    # Access the 'chunk_x' and 'chunk_z' fields as a tuple.
+    chunk_pos = multi_attribute_alias(tuple, 'chunk_x', 'chunk_z')
+
+    def read(self, file_object):
+        context = self.context
+        self.chunk_x = Integer.read(file_object)
+        self.chunk_z = Integer.read(file_object)
+        if context.protocol_earlier(755):
+            self.full_chunk = Boolean.read(file_object)
+            mask = VarInt.read(file_object)
+        elif context.protocol_earlier(757):
+            mask = 0
+            for i in range(VarInt.read(file_object)):
+                mask |= (Long.read(file_object) & 0xFFFFFFFFFFFFFFFF) << 64 * i
+        else:
+            mask = None
+        self.heightmaps = NBT.read(file_object)
+        if context.protocol_earlier(757) and self.full_chunk:
+            self.biomes = [VarInt.read(file_object)
+                           for _ in range(VarInt.read(file_object))]
+
+        data = file_object.read(VarInt.read(file_object))
+        self.sections = self._read_sections(data, mask)
+
+        self.block_entities = []
+        for _ in range(VarInt.read(file_object)):
+            if context.protocol_later_eq(757):
+                xz = UnsignedByte.read(file_object)
+                entity = self.BlockEntity(
+                    x=self.chunk_x << 4 | xz >> 4, y=Short.read(file_object),
+                    z=self.chunk_z << 4 | xz & 0xF,
+                    type=VarInt.read(file_object),
+                    data=_read_optional_nbt(file_object))
+            else:
+                data = NBT.read(file_object)
+                entity = self.BlockEntity(
+                    x=data['x'].value, y=data['y'].value, z=data['z'].value,
+                    type=None, data=data)
+            self.block_entities.append(entity)
+
+    def _read_sections(self, data, mask):
+        data = PacketView(data)
+        sections = []
+        if mask is None:
+            while data.pos < len(data.view):
+                sections.append(
+                    ChunkSection.read_with_context(data, self.context))
+        else:
+            while mask:
+                sections.append(
+                    ChunkSection.read_with_context(data, self.context)
+                    if mask & 1 else None)
+                mask >>= 1
+        return sections
+
+    def write_fields(self, packet_buffer):
+        context = self.context
+        Integer.send(self.chunk_x, packet_buffer)
+        Integer.send(self.chunk_z, packet_buffer)
+        mask = sum(1 << i for i, section in enumerate(self.sections)
+                   if section is not None)
+        if context.protocol_earlier(755):
+            Boolean.send(self.full_chunk, packet_buffer)
+            VarInt.send(mask, packet_buffer)
+        elif context.protocol_earlier(757):
+            longs = []
+            while mask:
+                longs.append(mask & 0xFFFFFFFFFFFFFFFF)
+                mask >>= 64
+            VarInt.send(len(longs), packet_buffer)
+            for value in longs:
+                Long.send(value - (value >> 63 << 64), packet_buffer)
+        NBT.send(self.heightmaps, packet_buffer)
+        if context.protocol_earlier(757) and self.full_chunk:
+            biomes = self.biomes or []
+            VarInt.send(len(biomes), packet_buffer)
+            for biome in biomes:
+                VarInt.send(biome, packet_buffer)
+
+        data = PacketBuffer()
+        for section in self.sections:
+            if section is not None:
+                ChunkSection.send_with_context(section, data, context)
+            elif context.protocol_later_eq(757):
+                ChunkSection.send_with_context(
+                    ChunkSection.filled(0), data, context)
+        data = data.get_writable()
+        VarInt.send(len(data), packet_buffer)
+        packet_buffer.send(data)
+
+        VarInt.send(len(self.block_entities), packet_buffer)
+        for entity in self.block_entities:
+            if context.protocol_later_eq(757):
+                UnsignedByte.send(
+                    (entity.x & 0xF) << 4 | entity.z & 0xF, packet_buffer)
+                Short.send(entity.y, packet_buffer)
+                VarInt.send(entity.type, packet_buffer)
+                if entity.data is None:
+                    UnsignedByte.send(0, packet_buffer)
+                else:
+                    NBT.send(entity.data, packet_buffer)
+            else:
+                NBT.send(entity.data, packet_buffer)
+        if context.protocol_later_eq(757):
+            # Trust edges, then empty light masks and light arrays.
+            Boolean.send(True, packet_buffer)
+            for _ in range(6):
+                VarInt.send(0, packet_buffer)
+
+
+class UnloadChunkPacket(Packet):
+    @staticmethod
+    def get_id(context):
+        return 0x1D if context.protocol_later_eq(755) else \
+               0x1C
+
+    packet_name = 'unload chunk'
+    definition = [
+        {'chunk_x': Integer},
+        {'chunk_z': Integer}]
+
+    # Access the 'chunk_x' and 'chunk_z' fields as a tuple.
+    chunk_pos = multi_attribute_alias(tuple, 'chunk_x', 'chunk_z')
+
+
+class _PrefixedReader(object):
+    # A file-like object reading the given bytes, and then from 'file_object'.
+    def __init__(self, prefix, file_object):
+        self.prefix = prefix
+        self.file_object = file_object
+
+    def read(self, length=None):
+        prefix, self.prefix = self.prefix, b''
+        if length is None:
+            return prefix + self.file_object.read()
+        if length <= len(prefix):
+            self.prefix = prefix[length:]
+            return prefix[:length]
+        return prefix + self.file_object.read(length - len(prefix))
+
+
+def _read_optional_nbt(file_object):
+    # Reads an NBT compound, or a single TAG_End byte standing for None.
+    tag_type = file_object.read(1)
+    if tag_type == b'\x00':
+        return None
+    return NBT.read(_PrefixedReader(tag_type, file_object))
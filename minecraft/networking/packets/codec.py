@@ -0,0 +1,132 @@
+"""Compilation of packet definitions into specialised functions that read and
+   write the fields of a packet, which are used by 'Packet.read' and
+   'Packet.write_fields' instead of interpreting the definition each time.
+"""
+import struct
+from keyword import iskeyword
+
+from ..types import Type
+
+__all__ = 'PacketCodec', 'get_codec'
+
+
+class PacketCodec(object):
+    """ The compiled form of a packet definition.
+
+        'read(packet, packet_view)' sets the fields of 'packet' from the data
+        in the 'PacketView' 'packet_view', and 'write(packet, packet_buffer)'
+        writes them into the 'PacketBuffer' 'packet_buffer'. Runs of adjacent
+        fixed-width fields (see 'Type.struct_format') are read and written by
+        a single 'struct.Struct'; should too little data remain for such a
+        run, it is instead read field by field, as by 'Packet.read'.
+    """
+    __slots__ = 'read', 'write', 'source'
+
+    def __init__(self, definition):
+        namespace = {'struct_error': struct.error}
+        read_lines, write_lines = [], []
+        run = []
+
+        def flush_run():
+            if not run:
+                return
+            index = len(namespace)
+            struct_name, type_names = 'S%d' % index, []
+            namespace[struct_name] = struct.Struct(
+                '>' + ''.join(data_type.struct_format
+                              for _, data_type in run))
+            for i, (_, data_type) in enumerate(run):
+                type_names.append('T%d_%d' % (index, i))
+                namespace[type_names[-1]] = data_type
+            values = ['v%d' % i for i in range(len(run))]
+
+            read_lines.append('try:')
+            read_lines.append('    %s, = f.unpack(%s)'
+                              % (', '.join(values), struct_name))
+            read_lines.append('except struct_error:')
+            for value, type_name in zip(values, type_names):
+                read_lines.append('    %s = %s.read_with_context(f, context)'
+                                  % (value, type_name))
+            for (name, _), value in zip(run, values):
+                read_lines.append(_store(name, value))
+
+            write_lines.append('buffer.send(%s.pack(%s))' % (
+                struct_name, ', '.join(_load(name) for name, _ in run)))
+            del run[:]
+
+        for field in definition:
+            for name, data_type in field.items():
+                if isinstance(data_type, type) and \
+                        data_type.__dict__.get('struct_format') is not None:
+                    run.append((name, data_type))
+                    continue
+                flush_run()
+                type_name = 'T%d' % len(namespace)
+                namespace[type_name] = data_type
+                if _defines(data_type, 'read_with_context'):
+                    read_expr = '%s.read_with_context(f, context)' % type_name
+                else:
+                    read_expr = '%s.read(f)' % type_name
+                read_lines.append(_store(name, read_expr))
+                if _defines(data_type, 'send_with_context'):
+                    write_lines.append(
+                        '%s.send_with_context(%s, buffer, context)'
+                        % (type_name, _load(name)))
+                else:
+                    write_lines.append('%s.send(%s, buffer)'
+                                       % (type_name, _load(name)))
+        flush_run()
+
+        self.source = '\n'.join(
+            ['def read(packet, f):', '    context = packet.context'] +
+            ['    ' + line for line in read_lines] +
+            ['', 'def write(packet, buffer):'] +
+            ['    context = packet.context'] +
+            ['    ' + line for line in write_lines])
+        exec(compile(self.source, '<packet codec>', 'exec'), namespace)
+        self.read = namespace['read']
+        self.write = namespace['write']
+
+
+def get_codec(packet_class, context):
+    """ The 'PacketCodec' for the definition of 'packet_class' in the given
+        'ConnectionContext', which is compiled on first use, or None if the
+        class has no definition in this context.
+    """
+    key = packet_class, context.protocol_version
+    try:
+        return _codecs[key]
+    except KeyError:
+        definition = packet_class.get_definition(context)
+        codec = None if definition is None else PacketCodec(definition)
+        _codecs[key] = codec
+        return codec
+
+
+# Maps (packet class, protocol version) to the result of 'get_codec'.
+_codecs = {}
+
+
+def _defines(data_type, method_name):
+    # True if the method of 'data_type' with the given name is not inherited
+    # from 'Type', i.e. if it must be called in preference to its counterpart
+    # without a context.
+    cls = data_type if isinstance(data_type, type) else type(data_type)
+    for supercls in cls.__mro__:
+        if method_name in supercls.__dict__:
+            return supercls is not Type
+    return False
+
+
+def _is_plain_name(name):
+    return name.isidentifier() and not iskeyword(name)
+
+
+def _load(name):
+    return 'packet.%s' % name if _is_plain_name(name) else \
+           'getattr(packet, %r)' % name
+
+
+def _store(name, expr):
+    return 'packet.%s = %s' % (name, expr) if _is_plain_name(name) else \
+           'setattr(packet, %r, %s)' % (name, expr)
@@ -3,12 +3,20 @@ from zlib import compress
 from minecraft.networking.types import (
     VarInt, Enum, overridable_property,
 )
-from .packet_buffer import PacketBuffer
+from .packet_buffer import PacketBuffer, PacketView
+from .codec import get_codec
+from .registry import packet_id
 
 
 class Packet(object):
     packet_name = "base"
 
+    # If True, incoming packets of this class which no listener accepts and
+    # which the current reactor does not handle are left undecoded (see
+    # 'undecoded') even if the connection's 'lazy_decode' option is not set,
+    # as decoding them is costly.
+    decode_lazily = False
+
     # To define the packet ID, either:
     #  1. Define the attribute `id', of type int, in a subclass; or
     #  2. Override `get_id' in a subclass and return the correct packet ID
@@ -22,7 +30,8 @@ class Packet(object):
 
     @overridable_property
     def id(self):
-        return None if self.context is None else self.get_id(self.context)
+        return None if self.context is None else \
+            packet_id(type(self), self.context)
 
     # To define the network data layout of a packet, either:
     #  1. Define the attribute `definition', a list of fields, each of which
@@ -63,37 +72,74 @@ class Packet(object):
             setattr(self, key, value)
         return self
 
+    @classmethod
+    def undecoded(cls, context, file_object):
+        """ Returns an instance of this class whose fields are read from
+            'file_object' (which must remain valid until then) only when an
+            attribute other than 'context', 'id' or 'packet_name' is first
+            accessed.
+        """
+        lazy_class = _lazy_classes.get(cls)
+        if lazy_class is None:
+            lazy_class = type(cls.__name__, (cls,), {
+                '__getattribute__': _decoding_getattribute,
+                '__module__': cls.__module__,
+                '__qualname__': cls.__qualname__,
+            })
+            _lazy_classes[cls] = lazy_class
+        packet = lazy_class.__new__(lazy_class)
+        packet.context = context
+        packet._undecoded = file_object
+        return packet
+
+    def _compiled_codec(self):
+        # The 'PacketCodec' compiled from this packet's definition, or None if
+        # the definition is overridden in this instance, or if the packet has
+        # no definition or context.
+        if self.context is None or 'definition' in self.__dict__:
+            return None
+        return get_codec(type(self), self.context)
+
     def read(self, file_object):
+        if isinstance(file_object, PacketView):
+            codec = self._compiled_codec()
+            if codec is not None:
+                return codec.read(self, file_object)
         for field in self.definition:  # pylint: disable=not-an-iterable
             for var_name, data_type in field.items():
                 value = data_type.read_with_context(file_object, self.context)
                 setattr(self, var_name, value)
 
-    # Writes a packet buffer to the socket with the appropriate headers
-    # and compressing the data if necessary
-    def _write_buffer(self, socket, packet_buffer, compression_threshold):
+    # Appends the framed form of a packet's payload to the bytearray 'out',
+    # with the appropriate headers and compressing the data if necessary
+    @staticmethod
+    def _write_frame(out, payload, compression_threshold, compressor=None):
         # compression_threshold of None means compression is disabled
         if compression_threshold is not None:
-            if len(packet_buffer.get_writable()) > compression_threshold != -1:
-                # compress the current payload
-                packet_data = packet_buffer.get_writable()
-                compressed_data = compress(packet_data)
-                packet_buffer.reset()
-                # write out the length of the uncompressed payload
-                VarInt.send(len(packet_data), packet_buffer)
-                # write the compressed payload itself
-                packet_buffer.send(compressed_data)
+            if len(payload) > compression_threshold != -1:
+                # write out the length of the uncompressed payload, followed
+                # by the compressed payload itself
+                header = VarInt.encode(len(payload))
+                payload = compress(payload) if compressor is None \
+                    else compressor.compress(payload)
             else:
                 # write out a 0 to indicate uncompressed data
-                packet_data = packet_buffer.get_writable()
-                packet_buffer.reset()
-                VarInt.send(0, packet_buffer)
-                packet_buffer.send(packet_data)
-
-        VarInt.send(len(packet_buffer.get_writable()), socket)  # Packet Size
-        socket.send(packet_buffer.get_writable())  # Packet Payload
-
-    def write(self, socket, compression_threshold=None):
+                header = b'\x00'
+            out += VarInt.encode(len(header) + len(payload))  # Packet Size
+            out += header
+        else:
+            out += VarInt.encode(len(payload))  # Packet Size
+        out += payload  # Packet Payload
+        return out
+
+    def serialize(self, compression_threshold=None, out=None,
+                  compressor=None):
+        """ Returns a bytearray containing the packet exactly as it is written
+            to the network (before any encryption), including its length. If
+            the bytearray 'out' is given, the packet is appended to it. If
+            given, 'compressor' is a 'PacketCompressor' used in place of the
+            default zlib settings.
+        """
         # buffer the data since we need to know the length of each packet's
         # payload
         packet_buffer = PacketBuffer()
@@ -101,11 +147,19 @@ class Packet(object):
         VarInt.send(self.id, packet_buffer)
         # write every individual field
         self.write_fields(packet_buffer)
-        self._write_buffer(socket, packet_buffer, compression_threshold)
+        return self._write_frame(bytearray() if out is None else out,
+                                 packet_buffer.get_writable(),
+                                 compression_threshold, compressor)
+
+    def write(self, socket, compression_threshold=None):
+        socket.send(self.serialize(compression_threshold))
 
     def write_fields(self, packet_buffer):
         # Write the fields comprising the body of the packet (excluding the
         # length, packet ID, compression and encryption) into a PacketBuffer.
+        codec = self._compiled_codec()
+        if codec is not None:
+            return codec.write(self, packet_buffer)
         for field in self.definition:  # pylint: disable=not-an-iterable
             for var_name, data_type in field.items():
                 data = getattr(self, var_name)
@@ -154,3 +208,28 @@ class Packet(object):
             enum_class = getattr(cls, enum_name)
             if isinstance(enum_class, type) and issubclass(enum_class, Enum):
                 return enum_class
+
+
+# Maps each subclass of 'Packet' to the subclass used by 'Packet.undecoded'.
+_lazy_classes = {}
+
+# Attributes of a packet returned by 'Packet.undecoded' which may be accessed
+# without causing it to be decoded.
+_undecoded_attributes = frozenset((
+    '__class__', '__dict__', '_undecoded', 'context', 'get_id', 'id',
+    'packet_name',
+))
+
+
+def _decoding_getattribute(self, name):
+    # The '__getattribute__' method of classes created by 'Packet.undecoded':
+    # on first access to an attribute that requires the packet's fields, the
+    # packet is reverted to its original class and then decoded.
+    if name not in _undecoded_attributes:
+        file_object = object.__getattribute__(self, '__dict__') \
+            .pop('_undecoded', None)
+        if file_object is not None:
+            original_class = type(self).__bases__[0]
+            object.__setattr__(self, '__class__', original_class)
+            self.read(file_object)
+    return object.__getattribute__(self, name)
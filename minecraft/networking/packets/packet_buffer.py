@@ -26,3 +26,47 @@ class PacketBuffer(object):
 
     def get_writable(self):
         return self.bytes.getvalue()
+
+
+class PacketView(object):
+    """A read-only counterpart of 'PacketBuffer', which decodes directly from
+       a 'memoryview' over the given bytes-like object using a cursor, rather
+       than copying the data into a 'BytesIO'.
+    """
+    __slots__ = 'view', 'pos'
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.pos = 0
+
+    def read(self, length=None):
+        start = self.pos
+        end = len(self.view)
+        if length is not None and 0 <= length < end - start:
+            end = start + length
+        self.pos = end
+        return self.view[start:end].tobytes()
+
+    def recv(self, length=None):
+        return self.read(length)
+
+    def unpack(self, struct):
+        """ Reads values of the layout given by the 'struct.Struct' instance
+            'struct' directly from the underlying memory.
+        """
+        values = struct.unpack_from(self.view, self.pos)
+        self.pos += struct.size
+        return values
+
+    def remaining(self):
+        """ A 'memoryview' over all data after the cursor, which is advanced
+            to the end of the data.
+        """
+        start, self.pos = self.pos, len(self.view)
+        return self.view[start:]
+
+    def reset_cursor(self):
+        self.pos = 0
+
+    def get_writable(self):
+        return self.view.tobytes()
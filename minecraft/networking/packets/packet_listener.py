@@ -9,9 +9,62 @@ class PacketListener(object):
             if issubclass(arg, Packet):
                 self.packets_to_listen.append(arg)
 
-    def call_packet(self, packet):
+    def accepts(self, packet):
+        """ True if this listener is interested in the given packet. """
         for packet_type in self.packets_to_listen:
             if isinstance(packet, packet_type):
-                self.callback(packet)
                 return True
         return False
+
+    def call_packet(self, packet):
+        if self.accepts(packet):
+            self.callback(packet)
+            return True
+        return False
+
+
+class PacketListenerList(list):
+    """ A list of 'PacketListener' instances, which also maintains a table
+        mapping each packet class to the listeners accepting packets of that
+        class, in order. The table is computed lazily for each class, and is
+        discarded whenever the list is modified.
+    """
+    def __init__(self, *args):
+        super(PacketListenerList, self).__init__(*args)
+        self._table = {}
+
+    def listeners_for(self, packet_class):
+        """ A tuple of the listeners in this list which accept packets of the
+            given class.
+        """
+        table = self._table
+        try:
+            return table[packet_class]
+        except KeyError:
+            listeners = tuple(
+                listener for listener in self
+                if any(issubclass(packet_class, packet_type)
+                       for packet_type in listener.packets_to_listen))
+            table[packet_class] = listeners
+            return listeners
+
+
+def _invalidating(name):
+    # Wraps the method of 'list' with the given name so that it discards the
+    # table of a 'PacketListenerList' after modifying the list. This is done
+    # afterwards so that a concurrent lookup cannot store a stale entry in the
+    # new table.
+    method = getattr(list, name)
+
+    def invalidating_method(self, *args, **kwds):
+        result = method(self, *args, **kwds)
+        self._table = {}
+        return result
+    invalidating_method.__name__ = name
+    return invalidating_method
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(PacketListenerList, _name, _invalidating(_name))
+del _name
@@ -0,0 +1,41 @@
+"""A process-wide cache of packet IDs, so that the conditional expressions in
+   each packet class's 'get_id' are evaluated only once per protocol version.
+"""
+
+__all__ = 'packet_id', 'packet_id_map'
+
+
+def packet_id(packet_class, context):
+    """ The result of 'packet_class.get_id(context)', which is computed once
+        for each protocol version.
+    """
+    key = packet_class, context.protocol_version
+    try:
+        return _packet_ids[key]
+    except KeyError:
+        result = packet_class.get_id(context)
+        _packet_ids[key] = result
+        return result
+
+
+def packet_id_map(get_packets, context):
+    """ A dict mapping the ID of each packet class in 'get_packets(context)',
+        where 'get_packets' is e.g. 'clientbound.play.get_packets', to that
+        class. It is computed once for each protocol version, and is shared
+        between callers, so must not be modified.
+    """
+    key = get_packets, context.protocol_version
+    try:
+        return _packet_id_maps[key]
+    except KeyError:
+        result = {packet_id(packet_class, context): packet_class
+                  for packet_class in get_packets(context)}
+        _packet_id_maps[key] = result
+        return result
+
+
+# Maps (packet class, protocol version) to the result of 'packet_id'.
+_packet_ids = {}
+
+# Maps ('get_packets' function, protocol version) to a packet ID map.
+_packet_id_maps = {}
@@ -0,0 +1,160 @@
+"""Decompression and decoding of heavy packets by a pool of workers, while
+   packets are still reacted to in the order in which they were received.
+"""
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .packets import PacketView
+from .packets.clientbound.play import (
+    MapPacket, NBTQueryPacket, ChunkDataPacket)
+from .types import VarInt
+
+
+class DecodePipeline(object):
+    """Used by a 'Connection' whose 'decode_pipeline' attribute is set to an
+    instance of this class, to decode packets of the classes in
+    'heavy_packets' using 'executor' (a 'concurrent.futures.Executor',
+    by default a thread pool), while other packets are decoded as usual by
+    the networking thread.
+
+    The networking thread reads ahead, submitting heavy packets to the pool,
+    while the packets which have been decoded are passed, in the order in
+    which they were received, to the connection's reactor and listeners. No
+    frames are read beyond a packet whose 'packet_name' is in
+    'barrier_packet_names' until it has been reacted to, as such packets may
+    change how subsequent frames are decoded.
+
+    If a process pool is used, packets are decoded by a copy of the
+    connection's 'PacketCompressor', whose statistics are then not updated.
+    """
+    default_heavy_packets = MapPacket, NBTQueryPacket, ChunkDataPacket
+
+    barrier_packet_names = frozenset((
+        'set compression', 'login success', 'encryption request',
+        'disconnect', 'join game', 'respawn'))
+
+    def __init__(self, connection, executor=None, heavy_packets=None,
+                 max_pending=256):
+        """
+        :param connection: the 'Connection' using this pipeline.
+        :param executor: the pool used to decode heavy packets, by default
+                         a new 'ThreadPoolExecutor'.
+        :param heavy_packets: the packet classes to be decoded by the pool,
+                              by default 'default_heavy_packets'.
+        :param max_pending: the maximum number of packets read ahead of the
+                            packet next to be reacted to.
+        """
+        if executor is None:
+            executor = ThreadPoolExecutor(thread_name_prefix='Packet Decoder')
+        if heavy_packets is None:
+            heavy_packets = self.default_heavy_packets
+        self.connection = connection
+        self.executor = executor
+        self.heavy_packets = frozenset(heavy_packets)
+        self.max_pending = max_pending
+        self._entries = deque()
+        self._barrier = False
+
+    def reset(self):
+        """Discards all packets read ahead, e.g. when reconnecting."""
+        for entry in self._entries:
+            if isinstance(entry, Future):
+                entry.cancel()
+        self._entries.clear()
+        self._barrier = False
+
+    def accepts_frames(self):
+        """Returns False if no further frames are to be read until a packet
+           already read has been reacted to, because a barrier packet has been
+           read or 'max_pending' packets are pending. The networking thread
+           then need not wait for the socket to become readable, as it is
+           woken when a decoded packet becomes ready.
+        """
+        return not self._barrier and len(self._entries) < self.max_pending
+
+    def read_packet(self, read_frame):
+        """Returns the next packet to be reacted to, or None if it is not yet
+           available. 'read_frame' is called to obtain each further frame, and
+           must return None if none is available without blocking.
+        """
+        entries = self._entries
+        while True:
+            if entries and (not isinstance(entries[0], Future)
+                            or entries[0].done()):
+                packet = entries.popleft()
+                if isinstance(packet, Future):
+                    packet = packet.result()
+                    packet.context = self.connection.context
+                elif not entries:
+                    self._barrier = False
+                return packet
+            if not self.accepts_frames():
+                return None
+            frame = read_frame()
+            if frame is None:
+                return None
+            self._submit(frame)
+
+    def _submit(self, frame):
+        connection = self.connection
+        reactor = connection.reactor
+        packet_class = self._heavy_packet_class(frame)
+        if packet_class is None:
+            packet = reactor.decode_packet(frame)
+            self._entries.append(packet)
+            if packet.packet_name in self.barrier_packet_names:
+                self._barrier = True
+        else:
+            compressor = connection.compressor \
+                if connection.options.compression_enabled else None
+            future = self.executor.submit(
+                decode_frame, packet_class, connection.context, compressor,
+                frame)
+            future.add_done_callback(self._wake)
+            self._entries.append(future)
+
+    def _heavy_packet_class(self, frame):
+        # Returns the class of the packet in the given frame if it is to be
+        # decoded by the pool, or else None. For a compressed frame, only as
+        # much is decompressed as is needed to read the packet ID.
+        connection = self.connection
+        data = PacketView(frame)
+        if connection.options.compression_enabled and VarInt.read(data):
+            data = PacketView(zlib.decompressobj().decompress(
+                data.remaining(), VarInt.max_bytes))
+        try:
+            packet_id = VarInt.read(data)
+        except EOFError:
+            return None
+
+        reactor = connection.reactor
+        packet_class = reactor.clientbound_packets.get(packet_id)
+        if packet_class not in self.heavy_packets or \
+           reactor.leaves_undecoded(packet_class):
+            return None
+        return packet_class
+
+    def _wake(self, _future):
+        # Causes the networking thread to call 'read_packet' again.
+        wakeup = self.connection._wakeup
+        if wakeup is not None:
+            wakeup.signal()
+
+
+def decode_frame(packet_class, context, compressor, frame):
+    """Decodes a frame known to contain a packet of the given class, using
+       'compressor' to decompress it if compression is enabled, or else None.
+    """
+    packet_data = PacketView(frame)
+    if compressor is not None:
+        decompressed_size = VarInt.read(packet_data)
+        if decompressed_size > 0:
+            packet_data = PacketView(compressor.decompress(
+                packet_data.remaining(), decompressed_size))
+    VarInt.read(packet_data)
+
+    packet = packet_class()
+    packet.context = context
+    packet.read(packet_data)
+    return packet
@@ -0,0 +1,431 @@
+"""Performing the network I/O of many instances of 'Connection' from a single
+   thread, using one 'selectors' event loop, rather than one 'NetworkingThread'
+   for each connection.
+"""
+import selectors
+import sys
+import threading
+import timeit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .connection import _WakeupChannel
+from .types.utility import MutableRecord
+from ..exceptions import InvalidState
+
+
+class SwarmStats(MutableRecord):
+    """Counters describing the network activity of a connection driven by a
+       'SwarmManager', accumulated over all of its connections to a server.
+    """
+    __slots__ = ('connects', 'rounds', 'packets_read', 'packets_written',
+                 'bytes_read', 'busy_time')
+
+    def __init__(self, **kwds):
+        self.connects = self.rounds = 0
+        self.packets_read = self.packets_written = self.bytes_read = 0
+        self.busy_time = 0.0
+        super(SwarmStats, self).__init__(**kwds)
+
+
+class SwarmManager(object):
+    """Performs the network I/O of any number of 'Connection' instances in
+    a single thread, by means of one 'selectors' event loop.
+
+    Each connection added to the manager keeps its own reactor, packet
+    listeners, outgoing packet queue and exception handlers, and is used
+    exactly as it would be otherwise, except that (1) its packet listeners
+    and exception handlers are called from the manager's thread, so must not
+    block; and (2) the manager must be running, via 'start' or 'run', for any
+    network I/O to take place.
+
+    Connections with pending work are serviced in round-robin order: in each
+    iteration of the loop, each such connection writes at most 'max_write'
+    queued packets, and writes and reads at most 'max_packets' packets in
+    total, after which it waits for the next iteration, behind any other
+    connections which are ready. A connection whose socket does not accept
+    all of the data written to it is not written to again until the socket
+    becomes writable, so that it does not hold up the other connections.
+
+    When idle, the loop waits for no more than 'timeout' seconds before
+    checking again for connections to start, stop or write to, in case a
+    wakeup is missed.
+
+    When 'Connection.connect' is called from the manager's thread, e.g. to
+    reconnect after a status query, the server's address is resolved and
+    the socket connected by 'connect_executor' (a 'concurrent.futures.
+    Executor', by default a small thread pool), as these may block.
+    """
+    def __init__(self, max_packets=50, max_write=300, timeout=0.05,
+                 connect_executor=None):
+        self.max_packets = max_packets
+        self.max_write = max_write
+        self.timeout = timeout
+        self.connect_executor = connect_executor
+
+        # Maps each connection added to this manager to its 'SwarmStats'.
+        self.stats = {}
+
+        # The thread running the event loop, by way of 'start' or 'run'.
+        self.thread = None
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = _WakeupChannel()
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._stop = False
+
+        # Each connection's active 'SwarmMember', keyed by connection.
+        self._members = {}
+
+        # Members which have been started but not yet activated by the loop,
+        # and active members which have been interrupted.
+        self._starting = deque()
+        self._stopping = deque()
+
+        # Connections being connected by 'connect_executor', each mapped to
+        # the 'Future' of the call to 'connect'.
+        self._connecting = {}
+
+        # Connections which have signalled that they have queued packets.
+        self._signalled = deque()
+
+        # Members to be serviced in the next iteration regardless of events,
+        # as they have work left over from the previous iteration.
+        self._backlog = deque()
+
+    @property
+    def connections(self):
+        """A list of the connections added to this manager."""
+        return list(self.stats)
+
+    def add(self, connection):
+        """Arranges for the network I/O of 'connection', which must not have
+           an active networking thread, to be performed by this manager from
+           its next call to 'connect' or 'status' onwards.
+
+           :return: the given connection.
+        """
+        with connection._write_lock:
+            if connection.networking_thread is not None or \
+               connection.new_networking_thread is not None:
+                raise InvalidState('The connection is already active.')
+            connection.swarm = self
+            connection._wakeup = _SwarmWakeup(self, connection)
+            self.stats.setdefault(connection, SwarmStats())
+        return connection
+
+    def remove(self, connection):
+        """Reverses the effect of 'add' for 'connection', which must not have
+           an active networking thread, so that it uses a 'NetworkingThread'
+           when it next connects.
+        """
+        with connection._write_lock:
+            if connection.networking_thread is not None or \
+               connection.new_networking_thread is not None:
+                raise InvalidState('The connection is still active.')
+            connection.swarm = None
+            connection._wakeup = None
+            del self.stats[connection]
+
+    def start(self):
+        """Runs the event loop in a new daemon thread."""
+        if self.thread is not None and self.thread.is_alive():
+            raise InvalidState('The swarm manager is already running.')
+        self._stop = False
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name='Swarm Manager Thread')
+        self.thread.start()
+
+    def stop(self):
+        """Causes the event loop to return after its current iteration. This
+           does not disconnect any connections, which are not serviced again
+           until the loop is resumed.
+        """
+        self._stop = True
+        self._wakeup.signal()
+
+    def run(self):
+        """Runs the event loop in the current thread, until 'stop' is called.
+        """
+        self._stop = False
+        self.thread = threading.current_thread()
+        while not self._stop:
+            self._run_once()
+
+    def _new_member(self, connection, previous=None):
+        # Called by 'Connection._new_networking_thread'.
+        return SwarmMember(self, connection, previous=previous)
+
+    def _connect_later(self, connection):
+        # Called by 'Connection.connect' from the manager's thread.
+        if self.connect_executor is None:
+            self.connect_executor = ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix='Swarm Connector')
+        future = self.connect_executor.submit(connection.connect)
+        self._connecting[connection] = future
+        future.add_done_callback(lambda _future: self._wakeup.signal())
+
+    def _finish_connecting(self):
+        # Handles any exception raised by the connections made on behalf of
+        # '_connect_later', as it would have been handled had 'connect' been
+        # called from the manager's thread.
+        for connection, future in list(self._connecting.items()):
+            if not future.done():
+                continue
+            del self._connecting[connection]
+            exc = future.exception()
+            if exc is None:
+                continue
+            exc_info = type(exc), exc, exc.__traceback__
+            member = connection.networking_thread
+            if isinstance(member, SwarmMember) and member.is_alive():
+                self._fail(member, exc, exc_info)
+                continue
+            try:
+                connection._handle_exception(exc, exc_info)
+            except Exception:
+                sys.excepthook(*sys.exc_info())
+
+    def _run_once(self):
+        self._finish_connecting()
+        self._finish_stopping()
+        self._activate_starting()
+
+        # Wait for events, unless some connections have work left over.
+        timeout = 0 if self._backlog else self.timeout
+        events = self._selector.select(timeout)
+
+        # The members to be serviced in this iteration, in order, each mapped
+        # to whether it may write packets and whether its socket is readable.
+        ready = {}
+        while self._backlog:
+            ready[self._backlog.popleft()] = [True, False]
+        for key, mask in events:
+            if key.data is None:
+                # The wakeup channel must be cleared before the signalled
+                # connections are examined, so that no signal is lost.
+                self._wakeup.clear()
+                continue
+            flags = ready.setdefault(key.data, [False, False])
+            if mask & selectors.EVENT_WRITE:
+                flags[0] = True
+            if mask & selectors.EVENT_READ:
+                flags[1] = True
+        # The signalled connections are examined even if the wakeup channel
+        # was not readable, so that they are written to after the timeout
+        # even if their wakeup was missed.
+        while self._signalled:
+            connection = self._signalled.popleft()
+            connection._wakeup.clear()
+            member = self._members.get(connection)
+            if member is not None:
+                ready.setdefault(member, [False, False])[0] = True
+
+        for member, (can_write, can_fill) in ready.items():
+            if not member.interrupt:
+                self._service(member, can_write, can_fill)
+
+    def _service(self, member, can_write, can_fill):
+        connection, stats = member.connection, member.stats
+        start_time = timeit.default_timer()
+        try:
+            if can_fill:
+                stats.bytes_read += member.file_object.fill()
+            if can_write:
+                # Queued packets are written only once the data left unsent
+                # by earlier writes has been accepted by the socket.
+                with connection._write_lock:
+                    can_write = connection._flush(block=False)
+            num_written, num_read, more_to_read = \
+                connection._exchange_packets(
+                    member, can_write, True, member.read_packet,
+                    max_write=self.max_write, max_total=self.max_packets)
+        except Exception as e:
+            self._fail(member, e, sys.exc_info())
+        else:
+            stats.packets_written += num_written
+            stats.packets_read += num_read
+            if not member.interrupt:
+                # Wait for the socket to become writable while data remains
+                # unsent, rather than blocking the other connections; and do
+                # not wait for it to become readable while a 'DecodePipeline'
+                # accepts no further frames, as it wakes the loop itself.
+                unsent = bool(connection._unsent)
+                pipeline = connection.decode_pipeline
+                events = selectors.EVENT_WRITE if unsent else 0
+                if pipeline is None or pipeline.accepts_frames():
+                    events |= selectors.EVENT_READ
+                self._set_events(member, events)
+                if more_to_read or connection._outgoing_packet_queue \
+                        and not unsent:
+                    self._backlog.append(member)
+        stats.rounds += 1
+        stats.busy_time += timeit.default_timer() - start_time
+
+    def _set_events(self, member, events):
+        # A file descriptor cannot be registered for no events, so it is
+        # unregistered instead.
+        if events == member.events:
+            return
+        if not events:
+            self._selector.unregister(member.fd)
+        elif not member.events:
+            self._selector.register(member.fd, events, member)
+        else:
+            self._selector.modify(member.fd, events, member)
+        member.events = events
+
+    def _activate_starting(self):
+        for _ in range(len(self._starting)):
+            member = self._starting.popleft()
+            previous = member.previous_thread
+            if previous is not None and previous.is_alive():
+                # As with 'NetworkingThread', wait for the previous member to
+                # finish, which happens once it is interrupted.
+                self._starting.append(member)
+                continue
+
+            connection = member.connection
+            with connection._write_lock:
+                if previous is not None:
+                    connection.networking_thread = member
+                    connection.new_networking_thread = None
+            member.active = True
+            member.stats.connects += 1
+            if member.interrupt:
+                self._finish(member)
+                continue
+
+            member.fd = member.file_object.fileno()
+            stale_key = self._selector.get_map().get(member.fd)
+            if stale_key is not None:
+                # The socket of a member which has not yet been finished was
+                # closed, and its file descriptor reused.
+                self._finish(stale_key.data)
+            self._selector.register(member.fd, selectors.EVENT_READ, member)
+            member.events = selectors.EVENT_READ
+            self._members[connection] = member
+            self._backlog.append(member)
+
+    def _finish_stopping(self):
+        for _ in range(len(self._stopping)):
+            member = self._stopping.popleft()
+            if not member.active or not member.is_alive():
+                continue
+            if member.connection in self._connecting:
+                # The connection is being made again, as by a reactor of this
+                # member, so this member is finished only once it has been,
+                # and the exit handler is not called in between.
+                self._stopping.append(member)
+                continue
+            self._finish(member)
+
+    def _finish(self, member, exited=True):
+        # Terminates an active member, as if its networking thread had exited.
+        # The connection's exit handler is called if 'exited' is True, i.e. if
+        # the member did not terminate due to an exception.
+        connection = member.connection
+        if member.fd is not None:
+            key = self._selector.get_map().get(member.fd)
+            if key is not None and key.data is member:
+                self._selector.unregister(member.fd)
+        if self._members.get(connection) is member:
+            del self._members[connection]
+        try:
+            if exited:
+                try:
+                    connection._handle_exit()
+                except Exception as e:
+                    self._fail(member, e, sys.exc_info())
+        finally:
+            with connection._write_lock:
+                if connection.networking_thread is member:
+                    connection.networking_thread = None
+            member._finished.set()
+
+    def _fail(self, member, exc, exc_info):
+        # Handles an exception raised while servicing a member, as it would
+        # be handled in a 'NetworkingThread', except that an exception which
+        # is not caught is printed rather than terminating the thread.
+        member._interrupt = True
+        try:
+            member.connection._handle_exception(exc, exc_info)
+        except Exception:
+            sys.excepthook(*sys.exc_info())
+        if member.is_alive():
+            self._finish(member, exited=False)
+
+
+class SwarmMember(object):
+    """Stands in for the 'NetworkingThread' of a connection driven by
+       a 'SwarmManager', with the same 'interrupt' attribute and 'start',
+       'is_alive' and 'join' methods, for the duration of one connection to
+       a server.
+    """
+    def __init__(self, manager, connection, previous=None):
+        self.manager = manager
+        self.connection = connection
+        self.previous_thread = previous
+        self.file_object = connection.file_object
+        self.stats = manager.stats[connection]
+        self.fd = None
+        # The events for which 'fd' is registered with the manager's selector.
+        self.events = None
+        self.active = False
+        self._interrupt = False
+        self._started = False
+        self._finished = threading.Event()
+
+    @property
+    def interrupt(self):
+        return self._interrupt
+
+    @interrupt.setter
+    def interrupt(self, value):
+        if value and not self._interrupt:
+            self._interrupt = True
+            self.manager._stopping.append(self)
+            self.manager._wakeup.signal()
+        else:
+            self._interrupt = value
+
+    def start(self):
+        self._started = True
+        self.manager._starting.append(self)
+        self.manager._wakeup.signal()
+
+    def is_alive(self):
+        return self._started and not self._finished.is_set()
+
+    def join(self, timeout=None):
+        self._finished.wait(timeout)
+
+    def read_packet(self):
+        # Returns the next packet whose data has already been received, or
+        # None; the socket itself is read from by 'SwarmManager._service'.
+        pipeline = self.connection.decode_pipeline
+        if pipeline is not None:
+            return pipeline.read_packet(self.file_object.next_frame)
+        frame = self.file_object.next_frame()
+        if frame is None:
+            return None
+        return self.connection.reactor.decode_packet(frame)
+
+
+class _SwarmWakeup(object):
+    # Stands in for the '_WakeupChannel' of a connection added to a
+    # 'SwarmManager', recording which connection has queued packets before
+    # waking the manager's event loop.
+    def __init__(self, manager, connection):
+        self.manager = manager
+        self.connection = connection
+        self._signalled = False
+
+    def signal(self):
+        if not self._signalled:
+            self._signalled = True
+            self.manager._signalled.append(self.connection)
+            self.manager._wakeup.signal()
+
+    def clear(self):
+        self._signalled = False
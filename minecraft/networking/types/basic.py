@@ -23,6 +23,12 @@ class Type(object):
     # pylint: disable=no-self-argument
     __slots__ = ()
 
+    # The 'struct' format character (without byte order) of a type whose
+    # network representation is exactly that of the format in big-endian
+    # order, or None. Compiled packet codecs use this to read and write runs
+    # of such fields at once; it is only honoured in the class defining it.
+    struct_format = None
+
     @class_and_instancemethod
     def read_with_context(cls_or_self, file_object, _context):
         return cls_or_self.read(file_object)
@@ -51,6 +57,8 @@ class Type(object):
 
 
 class Boolean(Type):
+    struct_format = '?'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('?', file_object.read(1))[0]
@@ -61,6 +69,8 @@ class Boolean(Type):
 
 
 class UnsignedByte(Type):
+    struct_format = 'B'
+
     @staticmethod
     def read(file_object):
         data = file_object.read(1)
@@ -75,6 +85,8 @@ class UnsignedByte(Type):
 
 
 class Byte(Type):
+    struct_format = 'b'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>b', file_object.read(1))[0]
@@ -85,6 +97,8 @@ class Byte(Type):
 
 
 class Short(Type):
+    struct_format = 'h'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>h', file_object.read(2))[0]
@@ -95,6 +109,8 @@ class Short(Type):
 
 
 class UnsignedShort(Type):
+    struct_format = 'H'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>H', file_object.read(2))[0]
@@ -105,6 +121,8 @@ class UnsignedShort(Type):
 
 
 class Integer(Type):
+    struct_format = 'i'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>i', file_object.read(4))[0]
@@ -169,15 +187,19 @@ class VarInt(Type):
         return number
 
     @staticmethod
-    def send(value, socket):
-        out = bytes()
+    def encode(value):
+        out = bytearray()
         while True:
             byte = value & 0x7F
             value >>= 7
-            out += struct.pack("B", byte | (0x80 if value > 0 else 0))
+            out.append(byte | (0x80 if value > 0 else 0))
             if value == 0:
                 break
-        socket.send(out)
+        return bytes(out)
+
+    @classmethod
+    def send(cls, value, socket):
+        socket.send(cls.encode(value))
 
     @staticmethod
     def size(value):
@@ -209,6 +231,8 @@ VARINT_SIZE_TABLE = {
 
 
 class Long(Type):
+    struct_format = 'q'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>q', file_object.read(8))[0]
@@ -219,6 +243,8 @@ class Long(Type):
 
 
 class UnsignedLong(Type):
+    struct_format = 'Q'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>Q', file_object.read(8))[0]
@@ -229,6 +255,8 @@ class UnsignedLong(Type):
 
 
 class Float(Type):
+    struct_format = 'f'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>f', file_object.read(4))[0]
@@ -239,6 +267,8 @@ class Float(Type):
 
 
 class Double(Type):
+    struct_format = 'd'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>d', file_object.read(8))[0]
@@ -9,7 +9,7 @@ def calculate_distance(start: list[3], end: list[3]):
     return ans, [float(end[i]) - start[i] for i in range(3)]
 
 
-def player_move(connection: Connection, destination: list[3], rotation: list[2]):
+def player_move(connection: Connection, destination: list[3], rotation: list[2], force=True):
     pos_packet = PositionAndLookPacket()
     pos_packet.x = float(destination[0])
     pos_packet.feet_y = float(destination[1])
@@ -17,4 +17,4 @@ def player_move(connection: Connection, destination: list[3], rotation: list[2])
     pos_packet.yaw = rotation[0]
     pos_packet.pitch = rotation[1]
     pos_packet.on_ground = True
-    connection.write_packet(pos_packet, force=True)
+    connection.write_packet(pos_packet, force=force)
@@ -1,20 +1,33 @@
+import sys
+from collections import Counter
+
 from nbt import nbt
 
+from .cache import SchematicCache
+from .litematic import LitematicIndex
+from .palette import Palette, internState
+
 
 class Block:
     """
     储存方块 id 及状态。
     """
-    def __init__(self, blockTag):
+    def __init__(self, blockTag, state: tuple = None):
         self.tag = blockTag
+        # 驻留的(方块id, 属性)元组（见palette.internState），只从NBT解析一次
+        self.state = _tagState(blockTag) if state is None else state
 
     def getName(self):
-        """获取方块 id """
+        """获取方块 id ，为调色板中该项的TAG_String"""
         return self.tag[0]
 
-    def getState(self):
-        """获取方块状态"""
-        pass
+    def getNameValue(self) -> str:
+        """获取方块 id 的字符串，即getName().value，但不访问NBT"""
+        return self.state[0]
+
+    def getState(self) -> dict:
+        """获取方块状态（属性名 -> 属性值）"""
+        return dict(self.state[1])
 
 
 class Schematic:
@@ -22,21 +35,56 @@ class Schematic:
     储存原理图信息，提供通过坐标获取方块的方法。
     """
 
-    def __init__(self, schematic_path: str):
-        self.schematic = nbt.NBTFile(schematic_path)
-        size = self.schematic[3][0][4]
-        self.sizeX = size[0].value
-        self.sizeY = size[1].value
-        self.sizeZ = size[2].value
+    def __init__(self, schematic_path: str, cache: SchematicCache = None):
+        """
+        :param schematic_path: .litematic文件的路径。
+        :param cache: 保存解码结果的SchematicCache，缓存中有该文件时不再解析NBT。
+        """
+        self.path = schematic_path
+        self._schematic = None
+
+        cached = None
+        if cache is not None:
+            key = cache.key(schematic_path)
+            cached = cache.load(key)
+
+        if cached is None:
+            # 只索引各区域，方块在第一次访问区域的blocks时才解码，有缓存时直接解码到缓存的条目中
+            self.index = LitematicIndex(schematic_path)
+            self.regions = self.index.regions
+            if cache is not None:
+                self.index.blocksDirectory = cache.create(key, self.regions)
+        else:
+            self.index = None
+            self.regions = cached
+
+        region = self.regions[0]
+        self.sizeX, self.sizeY, self.sizeZ = (abs(c) for c in region.size)
         self.totalVolume = self.sizeX * self.sizeY * self.sizeZ
         self.sizeLayer = self.sizeX * self.sizeZ
+        self.blockState = [_paletteTag(name, properties) for name, properties in region.palette]
+        self.entryLength = max(2, (len(self.blockState) - 1).bit_length())
+        # 预先解析的调色板，及其中每一项对应的Block，所有同种方块共用
+        self.palette = Palette(region.palette)
+        self.paletteBlocks = [Block(tag, state) for tag, state in zip(self.blockState, self.palette)]
+
+        self.position = [0, 0, 0]
 
-        self.blockState = self.schematic[3][0][3]
+    @property
+    def schematic(self):
+        """原理图的NBT，在第一次访问时才解析"""
+        if self._schematic is None:
+            self._schematic = nbt.NBTFile(self.path)
+        return self._schematic
 
-        self.bitArray = self.schematic[3][0][0].value
-        self.entryLength = len(bin(len(self.blockState))) - 2
+    @property
+    def blocks(self):
+        """第一个区域中每个方块在调色板中的下标，在第一次访问时解码"""
+        return self.regions[0].blocks
 
-        self.position = [0, 0, 0]
+    @property
+    def bitArray(self):
+        return self.schematic[3][0][0].value
 
     def _getIndex(self, x: int, y: int, z: int) -> int:
         return (y * self.sizeLayer) + z * self.sizeX + x
@@ -48,25 +96,95 @@ class Schematic:
         return (y * self.sizeLayer) + z * self.sizeX + x
 
     def _getAt(self, index: int) -> int:
-        i1 = (index * self.entryLength) // 64
-        i2 = (index * self.entryLength) % 64
-        bitArray = bin(self.bitArray[i1])[2:]
-        # 前缀补0判断
-        if len(bitArray) % self.entryLength:
-            bitArray = bitArray.rjust(len(bitArray) + (self.entryLength - len(bitArray) % self.entryLength), '0')
-        return int(bitArray[i2:i2 + self.entryLength], 2)
+        return self.blocks[index]
 
     def _getBlock(self, index: int):
         return self.blockState[index]
 
     def getBlock(self, x: int, y: int, z: int) -> Block:
         """以相对坐标（原理图原点）获取方块状态"""
-        return Block(self._getBlock(self._getAt(self._getIndex(x, y, z))))
+        return self.paletteBlocks[self._getAt(self._getIndex(x, y, z))]
 
     def getBlockAbsolutely(self, x: int, y: int, z: int) -> Block:
         """以绝对坐标（地图原点）获取方块状态"""
-        return Block(self._getBlock(self._getAt(self._getIndexByAbsolutePosition(x, y, z))))
+        return self.paletteBlocks[self._getAt(self._getIndexByAbsolutePosition(x, y, z))]
+
+    def getRegion(self, box=None):
+        """
+        以相对坐标获取长方体box = (x0, y0, z0, x1, y1, z1)（x0 <= x < x1，y、z同理，默认为整个原理图）内
+        每个方块在调色板中的下标，为类型为'H'的array，按y、z、x的顺序排列
+        """
+        return self.regions[0].getBox(*self._getBox(box))
+
+    def iterLayers(self, box=None):
+        """逐层生成(y, 该层在box内的方块在调色板中的下标)，后者按z、x的顺序排列，每次只解码一层"""
+        x0, y0, z0, x1, y1, z1 = self._getBox(box)
+        region = self.regions[0]
+        for y in range(max(y0, 0), min(y1, self.sizeY)):
+            yield y, region.getBox(x0, y, z0, x1, y + 1, z1)
+
+    def iterBlocks(self, box=None):
+        """逐层生成box内每个方块的(x, y, z, Block)，坐标为相对坐标"""
+        x0, _, z0, x1, _, z1 = self._getBox(box)
+        xs = range(max(x0, 0), min(x1, self.sizeX))
+        zs = range(max(z0, 0), min(z1, self.sizeZ))
+        blocks = self.paletteBlocks
+        for y, layer in self.iterLayers(box):
+            layer = iter(layer)
+            for z in zs:
+                for x, index in zip(xs, layer):
+                    yield x, y, z, blocks[index]
+
+    def countByType(self, box=None) -> Counter:
+        """统计box内每种方块（按方块id，不区分状态）的数量"""
+        counts = [0] * len(self.blockState)
+        for _, layer in self.iterLayers(box):
+            for index, count in enumerate(_countIndices(layer, len(counts))):
+                counts[index] += count
+        result = Counter()
+        for (name, _), count in zip(self.palette, counts):
+            if count:
+                result[name] += count
+        return result
+
+    def globalStateIds(self, protocol: int):
+        """
+        返回调色板中每一项在协议版本protocol中的全局状态ID（未知的为-1），
+        需先用palette.registerBlockRegistry注册该协议版本的方块注册表
+        """
+        return self.palette.globalIds(protocol)
+
+    def _getBox(self, box):
+        return (0, 0, 0, self.sizeX, self.sizeY, self.sizeZ) if box is None else tuple(box)
 
     def setSchematicPosition(self, x: int, y: int, z: int) -> None:
         """设置原理图原点"""
         self.position = [x, y, z]
+
+
+def _tagState(tag) -> tuple:
+    # 由调色板中的一项得到驻留的方块状态
+    properties = tag['Properties'] if 'Properties' in tag else {}
+    return internState(tag['Name'].value, [(key, value.value) for key, value in properties.items()])
+
+
+def _paletteTag(name: str, properties: dict):
+    # 由(方块id, 属性dict)构造调色板中的一项
+    tag = nbt.TAG_Compound()
+    tag.tags.append(nbt.TAG_String(name='Name', value=name))
+    if properties:
+        propertiesTag = nbt.TAG_Compound(name='Properties')
+        for key, value in properties.items():
+            propertiesTag.tags.append(nbt.TAG_String(name=key, value=value))
+        tag.tags.append(propertiesTag)
+    return tag
+
+
+def _countIndices(indices, paletteSize: int) -> list:
+    # 统计类型为'H'的array中每个调色板下标出现的次数
+    if paletteSize <= 256:
+        # 所有下标只有低字节非0，对低字节逐一计数
+        low = indices.tobytes()[0::2] if sys.byteorder == 'little' else indices.tobytes()[1::2]
+        return [low.count(index) for index in range(paletteSize)]
+    counter = Counter(indices)
+    return [counter[index] for index in range(paletteSize)]
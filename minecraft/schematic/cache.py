@@ -0,0 +1,127 @@
+"""
+原理图缓存：将解码后的原理图以紧凑的二进制形式保存在磁盘上，以文件内容的哈希为键，
+再次打开同一原理图时直接内存映射其中的数组，而不必重新解析NBT。
+
+各区域的数组在第一次访问区域时由LitematicIndex直接解码到条目中，
+所以打开原理图时不必解码整个原理图。
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+
+from .litematic import Region
+
+# 缓存格式改变时增加，旧格式的条目被忽略
+FORMAT_VERSION = 1
+
+
+class CachedRegion(Region):
+    """
+    缓存中的一个区域，blocks为映射自缓存文件的、类型为'H'的memoryview。
+    """
+
+
+class SchematicCache:
+    """
+    保存在directory下的原理图缓存，每个条目为一个以内容哈希命名的子目录，
+    包含描述各区域的meta.json和各区域的方块数组文件。
+    条目的总大小超过max_size字节时，删除最久未使用的条目。
+    """
+
+    def __init__(self, directory, max_size=1 << 30):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(path):
+        """
+        返回path处文件内容的哈希。
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load(self, key):
+        """
+        返回key对应的CachedRegion列表，没有该条目（或条目无效、尚未包含所有区域）时返回None。
+        """
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as file:
+                meta = json.load(file)
+            if meta.get('version') != FORMAT_VERSION or meta.get('byteorder') != sys.byteorder:
+                return None
+            regions = [CachedRegion(region['name'], region['position'], region['size'],
+                                    [(name, properties) for name, properties in region['palette']],
+                                    _map(os.path.join(entry, '%d.blocks' % i)))
+                       for i, region in enumerate(meta['regions'])]
+            # 记录使用时间，用于淘汰
+            os.utime(entry)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return regions
+
+    def create(self, key, regions):
+        """
+        为Region的列表regions创建key对应的条目（已有时保留），按需淘汰旧条目，返回条目的目录。
+        条目中只保存描述各区域的meta.json，各区域的数组文件由LitematicIndex在解码区域时写入该目录
+        （见其blocksDirectory参数）。
+        """
+        entry = os.path.join(self.directory, key)
+        meta = {'version': FORMAT_VERSION, 'byteorder': sys.byteorder, 'regions': [
+            {'name': region.name, 'position': list(region.position), 'size': list(region.size),
+             'palette': [[name, properties] for name, properties in region.palette]}
+            for region in regions]}
+        # 先写入临时目录再重命名，使其他进程不会看到写了一半的条目
+        temporary = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            with open(os.path.join(temporary, 'meta.json'), 'w', encoding='utf-8') as file:
+                json.dump(meta, file)
+            os.replace(temporary, entry)
+        except OSError:
+            # 例如已经（由其他进程）创建了该条目
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.evict(keep=entry)
+        return entry
+
+    def evict(self, keep=None):
+        """
+        删除最久未使用的条目（目录为keep的条目除外），直至总大小不超过max_size。
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def _map(path):
+    # 以只读方式内存映射path处的数组文件，返回类型为'H'的memoryview
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b'').cast('H')
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)).cast('H')
@@ -0,0 +1,318 @@
+"""
+按需加载的litematic：只索引文件中的所有区域，查询时才解码某个区域或其中一个长方体的方块。
+
+文件解压后内存映射，BlockStates数组不会被解析为Python对象；
+解码后的整个区域也保存在内存映射的文件中，所以数亿方块的原理图也不会占满内存。
+"""
+import gzip
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import weakref
+from array import array
+
+# 整个区域分批解码时，每批的方块数（的大约值）
+_BATCH_ENTRIES = 1 << 20
+
+
+class Region:
+    """
+    原理图中的一个区域：名称、位置、大小（分量可以为负，表示区域从位置向负方向延伸）、
+    调色板（(方块id, 属性dict)的列表），以及每个方块在调色板中的下标blocks（支持下标访问和切片）。
+
+    方块的下标为(y * sizeZ + z) * sizeX + x，其中x, y, z为相对于区域最小角的坐标。
+    """
+
+    def __init__(self, name, position, size, palette, blocks=None):
+        self.name = name
+        self.position = list(position)
+        self.size = list(size)
+        self.palette = palette
+        self.sizeX, self.sizeY, self.sizeZ = (abs(c) for c in size)
+        self.totalVolume = self.sizeX * self.sizeY * self.sizeZ
+        # 区域最小角的坐标（相对于原理图原点）
+        self.minCorner = [p + s + 1 if s < 0 else p for p, s in zip(position, size)]
+        self._blocks = blocks
+
+    @property
+    def blocks(self):
+        return self._blocks
+
+    def getAt(self, x: int, y: int, z: int) -> int:
+        """
+        返回相对于区域最小角的(x, y, z)处方块在调色板中的下标。
+        """
+        return self.blocks[(y * self.sizeZ + z) * self.sizeX + x]
+
+    def getBox(self, x0: int, y0: int, z0: int, x1: int, y1: int, z1: int) -> array:
+        """
+        返回相对于区域最小角的x0 <= x < x1、y0 <= y < y1、z0 <= z < z1内（超出区域的部分被忽略）
+        的方块在调色板中的下标，为类型为'H'的array，
+        下标为((y - y0) * (z1 - z0) + (z - z0)) * (x1 - x0) + (x - x0)。
+        """
+        x0, y0, z0 = max(x0, 0), max(y0, 0), max(z0, 0)
+        x1, y1, z1 = min(x1, self.sizeX), min(y1, self.sizeY), min(z1, self.sizeZ)
+        width = x1 - x0
+        result = array('H')
+        if width <= 0 or y1 <= y0 or z1 <= z0:
+            return result
+        sizeX, sizeZ = self.sizeX, self.sizeZ
+        for y in range(y0, y1):
+            start = (y * sizeZ + z0) * sizeX + x0
+            end = (y * sizeZ + z1 - 1) * sizeX + x1
+            layer, base = self._decode(start, end)
+            if width == sizeX:
+                result.frombytes(layer[start - base:end - base].tobytes())
+                continue
+            for z in range(z1 - z0):
+                rowStart = start - base + z * sizeX
+                result.frombytes(layer[rowStart:rowStart + width].tobytes())
+        return result
+
+    def _decode(self, start, end):
+        # 返回包含下标在[start, end)内的方块的序列，及其第一个元素的下标
+        return self.blocks[start:end], start
+
+
+class RegionIndex(Region):
+    """
+    LitematicIndex中的一个区域，其BlockStates尚未解码。
+
+    blocks在第一次访问时解码整个区域；在此之前，getAt只解码一个方块，
+    getBox只解码每层中包含该长方体的部分。
+    """
+
+    def __init__(self, index, name, position, size, palette, blockStates):
+        super().__init__(name, position, size, palette)
+        self._index = index
+        self.entryLength = max(2, (len(palette) - 1).bit_length())
+        # BlockStates在解压后文件中的偏移和long的个数
+        self._offset, self._longs = blockStates
+
+    @property
+    def blocks(self):
+        """
+        解码整个区域，返回每个方块在调色板中的下标，为类型为'H'的memoryview，映射自临时文件。
+        """
+        if self._blocks is None:
+            self._blocks = self._index._materialize(self)
+        return self._blocks
+
+    def getAt(self, x: int, y: int, z: int) -> int:
+        index = (y * self.sizeZ + z) * self.sizeX + x
+        if self._blocks is not None:
+            return self._blocks[index]
+        bit = index * self.entryLength
+        word, shift = divmod(bit, 64)
+        data = self._index._data
+        start = self._offset + 8 * word
+        value = int.from_bytes(data[start:start + 16 if shift + self.entryLength > 64 else start + 8], 'big')
+        if shift + self.entryLength > 64:
+            # 跨越两个long，低位在前一个long的高位
+            value = (value >> 64) >> shift | (value & 0xFFFFFFFFFFFFFFFF) << (64 - shift)
+        else:
+            value >>= shift
+        return value & ((1 << self.entryLength) - 1)
+
+    def _decode(self, start, end):
+        if self._blocks is not None:
+            return self._blocks[start:end], start
+        return self._index._decode(self, start, end)
+
+
+class LitematicIndex:
+    """
+    索引一个.litematic文件中的所有区域。
+
+    文件被解压到directory（默认为一个临时目录）中并内存映射，解码后的区域保存在blocksDirectory
+    （默认为directory）中，文件名为区域的序号加上'.blocks'；
+    blocksDirectory中已有某个区域的文件时直接映射，不再解码（例如其为SchematicCache的条目）。
+    临时目录在调用close或对象被回收时删除。
+    """
+
+    def __init__(self, path: str, directory: str = None, blocksDirectory: str = None):
+        self.path = path
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='litematic-')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._finalizer = None
+        self.directory = directory
+        self.blocksDirectory = directory if blocksDirectory is None else blocksDirectory
+
+        with open(path, 'rb') as file:
+            compressed = file.read(2) == b'\x1f\x8b'
+        if compressed:
+            nbtPath = os.path.join(directory, 'litematic.nbt')
+            with gzip.open(path, 'rb') as source, open(nbtPath, 'wb') as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+        else:
+            nbtPath = path
+        with open(nbtPath, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        root = _NBTScanner(self._data).root()
+        self.metadata = root.get('Metadata', {})
+        self.regions = []
+        for name, region in root['Regions'].items():
+            blockStates = region['BlockStates']
+            self.regions.append(RegionIndex(
+                self, name, [region['Position'][c] for c in 'xyz'], [region['Size'][c] for c in 'xyz'],
+                [(entry['Name'], entry.get('Properties', {})) for entry in region['BlockStatePalette']],
+                (blockStates.offset, blockStates.count)))
+
+    def region(self, name: str) -> RegionIndex:
+        for region in self.regions:
+            if region.name == name:
+                return region
+        raise KeyError(name)
+
+    def close(self):
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    def _words(self, region, firstWord, lastWord):
+        # region的BlockStates中下标在[firstWord, lastWord)内的long，为无符号数
+        start = region._offset + 8 * firstWord
+        end = region._offset + 8 * min(lastWord, region._longs)
+        words = array('Q', self._data[start:end])
+        if sys.byteorder == 'little':
+            words.byteswap()
+        return words
+
+    def _decode(self, region, start, end):
+        # 解码下标在[start, end)内的方块，返回(array, 其第一个元素的下标)，后者不大于start
+        bits = region.entryLength
+        periodEntries = 64 // math.gcd(bits, 64)
+        first = start - start % periodEntries
+        words = self._words(region, first * bits // 64, -(-end * bits // 64))
+        return _unpackWords(words, bits, end - first), first
+
+    def _materialize(self, region):
+        # 分批解码整个区域到一个文件中（已有该文件时不再解码），返回映射该文件的memoryview
+        path = os.path.join(self.blocksDirectory, '%d.blocks' % self.regions.index(region))
+        count = region.totalVolume
+        if not os.path.exists(path):
+            periodEntries = 64 // math.gcd(region.entryLength, 64)
+            batch = max(1, _BATCH_ENTRIES // periodEntries) * periodEntries
+            # 先写入临时文件再重命名，使其他进程不会看到写了一半的文件
+            os.makedirs(self.blocksDirectory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(prefix='.tmp-', dir=self.blocksDirectory)
+            try:
+                with open(descriptor, 'wb') as file:
+                    for start in range(0, count, batch):
+                        blocks, _ = self._decode(region, start, min(start + batch, count))
+                        file.write(blocks.tobytes())
+                os.replace(temporary, path)
+            except BaseException:
+                os.remove(temporary)
+                raise
+        with open(path, 'rb') as file:
+            if count == 0:
+                return memoryview(b'').cast('H')
+            return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)).cast('H')
+
+
+def _unpackWords(words, entryLength: int, count: int) -> array:
+    """
+    将无符号long的array解码为类型为'H'的array，包含前count个entryLength位的元素。
+
+    元素从每个long的低位开始依次紧密排列，可以跨越两个long。
+    每lcm(entryLength, 64)位中元素的排列方式相同，所以对排列中的每个位置，
+    可以用一次列表推导式解码所有周期中该位置的元素。
+    """
+    result = array('H', bytes(2 * count))
+    mask = (1 << entryLength) - 1
+    periodBits = entryLength * 64 // math.gcd(entryLength, 64)
+    periodWords, periodEntries = periodBits // 64, periodBits // entryLength
+    for slot in range(min(periodEntries, count)):
+        length = len(range(slot, count, periodEntries))
+        word, shift = divmod(slot * entryLength, 64)
+        low = words[word::periodWords][:length]
+        if shift + entryLength <= 64:
+            values = [value >> shift & mask for value in low]
+        else:
+            high = words[word + 1::periodWords][:length]
+            values = [(lo >> shift | hi << (64 - shift)) & mask for lo, hi in zip(low, high)]
+        result[slot::periodEntries] = array('H', values)
+    return result
+
+
+class _ArrayRef:
+    # NBT中一个数组的位置，数组本身不被读取
+    __slots__ = 'offset', 'count'
+
+    def __init__(self, offset, count):
+        self.offset = offset
+        self.count = count
+
+
+class _NBTScanner:
+    """
+    从内存映射的未压缩NBT中读取标签，复合标签读为dict，列表读为list，
+    字节、int和long数组只记录其位置（_ArrayRef）。
+    """
+    _SCALARS = {1: struct.Struct('>b'), 2: struct.Struct('>h'), 3: struct.Struct('>i'),
+                4: struct.Struct('>q'), 5: struct.Struct('>f'), 6: struct.Struct('>d')}
+    _ARRAY_ITEM_SIZES = {7: 1, 11: 4, 12: 8}
+    _INT = struct.Struct('>i')
+    _SHORT = struct.Struct('>H')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def root(self):
+        tagType = self.data[self.pos]
+        self.pos += 1
+        if tagType != 10:
+            raise ValueError('The root tag of the schematic is not a compound.')
+        self._string()
+        return self._payload(10)
+
+    def _string(self):
+        length, = self._SHORT.unpack_from(self.data, self.pos)
+        self.pos += 2 + length
+        return self.data[self.pos - length:self.pos].decode('utf-8', 'replace')
+
+    def _payload(self, tagType):
+        data = self.data
+        scalar = self._SCALARS.get(tagType)
+        if scalar is not None:
+            value, = scalar.unpack_from(data, self.pos)
+            self.pos += scalar.size
+            return value
+        if tagType in self._ARRAY_ITEM_SIZES:
+            count, = self._INT.unpack_from(data, self.pos)
+            self.pos += 4
+            ref = _ArrayRef(self.pos, count)
+            self.pos += count * self._ARRAY_ITEM_SIZES[tagType]
+            return ref
+        if tagType == 8:
+            return self._string()
+        if tagType == 9:
+            itemType = data[self.pos]
+            count, = self._INT.unpack_from(data, self.pos + 1)
+            self.pos += 5
+            return [self._payload(itemType) for _ in range(count)]
+        if tagType == 10:
+            compound = {}
+            while True:
+                itemType = data[self.pos]
+                self.pos += 1
+                if itemType == 0:
+                    return compound
+                name = self._string()
+                compound[name] = self._payload(itemType)
+        raise ValueError('Unknown NBT tag type: %d.' % tagType)
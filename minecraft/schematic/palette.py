@@ -0,0 +1,130 @@
+"""
+方块状态的调色板：将原理图调色板中的每一项预先解析为驻留的(方块id, 属性)元组，
+并通过服务器的方块注册表（数据生成器产生的blocks.json）映射到全局状态ID。
+"""
+import json
+import threading
+from array import array
+
+# 驻留的方块状态，相等的状态是同一个对象
+_states = {}
+_statesLock = threading.Lock()
+
+# 协议版本 -> blocks.json的路径，由registerBlockRegistry设置
+_registryPaths = {}
+# 协议版本 -> 已加载的BlockRegistry
+_registries = {}
+
+
+def internState(name: str, properties) -> tuple:
+    """
+    返回驻留的方块状态(name, ((属性名, 属性值), ...))，属性按名称排序。
+    properties为dict或(属性名, 属性值)的序列。
+    """
+    items = properties.items() if isinstance(properties, dict) else properties
+    state = (name, tuple(sorted((str(key), str(value)) for key, value in items)))
+    with _statesLock:
+        return _states.setdefault(state, state)
+
+
+class BlockRegistry:
+    """
+    一个协议版本的方块注册表，将方块状态映射到全局状态ID。
+    """
+
+    def __init__(self, blocks: dict):
+        """
+        :param blocks: blocks.json的内容，方块id -> {'states': [{'id': ..., 'properties': {...}, 'default': ...}, ...]}。
+        """
+        self._ids = {}
+        # 方块id -> 默认状态的属性dict
+        self._defaults = {}
+        # 方块id -> 其所有状态的全局状态ID
+        self._blockIds = {}
+        for name, block in blocks.items():
+            for state in block['states']:
+                properties = state.get('properties', {})
+                self._ids[internState(name, properties)] = state['id']
+                self._blockIds.setdefault(name, []).append(state['id'])
+                if state.get('default'):
+                    self._defaults[name] = properties
+
+    @classmethod
+    def load(cls, path: str) -> 'BlockRegistry':
+        with open(path, encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def stateId(self, state: tuple):
+        """
+        返回方块状态的全局状态ID，缺少的属性取默认值；未知的方块或状态返回None。
+        """
+        stateId = self._ids.get(state)
+        if stateId is None and state[0] in self._defaults:
+            properties = dict(self._defaults[state[0]])
+            properties.update(state[1])
+            stateId = self._ids.get(internState(state[0], properties))
+        return stateId
+
+    def blockStateIds(self, name: str) -> list:
+        """
+        返回方块name所有状态的全局状态ID，未知的方块返回空列表。
+        """
+        return list(self._blockIds.get(name, ()))
+
+
+def registerBlockRegistry(protocol: int, registry) -> None:
+    """
+    设置协议版本protocol所用的方块注册表：blocks.json的路径（在第一次使用时加载）或BlockRegistry。
+    """
+    if isinstance(registry, BlockRegistry):
+        _registries[protocol] = registry
+    else:
+        _registryPaths[protocol] = registry
+        _registries.pop(protocol, None)
+
+
+def getBlockRegistry(protocol: int) -> BlockRegistry:
+    """
+    返回协议版本protocol的方块注册表，没有注册时抛出KeyError。
+    """
+    registry = _registries.get(protocol)
+    if registry is None:
+        if protocol not in _registryPaths:
+            raise KeyError('No block registry is registered for protocol %d.' % protocol)
+        registry = _registries[protocol] = BlockRegistry.load(_registryPaths[protocol])
+    return registry
+
+
+class Palette:
+    """
+    预先解析的调色板，以调色板下标O(1)地取得驻留的方块状态，
+    并按协议版本缓存每一项对应的全局状态ID。
+    """
+
+    def __init__(self, entries):
+        """
+        :param entries: (方块id, 属性dict)的序列。
+        """
+        self.states = [internState(name, properties) for name, properties in entries]
+        self._globalIds = {}
+
+    def __getitem__(self, index: int) -> tuple:
+        return self.states[index]
+
+    def __len__(self):
+        return len(self.states)
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def globalIds(self, protocol: int) -> array:
+        """
+        返回类型为'i'的array，第i项为调色板第i项在协议版本protocol中的全局状态ID，未知的为-1。
+        """
+        globalIds = self._globalIds.get(protocol)
+        if globalIds is None:
+            registry = getBlockRegistry(protocol)
+            globalIds = array('i', (-1 if stateId is None else stateId
+                                    for stateId in map(registry.stateId, self.states)))
+            self._globalIds[protocol] = globalIds
+        return globalIds
@@ -0,0 +1,73 @@
+"""Writing of small .litematic files for the tests of 'minecraft.schematic'
+   and 'minecraft.backend.schematic_diff'.
+"""
+from array import array
+
+from nbt import nbt
+
+
+def pack_entries(entries, bits):
+    """Packs the given palette indices into signed longs, each entry of
+       'bits' bits following the previous one from the least significant bit,
+       spanning two longs where necessary, as Litematica does.
+    """
+    words = [0] * (-(-len(entries) * bits // 64) + 1)
+    mask = (1 << 64) - 1
+    for i, entry in enumerate(entries):
+        word, shift = divmod(i * bits, 64)
+        words[word] |= entry << shift & mask
+        if shift + bits > 64:
+            words[word + 1] |= entry >> (64 - shift)
+    return list(array('q', array('Q', words[:-1]).tobytes()))
+
+
+def write_litematic(path, regions):
+    """Writes a gzipped .litematic file to 'path' containing the given
+       regions, each a tuple (name, size, position, palette, entries), where
+       each item of 'palette' is a block name or a (name, properties) pair.
+    """
+    root = nbt.NBTFile()
+    root.name = ''
+    root.tags.append(nbt.TAG_Int(name='Version', value=5))
+    root.tags.append(nbt.TAG_Int(name='MinecraftDataVersion', value=2865))
+    root.tags.append(nbt.TAG_Compound(name='Metadata'))
+    regions_tag = nbt.TAG_Compound(name='Regions')
+    for region in regions:
+        regions_tag.tags.append(_region_tag(*region))
+    root.tags.append(regions_tag)
+    root.write_file(path)
+
+
+def _region_tag(name, size, position, palette, entries):
+    tag = nbt.TAG_Compound(name=name)
+    block_states = nbt.TAG_Long_Array(name='BlockStates')
+    block_states.value = pack_entries(
+        entries, max(2, (len(palette) - 1).bit_length()))
+    tag.tags.append(block_states)
+    tag.tags.append(_vector_tag('Position', position))
+    palette_tag = nbt.TAG_List(name='BlockStatePalette', type=nbt.TAG_Compound)
+    for entry in palette:
+        block_name, properties = entry if isinstance(entry, tuple) \
+            else (entry, {})
+        entry_tag = nbt.TAG_Compound()
+        entry_tag.tags.append(nbt.TAG_String(name='Name', value=block_name))
+        if properties:
+            properties_tag = nbt.TAG_Compound(name='Properties')
+            for key, value in properties.items():
+                properties_tag.tags.append(
+                    nbt.TAG_String(name=key, value=value))
+            entry_tag.tags.append(properties_tag)
+        palette_tag.tags.append(entry_tag)
+    tag.tags.append(palette_tag)
+    tag.tags.append(_vector_tag('Size', size))
+    for list_name in ('PendingBlockTicks', 'PendingFluidTicks',
+                      'TileEntities', 'Entities'):
+        tag.tags.append(nbt.TAG_List(name=list_name, type=nbt.TAG_Compound))
+    return tag
+
+
+def _vector_tag(name, vector):
+    tag = nbt.TAG_Compound(name=name)
+    for axis, value in zip('xyz', vector):
+        tag.tags.append(nbt.TAG_Int(name=axis, value=value))
+    return tag
@@ -0,0 +1,43 @@
+import asyncio
+import unittest
+
+from minecraft.exceptions import InvalidState
+from minecraft.networking.async_connection import AsyncConnection
+from minecraft.networking.packets import serverbound
+
+KeepAlivePacket = serverbound.play.KeepAlivePacket
+
+
+class WritePacketTest(unittest.TestCase):
+    def test_before_connect(self):
+        connection = AsyncConnection('127.0.0.1', username='bot')
+        self.assertRaises(InvalidState, connection.write_packet,
+                          KeepAlivePacket(keep_alive_id=1))
+
+    def test_after_disconnect(self):
+        async def run():
+            received = bytearray()
+
+            async def handle(reader, writer):
+                while True:
+                    data = await reader.read(1 << 16)
+                    if not data:
+                        break
+                    received.extend(data)
+                writer.close()
+
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            connection = AsyncConnection('127.0.0.1', port, username='bot')
+            await connection.connect()
+            connection.disconnect()
+            await asyncio.wait_for(connection.wait_closed(), 5)
+            sent = len(received)
+
+            # The packet is discarded.
+            await connection.write_packet(KeepAlivePacket(keep_alive_id=2))
+            self.assertEqual(len(received), sent)
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(run())
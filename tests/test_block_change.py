@@ -0,0 +1,95 @@
+import random
+import unittest
+
+from minecraft.backend.world import block_changes
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import PacketBuffer, PacketView, clientbound
+from minecraft.networking.types import VarInt
+
+MultiBlockChangePacket = clientbound.play.MultiBlockChangePacket
+Record = MultiBlockChangePacket.Record
+RecordArray = MultiBlockChangePacket.RecordArray
+
+
+def _naive_read(data, context):
+    # Decodes the records one at a time, by way of 'Record'.
+    buffer = PacketBuffer()
+    buffer.send(data)
+    buffer.reset_cursor()
+    count = VarInt.read(buffer)
+    return [Record.read_with_context(buffer, context) for _ in range(count)]
+
+
+class RecordArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def records(self, protocol, count):
+        # The states are chosen to give both short and long VarInts.
+        states = (0, 1, 127, 128, 20341, (1 << 20) - 1)
+        return [Record(x=self.random.randrange(16),
+                       y=self.random.randrange(16 if protocol >= 741 else 256),
+                       z=self.random.randrange(16),
+                       block_state_id=self.random.choice(states))
+                for _ in range(count)]
+
+    def test_read(self):
+        for protocol in (340, 578, 751, 757):
+            context = ConnectionContext(protocol_version=protocol)
+            for count in (0, 1, 300):
+                records = self.records(protocol, count)
+                buffer = PacketBuffer()
+                RecordArray.send_with_context(records, buffer, context)
+                data = buffer.get_writable()
+                self.assertEqual(_naive_read(data, context), records)
+
+                # Read from a 'PacketView', which is followed by other data.
+                view = PacketView(data + b'\x2a')
+                result = RecordArray.read_with_context(view, context)
+                self.assertEqual(view.pos, len(data))
+                self.assertEqual(result, records)
+                self.assertEqual(list(result.x), [r.x for r in records])
+                self.assertEqual(list(result.y), [r.y for r in records])
+                self.assertEqual(list(result.z), [r.z for r in records])
+                self.assertEqual(list(result.block_state_id),
+                                 [r.block_state_id for r in records])
+
+                # Read from another file object.
+                buffer.reset_cursor()
+                result = RecordArray.read_with_context(buffer, context)
+                self.assertEqual(result, records)
+
+                # The arrays are written as the records were.
+                buffer = PacketBuffer()
+                RecordArray.send_with_context(result, buffer, context)
+                self.assertEqual(buffer.get_writable(), data)
+
+    def test_truncated(self):
+        for protocol in (340, 757):
+            context = ConnectionContext(protocol_version=protocol)
+            buffer = PacketBuffer()
+            RecordArray.send_with_context(
+                self.records(protocol, 10), buffer, context)
+            data = buffer.get_writable()
+            self.assertRaises(EOFError, RecordArray.read_with_context,
+                              PacketView(data[:-1]), context)
+
+    def test_block_changes(self):
+        for protocol in (340, 757):
+            context = ConnectionContext(protocol_version=protocol)
+            records = self.records(protocol, 50)
+            packet = MultiBlockChangePacket(context, records=records)
+            if protocol >= 741:
+                packet.chunk_section_pos = (-3, 4, 5)
+                packet.invert_trust_edges = False
+                base = -48, 64, 80
+            else:
+                packet.chunk_x, packet.chunk_z = -3, 5
+                base = -48, 0, 80
+            buffer = PacketBuffer()
+            packet.write_fields(buffer)
+            result = MultiBlockChangePacket(context)
+            result.read(PacketView(buffer.get_writable()))
+            self.assertEqual(block_changes(result), [
+                ((base[0] + r.x, base[1] + r.y, base[2] + r.z),
+                 r.block_state_id) for r in records])
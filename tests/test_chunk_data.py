@@ -0,0 +1,176 @@
+import random
+import struct
+import unittest
+from array import array
+
+import pynbt
+
+from minecraft.networking.connection import (
+    Connection, ConnectionContext, PlayingReactor)
+from minecraft.networking.packets import PacketBuffer, PacketView, clientbound
+from minecraft.networking.packets.clientbound.play.chunk_data_packet import (
+    ChunkSection, pack_entries, unpack_entries)
+from minecraft.networking.types import VarInt
+
+ChunkDataPacket = clientbound.play.ChunkDataPacket
+
+
+def encode(packet):
+    # Returns the frame of 'packet', uncompressed and without its length.
+    buffer = PacketBuffer()
+    VarInt.send(packet.id, buffer)
+    packet.write_fields(buffer)
+    return buffer.get_writable()
+
+
+class LazyChunkDataTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = Connection(
+            '127.0.0.1', username='bot', allowed_versions=[757])
+        self.connection.context.protocol_version = 757
+        self.connection.reactor = PlayingReactor(self.connection)
+        self.frame = encode(ChunkDataPacket(
+            self.connection.context, chunk_x=3, chunk_z=-2, heightmaps={},
+            sections=[ChunkSection.filled(1)] + [None] * 15,
+            block_entities=[]))
+
+    def test_undecoded_unless_wanted(self):
+        # Chunk data is decoded lazily even though 'lazy_decode' is not set.
+        self.assertFalse(self.connection.options.lazy_decode)
+        packet = self.connection.reactor.decode_packet(self.frame)
+        self.assertIsInstance(packet, ChunkDataPacket)
+        self.assertIn('_undecoded', packet.__dict__)
+        self.assertEqual(packet.chunk_pos, (3, -2))
+
+        self.connection.register_packet_listener(
+            lambda packet: None, ChunkDataPacket)
+        packet = self.connection.reactor.decode_packet(self.frame)
+        self.assertNotIn('_undecoded', packet.__dict__)
+        self.assertEqual(packet.sections[0], ChunkSection.filled(1))
+
+
+def _naive_unpack(data, bits, count):
+    # Decodes the entries one at a time, as described by the protocol.
+    longs = struct.unpack('>%dQ' % (len(data) // 8), data)
+    per_long = 64 // bits
+    return [longs[i // per_long] >> (i % per_long * bits) & (1 << bits) - 1
+            for i in range(count)]
+
+
+class PackedEntriesTest(unittest.TestCase):
+    def test_unpack_entries(self):
+        rng = random.Random(0)
+        for bits in range(1, 16):
+            for count in (0, 1, 63, 64, 65, 4096):
+                entries = [rng.getrandbits(bits) for _ in range(count)]
+                data = pack_entries(entries, bits)
+                self.assertEqual(_naive_unpack(data, bits, count), entries)
+                typecodes = 'BH' if bits <= 8 else 'H'
+                for typecode in typecodes:
+                    self.assertEqual(
+                        unpack_entries(data, bits, count, typecode),
+                        array(typecode, entries), (bits, count, typecode))
+
+
+class ChunkDataRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def section(self, distinct):
+        # A section containing 'distinct' different states, or None.
+        if distinct == 0:
+            return None
+        states = self.random.sample(range(1, 20000), distinct)
+        if distinct == 1:
+            return ChunkSection.filled(states[0])
+        return ChunkSection.from_states(
+            [self.random.choice(states) for _ in range(ChunkSection.VOLUME)])
+
+    def block_entities(self, protocol, chunk_x, chunk_z):
+        entities = []
+        for i in range(3):
+            x, y, z = chunk_x << 4 | i, 60 + i, chunk_z << 4 | 15 - i
+            if protocol >= 757:
+                data = None if i == 0 else pynbt.NBTFile(
+                    value={'Items': pynbt.TAG_String('item %d' % i)})
+                entity = ChunkDataPacket.BlockEntity(
+                    x=x, y=y, z=z, type=i + 1, data=data)
+            else:
+                entity = ChunkDataPacket.BlockEntity(
+                    x=x, y=y, z=z, type=None, data=pynbt.NBTFile(value={
+                        'x': pynbt.TAG_Int(x), 'y': pynbt.TAG_Int(y),
+                        'z': pynbt.TAG_Int(z)}))
+            entities.append(entity)
+        return entities
+
+    def round_trip(self, protocol, sections, full_chunk=True):
+        context = ConnectionContext(protocol_version=protocol)
+        chunk_x, chunk_z = self.random.randint(-1000, 1000), -7
+        packet = ChunkDataPacket(
+            context, chunk_x=chunk_x, chunk_z=chunk_z, full_chunk=full_chunk,
+            heightmaps={'MOTION_BLOCKING': pynbt.TAG_Long_Array([1, 2, 3])},
+            sections=sections, biomes=list(range(1024)) if full_chunk
+            else None, block_entities=self.block_entities(
+                protocol, chunk_x, chunk_z))
+        frame = encode(packet)
+        data = PacketView(frame)
+        self.assertEqual(VarInt.read(data), packet.id)
+        result = ChunkDataPacket(context)
+        result.read(data)
+
+        self.assertEqual(result.chunk_pos, (chunk_x, chunk_z))
+        self.assertEqual(result.full_chunk, full_chunk)
+        self.assertEqual(list(result.heightmaps['MOTION_BLOCKING'].value),
+                         [1, 2, 3])
+        if protocol < 757:
+            # Trailing absent sections are not sent.
+            while sections and sections[-1] is None:
+                sections = sections[:-1]
+            self.assertEqual(result.biomes,
+                             list(range(1024)) if full_chunk else None)
+        else:
+            # Absent sections are sent as sections of air.
+            sections = [ChunkSection.filled(0) if section is None
+                        else section for section in sections]
+        self.assertEqual(result.sections, sections)
+        for entity, expected in zip(result.block_entities,
+                                    packet.block_entities):
+            self.assertEqual(entity.position, expected.position)
+            self.assertEqual(entity.type, expected.type)
+            if expected.data is None:
+                self.assertIsNone(entity.data)
+            elif protocol >= 757:
+                self.assertEqual(entity.data['Items'].value,
+                                 expected.data['Items'].value)
+        self.assertEqual(len(result.block_entities), 3)
+        return result
+
+    def test_round_trip(self):
+        for protocol in (751, 755, 757):
+            # Filled sections, and indirect palettes of 4 to 8 bits, and the
+            # direct palette.
+            distinct = [0, 1, 2, 16, 17, 200, 256, 257, 1000, 0, 3, 0, 0]
+            self.round_trip(protocol, [self.section(n) for n in distinct])
+        self.round_trip(751, [self.section(2), None, self.section(1)],
+                        full_chunk=False)
+
+    def test_tall_chunk(self):
+        # More than 64 sections need more than one long in the section mask
+        # of protocol 755.
+        sections = [self.section(self.random.choice((0, 1, 3)))
+                    for _ in range(70)]
+        sections[-1] = self.section(2)
+        for protocol in (755, 757):
+            self.round_trip(protocol, sections)
+
+    def test_section_states(self):
+        for distinct in (1, 2, 256, 257):
+            section = self.section(distinct)
+            states = section.states()
+            for index in self.random.sample(range(4096), 50):
+                self.assertEqual(section.get(index), states[index])
+            index = self.random.randrange(4096)
+            section.set(index, 30000)
+            states[index] = 30000
+            self.assertEqual(section.states(), states)
+            self.assertEqual(section, ChunkSection.from_states(states))
@@ -0,0 +1,141 @@
+import random
+import unittest
+import uuid
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking import types
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import (
+    PacketBuffer, PacketView, clientbound, serverbound)
+from minecraft.networking.packets.codec import get_codec
+
+PACKET_MODULES = (
+    clientbound.handshake, clientbound.status, clientbound.login,
+    clientbound.play, serverbound.handshake, serverbound.status,
+    serverbound.login, serverbound.play)
+
+
+def _random_values(rng):
+    # Functions returning a random value of each supported field type.
+    def floating():
+        # Values exactly representable with single precision.
+        return rng.randint(-1 << 20, 1 << 20) / 8
+
+    return {
+        types.Boolean: lambda: rng.random() < 0.5,
+        types.UnsignedByte: lambda: rng.randint(0, 0xFF),
+        types.Byte: lambda: rng.randint(-0x80, 0x7F),
+        types.Short: lambda: rng.randint(-0x8000, 0x7FFF),
+        types.UnsignedShort: lambda: rng.randint(0, 0xFFFF),
+        types.Integer: lambda: rng.randint(-1 << 31, (1 << 31) - 1),
+        types.Long: lambda: rng.randint(-1 << 63, (1 << 63) - 1),
+        types.VarInt: lambda: rng.randint(0, (1 << 31) - 1),
+        types.Float: floating,
+        types.Double: floating,
+        types.FixedPoint: floating,
+        types.Angle: lambda: rng.randint(0, 255) * 360 / 256,
+        types.String: lambda: ''.join(
+            rng.choice('abé中\U0001f600')
+            for _ in range(rng.randint(0, 40))),
+        types.UUID: lambda: str(uuid.UUID(int=rng.getrandbits(128))),
+        types.Position: lambda: types.Position(
+            rng.randint(-1 << 25, (1 << 25) - 1),
+            rng.randint(-1 << 11, (1 << 11) - 1),
+            rng.randint(-1 << 25, (1 << 25) - 1)),
+        types.VarIntPrefixedByteArray: lambda: bytes(
+            rng.getrandbits(8) for _ in range(rng.randint(0, 20))),
+    }
+
+
+def _interpreted_write(packet, definition):
+    buffer = PacketBuffer()
+    for field in definition:
+        for name, data_type in field.items():
+            data_type.send_with_context(
+                getattr(packet, name), buffer, packet.context)
+    return buffer.get_writable()
+
+
+def _interpreted_read(packet, definition, data):
+    buffer = PacketBuffer()
+    buffer.send(data)
+    buffer.reset_cursor()
+    for field in definition:
+        for name, data_type in field.items():
+            setattr(packet, name,
+                    data_type.read_with_context(buffer, packet.context))
+
+
+def _fields(packet, definition):
+    return {name: getattr(packet, name)
+            for field in definition for name in field}
+
+
+class PacketCodecTest(unittest.TestCase):
+    def packet_classes(self):
+        # Yields each packet class, context and definition consisting only of
+        # the supported field types, once for each distinct definition.
+        values = _random_values(random.Random())
+        seen = set()
+        for protocol in SUPPORTED_PROTOCOL_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol)
+            for module in PACKET_MODULES:
+                for packet_class in module.get_packets(context):
+                    try:
+                        definition = packet_class.get_definition(context)
+                    except AttributeError:
+                        # The class overrides 'read' and 'write_fields'.
+                        continue
+                    if not definition or any(
+                            data_type not in values for field in definition
+                            for data_type in field.values()):
+                        continue
+                    key = packet_class, tuple(
+                        item for field in definition for item in field.items())
+                    if key not in seen:
+                        seen.add(key)
+                        yield packet_class, context, definition
+
+    def test_same_as_interpreted(self):
+        rng = random.Random(0)
+        values = _random_values(rng)
+        tested = 0
+        for packet_class, context, definition in self.packet_classes():
+            codec = get_codec(packet_class, context)
+            for _ in range(3):
+                packet = packet_class(context)
+                for field in definition:
+                    for name, data_type in field.items():
+                        setattr(packet, name, values[data_type]())
+                data = _interpreted_write(packet, definition)
+                buffer = PacketBuffer()
+                codec.write(packet, buffer)
+                self.assertEqual(buffer.get_writable(), data, packet_class)
+
+                expected = packet_class(context)
+                _interpreted_read(expected, definition, data)
+                actual = packet_class(context)
+                view = PacketView(data)
+                codec.read(actual, view)
+                self.assertEqual(view.pos, len(data))
+                self.assertEqual(_fields(actual, definition),
+                                 _fields(expected, definition), packet_class)
+            tested += 1
+        self.assertGreater(tested, 50)
+
+    def test_truncated(self):
+        # When too little data remains for a run of fixed-width fields, the
+        # codec raises the same exception as the interpreted reader.
+        context = ConnectionContext(protocol_version=757)
+        packet_class = serverbound.play.PositionAndLookPacket
+        definition = packet_class.get_definition(context)
+        packet = packet_class(context, x=1.0, feet_y=2.0, z=3.0, yaw=4.0,
+                              pitch=5.0, on_ground=True)
+        data = _interpreted_write(packet, definition)
+        for length in (0, 7, len(data) - 1):
+            with self.assertRaises(Exception) as expected:
+                _interpreted_read(packet_class(context), definition,
+                                  data[:length])
+            with self.assertRaises(type(expected.exception)):
+                get_codec(packet_class, context).read(
+                    packet_class(context), PacketView(data[:length]))
@@ -0,0 +1,58 @@
+import random
+import unittest
+import zlib
+
+from minecraft.networking.compression import (
+    MAX_DECOMPRESSED_SIZE, PacketCompressor)
+from minecraft.networking.connection import _ConnectionOptions
+
+
+class PacketCompressorTest(unittest.TestCase):
+    # Sizes on either side of each boundary at which the window size and
+    # memory level chosen by 'PacketCompressor.compress' change.
+    SIZES = sorted({0, 1} | {(1 << bits) + delta for bits in range(8, 17)
+                             for delta in (-1, 0, 1)})
+
+    def payloads(self):
+        rng = random.Random(0)
+        to_letters = bytes(b'ab'[byte & 1] for byte in range(256))
+        for size in self.SIZES:
+            data = rng.getrandbits(8 * size).to_bytes(size, 'little')
+            yield data
+            yield data.translate(to_letters)
+            yield b'\x00' * size
+
+    def test_round_trip(self):
+        for level, strategy in ((zlib.Z_DEFAULT_COMPRESSION,
+                                 zlib.Z_DEFAULT_STRATEGY),
+                                (1, zlib.Z_DEFAULT_STRATEGY),
+                                (9, zlib.Z_FILTERED)):
+            compressor = PacketCompressor(_ConnectionOptions(
+                compression_level=level, compression_strategy=strategy))
+            for data in self.payloads():
+                compressed = compressor.compress(data)
+                self.assertEqual(zlib.decompress(compressed), data)
+                self.assertEqual(
+                    compressor.decompress(compressed, len(data)), data)
+
+    def test_decompress_checks_size(self):
+        compressor = PacketCompressor(_ConnectionOptions())
+        compressed = compressor.compress(b'x' * 1000)
+        self.assertRaises(ValueError, compressor.decompress, compressed, 999)
+        self.assertRaises(ValueError, compressor.decompress, compressed, 1001)
+
+    def test_decompress_limits_size(self):
+        compressor = PacketCompressor(_ConnectionOptions())
+        data = b'\x00' * (MAX_DECOMPRESSED_SIZE + 1)
+        compressed = compressor.compress(data)
+        self.assertRaises(ValueError, compressor.decompress, compressed,
+                          len(data))
+
+    def test_stats(self):
+        compressor = PacketCompressor(_ConnectionOptions())
+        compressed = compressor.compress(b'x' * 1000)
+        compressor.decompress(compressed, 1000)
+        stats = compressor.stats
+        self.assertEqual(stats.packets_decompressed, 1)
+        self.assertEqual(stats.compressed_bytes_read, len(compressed))
+        self.assertEqual(stats.bytes_decompressed, 1000)
@@ -0,0 +1,89 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from minecraft.schematic.litematic import LitematicIndex, _unpackWords
+
+from .litematic import pack_entries, write_litematic
+
+
+def _naive_unpack(words, bits, count):
+    # Decodes the entries from a single integer containing all of the longs.
+    value = sum(word << (64 * i) for i, word in enumerate(words))
+    return [value >> (i * bits) & ((1 << bits) - 1) for i in range(count)]
+
+
+class UnpackWordsTest(unittest.TestCase):
+    def test_unpack(self):
+        rng = random.Random(0)
+        for bits in range(1, 17):
+            # Counts around the length of the period of the arrangement.
+            period = 64 // (bits & -bits)
+            for count in {0, 1, period - 1, period, period + 1,
+                          3 * period + 2, rng.randrange(1000)}:
+                entries = [rng.getrandbits(bits) for _ in range(count)]
+                words = array('Q', array('q', pack_entries(
+                    entries, bits)).tobytes())
+                self.assertEqual(_naive_unpack(words, bits, count), entries)
+                self.assertEqual(list(_unpackWords(words, bits, count)),
+                                 entries)
+
+
+class RegionIndexTest(unittest.TestCase):
+    SIZE = (7, 5, 6)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.rng = random.Random(0)
+
+    def open(self, paletteSize):
+        volume = self.SIZE[0] * self.SIZE[1] * self.SIZE[2]
+        palette = ['minecraft:block_%d' % i for i in range(paletteSize)]
+        entries = [self.rng.randrange(paletteSize) for _ in range(volume)]
+        path = os.path.join(self.directory, '%d.litematic' % paletteSize)
+        write_litematic(path, [('main', self.SIZE, (0, 0, 0), palette,
+                                entries)])
+        index = LitematicIndex(path)
+        self.addCleanup(index.close)
+        return index.region('main'), entries
+
+    def at(self, entries, x, y, z):
+        sizeX, _, sizeZ = self.SIZE
+        return entries[(y * sizeZ + z) * sizeX + x]
+
+    def test_get_at(self):
+        # Palettes giving entries of 2 to 9 bits, some of which span longs.
+        for paletteSize in (2, 4, 5, 17, 33, 100, 129, 300):
+            region, entries = self.open(paletteSize)
+            self.assertEqual(region.entryLength,
+                             max(2, (paletteSize - 1).bit_length()))
+            sizeX, sizeY, sizeZ = self.SIZE
+            for x in range(sizeX):
+                for y in range(sizeY):
+                    for z in range(sizeZ):
+                        self.assertEqual(region.getAt(x, y, z),
+                                         self.at(entries, x, y, z))
+            # Nothing has been decoded yet.
+            self.assertIsNone(region._blocks)
+            self.assertEqual(list(region.blocks), entries)
+            self.assertEqual(region.getAt(6, 4, 5), entries[-1])
+
+    def test_get_box(self):
+        for paletteSize in (5, 129):
+            region, entries = self.open(paletteSize)
+            for _ in range(20):
+                x0, y0, z0 = (self.rng.randrange(-1, size)
+                              for size in self.SIZE)
+                x1, y1, z1 = (self.rng.randrange(start, size + 2) for start,
+                              size in zip((x0, y0, z0), self.SIZE))
+                expected = [self.at(entries, x, y, z)
+                            for y in range(max(y0, 0), min(y1, self.SIZE[1]))
+                            for z in range(max(z0, 0), min(z1, self.SIZE[2]))
+                            for x in range(max(x0, 0), min(x1, self.SIZE[0]))]
+                self.assertEqual(list(region.getBox(x0, y0, z0, x1, y1, z1)),
+                                 expected)
+            self.assertIsNone(region._blocks)
@@ -0,0 +1,47 @@
+import unittest
+
+from minecraft.backend.movement import MovementController
+from minecraft.backend.pathfinding import path_waypoints
+from minecraft.networking.connection import Connection
+
+
+class _Player(object):
+    def __init__(self):
+        self.connection = Connection('127.0.0.1', username='bot')
+
+
+class _Ticker(object):
+    # Records the controllers which are moving, without ticking them.
+    def __init__(self):
+        self.controllers = set()
+
+    def add(self, controller):
+        self.controllers.add(controller)
+
+    def remove(self, controller):
+        self.controllers.discard(controller)
+
+
+class MovementControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.ticker = _Ticker()
+        self.controller = MovementController(_Player(), ticker=self.ticker)
+
+    def test_move_along_no_waypoints(self):
+        self.assertRaises(ValueError, self.controller.move_along, [])
+        self.assertFalse(self.controller.moving)
+        self.assertFalse(self.ticker.controllers)
+
+    def test_no_waypoints_leaves_movement(self):
+        future = self.controller.move_along([(1, 2, 3), (4, 5, 6)])
+        self.assertRaises(ValueError, self.controller.move_along, [])
+        self.assertRaises(ValueError, self.controller.reroute, iter(()))
+        self.assertFalse(future.done())
+        self.assertEqual(self.controller._target, [1.0, 2.0, 3.0])
+        self.assertEqual(list(self.controller._waypoints), [[4.0, 5.0, 6.0]])
+        self.assertIn(self.controller, self.ticker.controllers)
+
+    def test_single_cell_path(self):
+        self.assertEqual(path_waypoints([(1, 2, 3)]), [[1.5, 2, 3.5]])
+        self.assertEqual(path_waypoints([(1, 2, 3)], (1.2, 2, 3.7)),
+                         [[1.2, 2, 3.7]])
@@ -0,0 +1,89 @@
+import queue
+import threading
+import unittest
+
+from minecraft.networking.connection import (
+    Connection, ConnectionContext, _WakeupChannel)
+from minecraft.networking.packet_queue import (
+    OutgoingPacketQueue, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST,
+    PRIORITY_CRITICAL, PRIORITY_LOW)
+from minecraft.networking.packets import serverbound
+
+
+class OutgoingPacketQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.context = ConnectionContext(protocol_version=757)
+
+    def keep_alive(self, keep_alive_id=0):
+        return serverbound.play.KeepAlivePacket(
+            self.context, keep_alive_id=keep_alive_id)
+
+    def chat(self, message):
+        return serverbound.play.ChatPacket(self.context, message=message)
+
+    def test_critical_packets_do_not_fill_queue(self):
+        packets = OutgoingPacketQueue(
+            maxsize=2, overflow=OVERFLOW_BLOCK, block_timeout=0)
+        packets.append(self.keep_alive(1))
+        packets.append(self.keep_alive(2))
+        self.assertFalse(packets.full())
+        packets.append(self.chat('a'))
+        packets.append(self.chat('b'))
+        self.assertTrue(packets.full())
+        self.assertRaises(queue.Full, packets.append, self.chat('c'))
+        # Critical packets are admitted regardless.
+        packets.append(self.keep_alive(3))
+        self.assertEqual(len(packets), 5)
+
+    def test_critical_packets_do_not_reduce_capacity(self):
+        packets = OutgoingPacketQueue(
+            maxsize=2, overflow=OVERFLOW_DROP_OLDEST)
+        packets.append(self.keep_alive(1))
+        packets.append(self.keep_alive(2))
+        for message in 'abc':
+            packets.append(self.chat(message))
+        self.assertEqual(packets.stats.dropped, 1)
+        self.assertEqual(
+            [getattr(packet, 'message', None) for packet in packets],
+            [None, None, 'b', 'c'])
+
+    def test_drop_oldest_keeps_higher_priorities(self):
+        packets = OutgoingPacketQueue(
+            maxsize=2, overflow=OVERFLOW_DROP_OLDEST, priorities={
+                'keep alive': PRIORITY_CRITICAL,
+                'client settings': PRIORITY_LOW})
+        packets.append(self.chat('a'))
+        packets.append(self.chat('b'))
+        # There is no packet of the same or a lower priority to drop, so the
+        # low-priority packet itself is dropped.
+        packets.append(serverbound.play.ClientSettingsPacket(self.context))
+        self.assertEqual(packets.stats.dropped, 1)
+        self.assertEqual(
+            [packet.message for packet in packets], ['a', 'b'])
+        packets.append(self.chat('c'))
+        self.assertEqual(packets.stats.dropped, 2)
+        self.assertEqual(
+            [packet.message for packet in packets], ['b', 'c'])
+
+
+class WritePacketTest(unittest.TestCase):
+    def test_no_blocking_under_write_lock(self):
+        connection = Connection('localhost', username='bot')
+        connection._wakeup = _WakeupChannel()
+        connection._outgoing_packet_queue = OutgoingPacketQueue(
+            maxsize=1, overflow=OVERFLOW_BLOCK)
+        connection.context.protocol_version = 757
+
+        def write():
+            with connection._write_lock:
+                for message in 'ab':
+                    connection.write_packet(serverbound.play.ChatPacket(
+                        message=message))
+
+        thread = threading.Thread(target=write, daemon=True)
+        thread.start()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(connection._outgoing_packet_queue), 2)
+        connection._wakeup._recv_socket.close()
+        connection._wakeup._send_socket.close()
@@ -0,0 +1,118 @@
+import select
+import socket
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from minecraft.networking import connection as connection_module
+from minecraft.networking import framing
+from minecraft.networking.connection import (
+    Connection, NetworkingThread, PlayingReactor, _WakeupChannel)
+from minecraft.networking.packet_queue import OutgoingPacketQueue
+from minecraft.networking.packets import clientbound
+from minecraft.networking.pipeline import DecodePipeline
+
+
+class _GatedExecutor(ThreadPoolExecutor):
+    # Decodes nothing until 'gate' is set, like a pool busy with slow packets.
+    def __init__(self):
+        super(_GatedExecutor, self).__init__(max_workers=1)
+        self.gate = threading.Event()
+
+    def submit(self, fn, *args):
+        return super(_GatedExecutor, self).submit(self._call, fn, *args)
+
+    def _call(self, fn, *args):
+        self.gate.wait(10)
+        return fn(*args)
+
+
+class DecodePipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.server, client = socket.socketpair()
+        self.connection = connection = Connection(
+            '127.0.0.1', username='bot', allowed_versions=[757])
+        connection.socket = client
+        connection.file_object = framing.FrameReader(client)
+        connection._outgoing_packet_queue = OutgoingPacketQueue()
+        connection._wakeup = _WakeupChannel()
+        connection.reactor = PlayingReactor(connection)
+        self.executor = _GatedExecutor()
+        self.received = []
+        connection.register_packet_listener(
+            lambda packet: self.received.append(packet.packet_name),
+            clientbound.play.ChatMessagePacket,
+            clientbound.play.KeepAlivePacket)
+
+    def tearDown(self):
+        self.executor.gate.set()
+        self.executor.shutdown()
+        self.server.close()
+        self.connection.socket.close()
+
+    def write(self, packet):
+        packet.context = self.connection.context
+        packet.write(self.server)
+
+    def chat(self, text):
+        self.write(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "%s"}' % text, position=0,
+            sender='00000000-0000-0000-0000-000000000000'))
+
+    def run_blocked_pipeline(self, pipeline):
+        # Runs the networking thread while the pool is blocked, with frames
+        # left unread in the socket, returning the number of calls to
+        # 'select' made meanwhile.
+        connection = self.connection
+        connection.decode_pipeline = pipeline
+        calls = [0]
+
+        def counting_select(*args):
+            calls[0] += 1
+            return select.select(*args)
+
+        # More data than the 'FrameReader' reads at once follows the barrier,
+        # so that the socket remains readable.
+        self.chat('slow')
+        self.write(clientbound.play.KeepAlivePacket(keep_alive_id=1))
+        writer = threading.Thread(
+            target=lambda: [self.chat('x' * 1000) for _ in range(100)],
+            daemon=True)
+        writer.start()
+        expected = ['chat message', 'keep alive'] + ['chat message'] * 100
+
+        thread = NetworkingThread(connection)
+        connection.networking_thread = thread
+        with mock.patch.object(connection_module, 'select',
+                               mock.Mock(select=counting_select)):
+            thread.start()
+            try:
+                time.sleep(0.3)
+                blocked_calls = calls[0]
+                self.executor.gate.set()
+                deadline = time.time() + 5
+                while len(self.received) < len(expected) and \
+                        time.time() < deadline:
+                    time.sleep(0.01)
+            finally:
+                thread.interrupt = True
+                thread.join(5)
+        self.assertEqual(self.received, expected)
+        return blocked_calls
+
+    def test_barrier_does_not_spin(self):
+        pipeline = DecodePipeline(
+            self.connection, executor=self.executor,
+            heavy_packets=[clientbound.play.ChatMessagePacket])
+        pipeline.barrier_packet_names = frozenset(('keep alive',))
+        # Without a timeout of 50ms, at most about 6 calls could be made.
+        self.assertLess(self.run_blocked_pipeline(pipeline), 20)
+
+    def test_saturated_pipeline_does_not_spin(self):
+        pipeline = DecodePipeline(
+            self.connection, executor=self.executor,
+            heavy_packets=[clientbound.play.ChatMessagePacket],
+            max_pending=1)
+        self.assertLess(self.run_blocked_pipeline(pipeline), 20)
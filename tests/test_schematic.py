@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nbt import nbt
+
+from minecraft.schematic import Schematic
+
+from .litematic import write_litematic
+
+PALETTE = ['minecraft:air', ('minecraft:oak_log', {'axis': 'x'})]
+
+
+class BlockTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'test.litematic')
+        write_litematic(path, [('main', (2, 1, 1), (0, 0, 0), PALETTE,
+                                [0, 1])])
+        self.schematic = Schematic(path)
+
+    def tearDown(self):
+        self.schematic.index.close()
+        shutil.rmtree(self.directory)
+
+    def test_names(self):
+        block = self.schematic.getBlock(1, 0, 0)
+        # 'getName' returns the NBT tag, as it always has.
+        self.assertIsInstance(block.getName(), nbt.TAG_String)
+        self.assertEqual(block.getName().value, 'minecraft:oak_log')
+        self.assertEqual(block.getNameValue(), 'minecraft:oak_log')
+        self.assertEqual(block.getState(), {'axis': 'x'})
+        self.assertEqual(self.schematic.getBlock(0, 0, 0).getNameValue(),
+                         'minecraft:air')
@@ -0,0 +1,61 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from minecraft.schematic import Schematic, SchematicCache
+from minecraft.schematic.litematic import LitematicIndex
+
+from .litematic import write_litematic
+
+PALETTE = ['minecraft:air', 'minecraft:stone', 'minecraft:dirt']
+
+
+class SchematicCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.litematic')
+        rng = random.Random(0)
+        self.entries = []
+        regions = []
+        for name, size in (('a', (5, 4, 3)), ('b', (2, 7, 6))):
+            entries = [rng.randrange(len(PALETTE))
+                       for _ in range(size[0] * size[1] * size[2])]
+            self.entries.append(entries)
+            regions.append((name, size, (0, 0, 0), PALETTE, entries))
+        write_litematic(self.path, regions)
+        self.cache = SchematicCache(os.path.join(self.directory, 'cache'))
+        self.entry = os.path.join(self.cache.directory,
+                                  self.cache.key(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self):
+        schematic = Schematic(self.path, cache=self.cache)
+        if schematic.index is not None:
+            self.addCleanup(schematic.index.close)
+        return schematic
+
+    def test_filled_lazily(self):
+        schematic = self.open()
+        self.assertEqual(os.listdir(self.entry), ['meta.json'])
+        self.assertEqual(list(schematic.blocks), self.entries[0])
+        self.assertEqual(sorted(os.listdir(self.entry)),
+                         ['0.blocks', 'meta.json'])
+
+        # The entry is incomplete, so the schematic is indexed again, but
+        # the region already in the cache is not decoded again.
+        schematic = self.open()
+        self.assertIsNotNone(schematic.index)
+        with mock.patch.object(LitematicIndex, '_decode') as decode:
+            self.assertEqual(list(schematic.blocks), self.entries[0])
+            self.assertFalse(decode.called)
+        self.assertEqual(list(schematic.regions[1].blocks), self.entries[1])
+
+        schematic = self.open()
+        self.assertIsNone(schematic.index)
+        self.assertEqual([list(region.blocks)
+                          for region in schematic.regions], self.entries)
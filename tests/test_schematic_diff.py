@@ -0,0 +1,259 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from minecraft.backend import schematic_diff
+from minecraft.backend.schematic_diff import SchematicDiff
+from minecraft.backend.world import World
+from minecraft.schematic import Schematic
+from minecraft.schematic.palette import BlockRegistry, registerBlockRegistry
+
+from .litematic import write_litematic
+
+PROTOCOL = 757
+
+BLOCKS = {
+    'minecraft:air': {'states': [{'id': 0, 'default': True}]},
+    'minecraft:cave_air': {'states': [{'id': 9, 'default': True}]},
+    'minecraft:stone': {'states': [{'id': 1, 'default': True}]},
+    'minecraft:dirt': {'states': [{'id': 2, 'default': True}]},
+    'minecraft:oak_log': {'states': [
+        {'id': 3, 'properties': {'axis': 'x'}},
+        {'id': 4, 'properties': {'axis': 'y'}, 'default': True}]},
+}
+
+PALETTE = ['minecraft:air', 'minecraft:stone', 'minecraft:dirt',
+           ('minecraft:oak_log', {'axis': 'x'}), 'minecraft:oak_log',
+           'minecraft:unknown']
+
+SIZE = 21, 18, 23
+POSITION = -7, 3, 5
+STATES = 0, 1, 2, 3, 4, 9
+
+
+class _InterleavingExecutor(ThreadPoolExecutor):
+    # Calls 'hook' before submitting each batch, as if events arrived from
+    # the networking thread while 'SchematicDiff.compute' is running.
+    def __init__(self, hook):
+        super(_InterleavingExecutor, self).__init__(max_workers=2)
+        self.hook = hook
+
+    def submit(self, fn, *args):
+        self.hook()
+        return super(_InterleavingExecutor, self).submit(fn, *args)
+
+
+class SchematicDiffTest(unittest.TestCase):
+    def setUp(self):
+        registerBlockRegistry(PROTOCOL, BlockRegistry(BLOCKS))
+        self.random = random.Random(0)
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'test.litematic')
+        volume = SIZE[0] * SIZE[1] * SIZE[2]
+        self.entries = [self.random.randrange(len(PALETTE))
+                        for _ in range(volume)]
+        write_litematic(path, [('main', SIZE, (0, 0, 0), PALETTE,
+                                self.entries)])
+        self.schematic = Schematic(path)
+        self.schematic.setSchematicPosition(*POSITION)
+        self.ids = self.schematic.globalStateIds(PROTOCOL)
+
+        self.world = World(min_y=0, height=64)
+        # The chunk (0, 1) is not loaded.
+        for cx in range(-1, 2):
+            for cz in range(0, 2):
+                if (cx, cz) != (0, 1):
+                    self.world.chunks[cx, cz] = [None] * 4
+        for x, y, z in self.positions():
+            target = self.target(x, y, z)
+            if target >= 0 and self.random.random() < 0.8:
+                self.world.set_block_state(x, y, z, target)
+            else:
+                self.world.set_block_state(
+                    x, y, z, self.random.choice(STATES))
+
+    def tearDown(self):
+        self.schematic.index.close()
+        shutil.rmtree(self.directory)
+
+    def positions(self):
+        px, py, pz = POSITION
+        for y in range(py, py + SIZE[1]):
+            for z in range(pz, pz + SIZE[2]):
+                for x in range(px, px + SIZE[0]):
+                    yield x, y, z
+
+    def target(self, x, y, z):
+        px, py, pz = POSITION
+        x, y, z = x - px, y - py, z - pz
+        return self.ids[self.entries[(y * SIZE[2] + z) * SIZE[0] + x]]
+
+    def expected(self, include_air=False):
+        # The diff computed block by block.
+        result, unknown = {}, 0
+        for x, y, z in self.positions():
+            target = self.target(x, y, z)
+            if target < 0 or target == 0 and not include_air:
+                continue
+            state = self.world.get_block_state(x, y, z)
+            if state is None:
+                unknown += 1
+            elif state != target:
+                result.setdefault(target, set()).add((x, y, z))
+        return result, unknown
+
+    def actual(self, diff):
+        result = {}
+        for target, coordinates in diff.remaining().items():
+            result[target] = set(zip(coordinates[0::3], coordinates[1::3],
+                                     coordinates[2::3]))
+        return result, diff.unknown()
+
+    def random_change(self):
+        px, py, pz = POSITION
+        x = self.random.randrange(px - 1, px + SIZE[0] + 1)
+        y = self.random.randrange(py, py + SIZE[1])
+        z = self.random.randrange(pz, pz + SIZE[2])
+        if self.world.is_loaded(x >> 4, z >> 4):
+            return x, y, z, self.random.choice(STATES)
+        return None
+
+    def test_compute(self):
+        for include_air in (False, True):
+            diff = SchematicDiff(self.schematic, self.world, PROTOCOL,
+                                 include_air=include_air).compute()
+            self.assertEqual(self.actual(diff), self.expected(include_air))
+            self.assertEqual(diff.count(), sum(
+                map(len, self.expected(include_air)[0].values())))
+
+    def test_compute_with_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            diff = SchematicDiff(self.schematic, self.world, PROTOCOL,
+                                 executor=executor)
+            original = schematic_diff._BATCH_SECTIONS
+            schematic_diff._BATCH_SECTIONS = 1
+            try:
+                diff.compute()
+            finally:
+                schematic_diff._BATCH_SECTIONS = original
+        self.assertEqual(self.actual(diff), self.expected())
+
+    def test_block_updates(self):
+        diff = SchematicDiff(self.schematic, self.world, PROTOCOL).compute()
+        for _ in range(2000):
+            change = self.random_change()
+            if change is not None:
+                self.world.set_block_state(*change)
+                diff.update_block(*change)
+        self.assertEqual(self.actual(diff), self.expected())
+
+    def test_chunk_load_and_unload(self):
+        diff = SchematicDiff(self.schematic, self.world, PROTOCOL).compute()
+        self.assertGreater(diff.unknown(), 0)
+        self.world.chunks[0, 1] = [None] * 4
+        diff.compute_chunk(0, 1)
+        self.assertEqual(diff.unknown(), 0)
+        self.assertEqual(self.actual(diff), self.expected())
+        self.world.unload_chunk(-1, 0)
+        diff.compute_chunk(-1, 0)
+        self.assertEqual(self.actual(diff), self.expected())
+
+    def test_updates_during_compute(self):
+        chunks = iter([(0, 1), (-1, 0)])
+
+        def interleave():
+            for _ in range(50):
+                change = self.random_change()
+                if change is not None:
+                    self.world.set_block_state(*change)
+                    diff.update_block(*change)
+            chunk = next(chunks, None)
+            if chunk == (0, 1):
+                self.world.chunks[chunk] = [None] * 4
+                diff.compute_chunk(*chunk)
+            elif chunk is not None:
+                self.world.unload_chunk(*chunk)
+                diff.compute_chunk(*chunk)
+
+        with _InterleavingExecutor(interleave) as executor:
+            diff = SchematicDiff(self.schematic, self.world, PROTOCOL,
+                                 executor=executor)
+            original = schematic_diff._BATCH_SECTIONS
+            schematic_diff._BATCH_SECTIONS = 1
+            try:
+                diff.compute()
+            finally:
+                schematic_diff._BATCH_SECTIONS = original
+        self.assertEqual(self.actual(diff), self.expected())
+
+    def test_wrong(self):
+        diff = SchematicDiff(self.schematic, self.world, PROTOCOL).compute()
+        wrong = diff.wrong()
+        wrong = set(zip(wrong[0::3], wrong[1::3], wrong[2::3]))
+        expected = {position
+                    for positions in self.expected()[0].values()
+                    for position in positions
+                    if self.world.get_block_state(*position) not in (0, 9)}
+        self.assertEqual(wrong, expected)
+
+
+class DiffSectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+
+    def table(self, size):
+        # Targets with both bytes nonzero, and ignored blocks.
+        return array('H', [self.rng.choice((schematic_diff.IGNORED, 0x1234))
+                           if i % 7 == 0 else self.rng.randrange(0xFFFE)
+                           for i in range(size)])
+
+    def test_map_indices(self):
+        # On either side of the size at which 'bytes.translate' is used.
+        for size in (1, 3, 255, 256, 257, 1000):
+            targets = self.table(size)
+            indices = array('H', [self.rng.randrange(size)
+                                  for _ in range(500)])
+            self.assertEqual(
+                schematic_diff._map_indices(indices.tobytes(), targets),
+                array('H', [targets[i] for i in indices]).tobytes())
+
+    def test_diff_sections(self):
+        for size in (6, 300):
+            targets = self.table(size)
+            # A box covering part of a chunk section at negative coordinates.
+            box = -7, 19, -30, 0, 32, -17
+            x0, y0, z0, x1, y1, z1 = box
+            volume = (x1 - x0) * (y1 - y0) * (z1 - z0)
+            indices = array('H', [self.rng.randrange(size)
+                                  for _ in range(volume)])
+            states = array('H', [targets[i] if self.rng.random() < 0.5
+                                 else self.rng.choice((1, 2, 0xFFFF))
+                                 for i in indices])
+            done = array('H', [targets[i] for i in indices])
+            result = schematic_diff._diff_sections(targets.tobytes(), [
+                ('a', box, indices.tobytes(), states.tobytes()),
+                ('b', box, indices.tobytes(), done.tobytes())])
+
+            expected, unknown = {}, 0
+            positions = ((x, y, z) for y in range(y0, y1)
+                         for z in range(z0, z1) for x in range(x0, x1))
+            for (x, y, z), index, state in zip(positions, indices, states):
+                target = targets[index]
+                if target in (state, schematic_diff.IGNORED):
+                    continue
+                if state == schematic_diff.UNKNOWN:
+                    unknown += 1
+                    continue
+                expected.setdefault(target, []).append(
+                    (y & 15) << 8 | (z & 15) << 4 | x & 15)
+            self.assertEqual(result[1], ('b', {}, 0))
+            key, section, result_unknown = result[0]
+            self.assertEqual(key, 'a')
+            self.assertEqual(result_unknown, unknown)
+            self.assertEqual({target: list(section_indices) for
+                              target, section_indices in section.items()},
+                             expected)
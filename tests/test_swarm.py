@@ -0,0 +1,72 @@
+import socket
+import threading
+import timeit
+import unittest
+from unittest import mock
+
+from minecraft.networking.connection import Connection
+from minecraft.networking.swarm import SwarmManager, SwarmMember
+
+
+class SwarmConnectTest(unittest.TestCase):
+    def setUp(self):
+        # The event loop is run by this thread, one iteration at a time.
+        self.manager = SwarmManager(timeout=0.01)
+        self.manager.thread = threading.current_thread()
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.connection = self.manager.add(Connection(
+            '127.0.0.1', self.server.getsockname()[1], username='bot',
+            allowed_versions=[757], handle_exception=False))
+
+    def tearDown(self):
+        self.connection.disconnect(immediate=True)
+        for _ in range(5):
+            self.manager._run_once()
+        if self.manager.connect_executor is not None:
+            self.manager.connect_executor.shutdown()
+        self.server.close()
+
+    def run_until(self, condition, timeout=5):
+        deadline = timeit.default_timer() + timeout
+        while not condition():
+            self.assertLess(timeit.default_timer(), deadline)
+            self.manager._run_once()
+
+    def test_connect_from_loop_does_not_block(self):
+        resolving = threading.Event()
+        getaddrinfo = socket.getaddrinfo
+
+        def slow_getaddrinfo(*args, **kwds):
+            resolving.wait(5)
+            return getaddrinfo(*args, **kwds)
+
+        with mock.patch('socket.getaddrinfo', slow_getaddrinfo):
+            start = timeit.default_timer()
+            self.connection.connect()
+            for _ in range(5):
+                self.manager._run_once()
+            self.assertLess(timeit.default_timer() - start, 1)
+            self.assertIsNone(self.connection.networking_thread)
+
+            resolving.set()
+            self.run_until(lambda: not self.manager._connecting)
+            self.run_until(lambda: isinstance(
+                self.connection.networking_thread, SwarmMember)
+                and self.connection.networking_thread.active)
+        client, _ = self.server.accept()
+        client.close()
+
+    def test_connect_from_loop_failure(self):
+        errors = []
+        self.connection.register_exception_handler(
+            lambda exc, exc_info: errors.append(
+                (exc, threading.current_thread())))
+        self.server.close()
+        self.connection.connect()
+        self.run_until(lambda: errors)
+        exc, thread = errors[0]
+        self.assertIsInstance(exc, ConnectionRefusedError)
+        self.assertIs(thread, threading.current_thread())
+        self.assertIsNone(self.connection.networking_thread)
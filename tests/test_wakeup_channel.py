@@ -0,0 +1,62 @@
+import select
+import unittest
+
+from minecraft.networking.connection import _WakeupChannel
+
+
+class _InterleavingSocket(object):
+    # Wraps the receiving socket of a '_WakeupChannel', calling 'hook' before
+    # the first call to 'recv', i.e. while the channel is being cleared.
+    def __init__(self, socket, hook):
+        self.socket = socket
+        self.hook = hook
+
+    def recv(self, size):
+        hook, self.hook = self.hook, None
+        if hook is not None:
+            hook()
+        return self.socket.recv(size)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+
+class WakeupChannelTest(unittest.TestCase):
+    def setUp(self):
+        self.channel = _WakeupChannel()
+
+    def tearDown(self):
+        self.channel._recv_socket.close()
+        self.channel._send_socket.close()
+
+    def readable(self):
+        return bool(select.select([self.channel], [], [], 0)[0])
+
+    def test_signal_and_clear(self):
+        self.assertFalse(self.readable())
+        self.channel.signal()
+        self.channel.signal()
+        self.assertTrue(self.readable())
+        self.channel.clear()
+        self.assertFalse(self.readable())
+        self.channel.signal()
+        self.assertTrue(self.readable())
+
+    def test_signal_during_clear(self):
+        # A signal which interleaves with 'clear' must not prevent later
+        # signals from waking the channel.
+        channel = self.channel
+        for signalled in (False, True):
+            if signalled:
+                channel.signal()
+            recv_socket = channel._recv_socket
+            channel._recv_socket = _InterleavingSocket(
+                recv_socket, channel.signal)
+            try:
+                channel.clear()
+            finally:
+                channel._recv_socket = recv_socket
+            channel.signal()
+            self.assertTrue(self.readable())
+            channel.clear()
+            self.assertFalse(self.readable())